@@ -0,0 +1,196 @@
+#!/usr/bin/python
+
+#
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""Dataset input that doesn't load whole arrays in memory.
+
+IDX files, the format of MNIST, and raw or `.npy` arrays are opened with
+`np.memmap`, so the pages of a file are only read when they are used and
+can be dropped again by the OS. A gzipped IDX file can't be mapped: it is
+decompressed once, in chunks, next to the original or in `cache_dir`, and
+the decompressed file is mapped.
+
+`ArrayDataSet` has the `images`, `labels` and `num_examples` that
+`tf_scripts.convert_to` reads, and `iter_chunks` iterates over it in chunks
+for training loaders, converting one chunk at a time.
+"""
+
+import os
+import gzip
+import shutil
+import struct
+import resource
+import sys
+
+import numpy as np
+
+# the IDX type codes and their big endian numpy types
+IDX_DTYPES = {
+    0x08: np.dtype('u1'),
+    0x09: np.dtype('i1'),
+    0x0B: np.dtype('>i2'),
+    0x0C: np.dtype('>i4'),
+    0x0D: np.dtype('>f4'),
+    0x0E: np.dtype('>f8')
+}
+COPY_CHUNK_SIZE = 1 << 20
+
+
+def read_header(f):
+    """Reads the header of an IDX file.
+
+    :return: the `(dtype, shape, offset)` of the array in the file
+    """
+    zero, type_code, ndim = struct.unpack('>HBB', f.read(4))
+    if zero != 0 or type_code not in IDX_DTYPES:
+        raise ValueError('Not an IDX file, magic number %#06x%02x%02x' %
+                         (zero, type_code, ndim))
+    shape = struct.unpack('>' + 'I' * ndim, f.read(4 * ndim))
+    return IDX_DTYPES[type_code], shape, 4 + 4 * ndim
+
+
+def decompress(path, cache_dir=None):
+    """Decompresses a gzipped file in chunks, once.
+
+    :return: the path of the decompressed file
+    """
+    name = os.path.basename(path)
+    if name.endswith('.gz'):
+        name = name[:-3]
+    else:
+        name += '.raw'
+    target = os.path.join(cache_dir or os.path.dirname(path), name)
+    if os.path.exists(target) and \
+            os.path.getmtime(target) >= os.path.getmtime(path):
+        return target
+    if cache_dir and not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    tmp = target + '.tmp'
+    with gzip.open(path, 'rb') as src, open(tmp, 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+    os.rename(tmp, target)
+    return target
+
+
+def open_idx(path, cache_dir=None):
+    """Opens the array of an IDX file, gzipped or not, without reading it.
+
+    :return: a read-only `np.memmap` of the array
+    """
+    if path.endswith('.gz'):
+        path = decompress(path, cache_dir)
+    with open(path, 'rb') as f:
+        dtype, shape, offset = read_header(f)
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def open_raw(path, dtype=None, shape=None, offset=0):
+    """Opens a `.npy` file, or a raw array of `dtype` and `shape`.
+
+    :return: a read-only memory map of the array
+    """
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    return np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=shape)
+
+
+def from_bytes(data):
+    """Reads the array of an IDX file already in memory, without a copy.
+
+    :return: a read-only array backed by `data`
+    """
+    dtype, shape, offset = read_header(_BytesReader(data))
+    count = int(np.prod(shape)) if shape else 1
+    return np.frombuffer(data, dtype=dtype, count=count,
+                         offset=offset).reshape(shape)
+
+
+class _BytesReader(object):
+    def __init__(self, data):
+        self.data = data
+        self.position = 0
+
+    def read(self, size):
+        chunk = self.data[self.position:self.position + size]
+        self.position += size
+        return chunk
+
+
+class ArrayDataSet(object):
+    """A dataset of memory mapped images and labels.
+
+    :param images: an array of `num_examples` images, e.g. a memory map. IDX
+        images of shape `(n, rows, cols)` get a depth of 1.
+    :param labels: an array of `num_examples` labels
+    """
+
+    def __init__(self, images, labels):
+        if images.ndim == 3:
+            images = images.reshape(images.shape + (1,))
+        if images.shape[0] != labels.shape[0]:
+            raise ValueError('Images size %d does not match label size %d.' %
+                             (images.shape[0], labels.shape[0]))
+        self.images = images
+        self.labels = labels
+        self.num_examples = images.shape[0]
+
+    @classmethod
+    def from_idx(cls, images_path, labels_path, cache_dir=None):
+        return cls(open_idx(images_path, cache_dir),
+                   open_idx(labels_path, cache_dir))
+
+    def iter_chunks(self, chunk_size=1024, start=0, stop=None, dtype=None,
+                    scale=None):
+        """Iterates over the examples `start` to `stop` in chunks.
+
+        Only one chunk is read, and converted, at a time.
+
+        :param dtype: the type to convert the images to, e.g. `np.float32`
+        :param scale: a factor to multiply the images by, e.g. `1. / 255`
+        :return: an iterator of `(images, labels)` arrays of at most
+            `chunk_size` examples
+        """
+        stop = self.num_examples if stop is None else stop
+        for begin in range(start, stop, chunk_size):
+            end = min(begin + chunk_size, stop)
+            images = np.asarray(self.images[begin:end])
+            if dtype is not None:
+                # a copy of the chunk only, scaled in place
+                images = images.astype(dtype)
+                if scale is not None:
+                    images *= scale
+            elif scale is not None:
+                images = images * scale
+            yield images, np.asarray(self.labels[begin:end])
+
+
+def peak_memory_mb():
+    """:return: the peak resident memory of this process, in MB"""
+    try:
+        # unlike ru_maxrss on Linux, not inherited from the parent on exec
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024.
+    except IOError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    if sys.platform == 'darwin':
+        return peak / (1024. * 1024.)
+    return peak / 1024.
@@ -28,9 +28,12 @@ import uuid
 import tensorflow as tf
 import sys
 import tarfile
+import multiprocessing
 from six.moves import urllib
 import numpy as np
 
+from lib import idx
+
 
 def _int64_feature(value):
     return tf.train.Feature(int64_list=tf.train.Int64List(value=[value]))
@@ -39,8 +42,99 @@ def _int64_feature(value):
 def _bytes_feature(value):
     return tf.train.Feature(bytes_list=tf.train.BytesList(value=[value]))
 
-def convert_to(data_set, name, directory):
-    """Converts a dataset to tfrecords."""
+# the compression types of `convert_to`, by name
+COMPRESSION_TYPES = {
+    None: tf.python_io.TFRecordCompressionType.NONE,
+    'GZIP': tf.python_io.TFRecordCompressionType.GZIP,
+    'ZLIB': tf.python_io.TFRecordCompressionType.ZLIB
+}
+
+# the number of examples a shard writer reads at once
+CHUNK_SIZE = 1024
+
+# the images and labels the shard writers of a process pool read
+_shard_data = None
+
+
+def shard_filenames(name, directory, num_shards):
+    """:return: the file names of the `num_shards` shards of a dataset"""
+    if num_shards == 1:
+        return [os.path.join(directory, name + '.tfrecords')]
+    return [os.path.join(directory, '%s-%05d-of-%05d.tfrecords' %
+                         (name, shard, num_shards))
+            for shard in range(num_shards)]
+
+
+def _constant_features(rows, cols, depth):
+    """
+    :return: the serialized `tf.train.Example` of the features every example
+        shares. A serialized message followed by another is parsed as the
+        merge of both, so prepending it to the serialized label and image of
+        an example gives the whole example without rebuilding these features.
+    """
+    return tf.train.Example(features=tf.train.Features(feature={
+        'height': _int64_feature(rows),
+        'width': _int64_feature(cols),
+        'depth': _int64_feature(depth)})).SerializeToString()
+
+
+def _write_shard(images, labels, start, stop, filename, compression):
+    """Writes the examples `start` to `stop` to one `.tfrecords` file."""
+    constant = _constant_features(*images.shape[1:4])
+    options = tf.python_io.TFRecordOptions(COMPRESSION_TYPES[compression])
+    writer = tf.python_io.TFRecordWriter(filename, options=options)
+    try:
+        # memory mapped inputs are read sequentially, one chunk at a time
+        for begin in range(start, stop, CHUNK_SIZE):
+            end = min(begin + CHUNK_SIZE, stop)
+            chunk_images = np.asarray(images[begin:end])
+            chunk_labels = np.asarray(labels[begin:end]).tolist()
+            for image, label in zip(chunk_images, chunk_labels):
+                example = tf.train.Example(features=tf.train.Features(
+                    feature={
+                        'label': _int64_feature(int(label)),
+                        'image_raw': _bytes_feature(image.tobytes())}))
+                writer.write(constant + example.SerializeToString())
+    finally:
+        writer.close()
+    return stop - start
+
+
+def _fork_context():
+    try:
+        return multiprocessing.get_context('fork')
+    except (AttributeError, ValueError):
+        # Python 2 always forks, Windows can't
+        return multiprocessing
+
+
+def _init_shard_worker(images, labels):
+    global _shard_data
+    _shard_data = (images, labels)
+
+
+def _write_pool_shard(args):
+    images, labels = _shard_data
+    return _write_shard(images, labels, *args)
+
+
+def convert_to(data_set, name, directory, num_shards=1, num_workers=None,
+               compression=None):
+    """Converts a dataset to tfrecords.
+
+    `data_set` can be an `idx.ArrayDataSet` of memory mapped arrays, which
+    are read in chunks, to convert datasets bigger than the memory.
+
+    The examples are split into `num_shards` files, named
+    `<name>-<shard>-of-<num_shards>.tfrecords`, or `<name>.tfrecords` for a
+    single shard, written in parallel by `num_workers` processes.
+
+    :param num_workers: the number of processes, by default one per shard up
+        to the number of CPUs. 1 writes the shards in this process.
+    :param compression: None, 'GZIP' or 'ZLIB'. Compressed records must be
+        read with the same `compression_type`.
+    :return: the list of written file names
+    """
     images = data_set.images
     labels = data_set.labels
     num_examples = data_set.num_examples
@@ -48,20 +142,49 @@ def convert_to(data_set, name, directory):
     if images.shape[0] != num_examples:
         raise ValueError('Images size %d does not match label size %d.' %
                          (images.shape[0], num_examples))
-    rows = images.shape[1]
-    cols = images.shape[2]
-    depth = images.shape[3]
-
-    filename = os.path.join(directory, name + '.tfrecords')
-    print('Writing', filename)
-    writer = tf.python_io.TFRecordWriter(filename)
-    for index in range(num_examples):
-        image_raw = images[index].tostring()
-        example = tf.train.Example(features=tf.train.Features(feature={
-            'height': _int64_feature(rows),
-            'width': _int64_feature(cols),
-            'depth': _int64_feature(depth),
-            'label': _int64_feature(int(labels[index])),
-            'image_raw': _bytes_feature(image_raw)}))
-        writer.write(example.SerializeToString())
-    writer.close()
\ No newline at end of file
+    if compression not in COMPRESSION_TYPES:
+        raise ValueError('Unknown compression %s, expected one of %s.' %
+                         (compression, sorted(c for c in COMPRESSION_TYPES
+                                              if c)))
+    num_shards = max(1, min(num_shards, num_examples))
+    if num_workers is None:
+        num_workers = min(num_shards, multiprocessing.cpu_count())
+
+    filenames = shard_filenames(name, directory, num_shards)
+    bounds = np.linspace(0, num_examples, num_shards + 1).astype(int)
+    shards = [(bounds[i], bounds[i + 1], filenames[i], compression)
+              for i in range(num_shards)]
+    print('Writing', filenames[0] if num_shards == 1 else
+          '%d shards of %s' % (num_shards, os.path.join(directory, name)))
+
+    start = time.time()
+    if num_workers <= 1:
+        for shard in shards:
+            _write_shard(images, labels, *shard)
+    else:
+        # forked workers share the parent's arrays, or memory maps, instead
+        # of unpickling a copy of them
+        pool = _fork_context().Pool(num_workers, _init_shard_worker,
+                                    (images, labels))
+        try:
+            pool.map(_write_pool_shard, shards, chunksize=1)
+        finally:
+            pool.close()
+            pool.join()
+    elapsed = time.time() - start
+    logging.info('Wrote %d examples in %.2fs, %.0f examples/s', num_examples,
+                 elapsed, num_examples / max(elapsed, 1e-9))
+    return filenames
+
+
+def convert_idx(images_path, labels_path, name, directory, cache_dir=None,
+                **kwargs):
+    """Converts a dataset of IDX files, gzipped or not, to tfrecords without
+    loading it in memory. Takes the arguments of `convert_to`.
+
+    :return: the list of written file names
+    """
+    data_set = idx.ArrayDataSet.from_idx(images_path, labels_path, cache_dir)
+    filenames = convert_to(data_set, name, directory, **kwargs)
+    logging.info('Peak memory %.1f MB', idx.peak_memory_mb())
+    return filenames
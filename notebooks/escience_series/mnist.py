@@ -3,6 +3,7 @@ import gzip
 import json
 import logging
 import os
+import resource
 import struct
 
 import mxnet as mx
@@ -10,16 +11,66 @@ import numpy as np
 
 
 def load_data(path):
+    """
+    Loads the labels and images of a channel without copying them: the arrays
+    are views of the decompressed bytes, and the images stay uint8, a quarter
+    of their float32 size. `ScaledIter` converts them one batch at a time.
+
+    :return: the int8 labels and the uint8 images of shape (n, 1, rows, cols)
+    """
     with gzip.open(find_file(path, "labels.gz")) as flbl:
         struct.unpack(">II", flbl.read(8))
-        labels = np.fromstring(flbl.read(), dtype=np.int8)
+        labels = np.frombuffer(flbl.read(), dtype=np.int8)
     with gzip.open(find_file(path, "images.gz")) as fimg:
         _, _, rows, cols = struct.unpack(">IIII", fimg.read(16))
-        images = np.fromstring(fimg.read(), dtype=np.uint8).reshape(len(labels), rows, cols)
-        images = images.reshape(images.shape[0], 1, 28, 28).astype(np.float32) / 255
+        images = np.frombuffer(fimg.read(), dtype=np.uint8).reshape(len(labels), 1, rows, cols)
     return labels, images
 
 
+class ScaledIter(mx.io.DataIter):
+    """
+    Iterates over uint8 images in batches, converting only the current batch
+    to float32 scaled to [0, 1], like an `mx.io.NDArrayIter` of the whole
+    float32 dataset would return.
+    """
+
+    def __init__(self, images, labels, batch_size, shuffle=False, scale=1. / 255):
+        super(ScaledIter, self).__init__(batch_size)
+        self.images = images
+        self.labels = labels
+        self.shuffle = shuffle
+        self.scale = scale
+        self.order = np.arange(len(images))
+        self.provide_data = [mx.io.DataDesc('data', (batch_size,) + images.shape[1:])]
+        self.provide_label = [mx.io.DataDesc('softmax_label', (batch_size,))]
+        self.reset()
+
+    def reset(self):
+        if self.shuffle:
+            np.random.shuffle(self.order)
+        self.cursor = 0
+
+    def next(self):
+        if self.cursor >= len(self.order):
+            raise StopIteration
+        index = self.order[self.cursor:self.cursor + self.batch_size]
+        self.cursor += self.batch_size
+        # the last batch is padded with the first examples, as NDArrayIter does
+        pad = self.batch_size - len(index)
+        if pad:
+            index = np.concatenate([index, self.order[:pad]])
+        data = self.images[index].astype(np.float32)
+        data *= self.scale
+        return mx.io.DataBatch(data=[mx.nd.array(data)],
+                               label=[mx.nd.array(self.labels[index], dtype=np.float32)],
+                               pad=pad)
+
+
+def peak_memory_mb():
+    # kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
 def find_file(root_path, file_name):
     for root, dirs, files in os.walk(root_path):
         if file_name in files:
@@ -60,11 +111,12 @@ def train(batch_size, epochs, learning_rate, num_gpus, training_channel, testing
             end = start + shard_size
             break
 
-    train_iter = mx.io.NDArrayIter(train_images[start:end], train_labels[start:end], batch_size,
-                                   shuffle=True)
-    val_iter = mx.io.NDArrayIter(test_images, test_labels, batch_size)
+    train_iter = ScaledIter(train_images[start:end], train_labels[start:end], batch_size,
+                            shuffle=True)
+    val_iter = ScaledIter(test_images, test_labels, batch_size)
 
     logging.getLogger().setLevel(logging.DEBUG)
+    logging.info('Loaded data, peak memory %.1f MB', peak_memory_mb())
 
     kvstore = 'local' if len(hosts) == 1 else 'dist_sync'
 
@@ -88,6 +140,8 @@ def train(batch_size, epochs, learning_rate, num_gpus, training_channel, testing
                   batch_end_callback=mx.callback.Speedometer(batch_size, 100),
                   num_epoch=epochs)
 
+    logging.info('Trained, peak memory %.1f MB', peak_memory_mb())
+
     if current_host == hosts[0]:
         save(model_dir, mlp_model)
 
@@ -118,39 +172,129 @@ def parse_args():
 
     return parser.parse_args()
 
+
+# content types of a batch of images, or of an array of images
+MULTIPART_CONTENT_TYPE = 'multipart/form-data'
+NDARRAY_CONTENT_TYPES = ('application/vnd+python.numpy+binary',
+                         'application/x-npy')
+# the shape of an image as the model takes it
+INPUT_SHAPE = (1, 28, 28)
+
+_decode_pool = None
+
+
+def _get_decode_pool():
+    """The threads decoding images, created on the first batch and reused"""
+    global _decode_pool
+    if _decode_pool is None:
+        from multiprocessing import cpu_count
+        from multiprocessing.pool import ThreadPool
+        _decode_pool = ThreadPool(int(os.environ.get('NEO_DECODE_THREADS',
+                                                     cpu_count())))
+    return _decode_pool
+
+
+def _split_multipart(payload, content_type):
+    """Returns the bodies of the parts of a multipart payload"""
+    import re
+
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if match is None:
+        raise RuntimeError('Multipart content type must have a boundary')
+    delimiter = b'--' + match.group(1).encode('ascii')
+
+    bodies = []
+    # skip the preamble, and stop at the closing delimiter
+    for part in payload.split(delimiter)[1:]:
+        if part.startswith(b'--'):
+            break
+        _, _, body = part.partition(b'\r\n\r\n')
+        if body.endswith(b'\r\n'):
+            body = body[:-2]
+        bodies.append(body)
+    return bodies
+
+
+def _decode_images(images):
+    """
+    Decodes encoded images in the decode threads, each one straight into
+    its slot of a single contiguous float32 array of shape
+    (batch,) + INPUT_SHAPE, scaled to [0, 1] as in training.
+    """
+    import io
+    import numpy as np
+    import PIL.Image   # Training container doesn't have this package
+
+    batch = np.empty((len(images),) + INPUT_SHAPE, dtype=np.float32)
+
+    def decode(index):
+        # Load image and convert to greyscale space, then resize
+        image = PIL.Image.open(io.BytesIO(images[index])).convert('L')
+        batch[index] = np.asarray(image.resize((28, 28))).reshape(INPUT_SHAPE)
+        batch[index] *= 1. / 255
+
+    if len(images) == 1:
+        decode(0)
+    else:
+        _get_decode_pool().map(decode, range(len(images)))
+    return batch
+
+
 ### NOTE: this function cannot use MXNet
 def neo_preprocess(payload, content_type):
+    """
+    Returns a float32 array of shape (batch, 1, 28, 28) from an array in the
+    NumPy format, a multipart/form-data payload of images, or an image
+    (application/x-image).
+    """
     import logging
     import numpy as np
     import io
 
     logging.info('Invoking user-defined pre-processing function')
 
-    if content_type != 'application/vnd+python.numpy+binary':
-        raise RuntimeError('Content type must be application/vnd+python.numpy+binary')
-
-    f = io.BytesIO(payload)
-    return np.load(f)
+    if content_type in NDARRAY_CONTENT_TYPES:
+        f = io.BytesIO(payload)
+        try:
+            # a pickled payload would run code of the request when loaded
+            images = np.load(f, allow_pickle=False)
+            return np.ascontiguousarray(images.reshape((-1,) + INPUT_SHAPE),
+                                        dtype=np.float32)
+        except (ValueError, EOFError) as e:
+            raise RuntimeError('Invalid NumPy array: %s' % e)
+    if content_type.startswith(MULTIPART_CONTENT_TYPE):
+        return _decode_images(_split_multipart(payload, content_type))
+    if content_type == 'application/x-image':
+        return _decode_images([payload])
+    raise RuntimeError('Content type must be one of %s, %s or '
+                       'application/x-image' % (', '.join(NDARRAY_CONTENT_TYPES),
+                                                MULTIPART_CONTENT_TYPE))
 
 ### NOTE: this function cannot use MXNet
 def neo_postprocess(result):
+    """
+    Returns the probabilities of a batch of outputs: a list of 10
+    probabilities for a batch of one image, a list of them otherwise.
+    """
     import logging
     import numpy as np
     import json
 
     logging.info('Invoking user-defined post-processing function')
 
-    # Softmax (assumes batch size 1)
-    result = np.squeeze(result)
-    result_exp = np.exp(result - np.max(result))
-    result = result_exp / np.sum(result_exp)
+    # Softmax over the classes of every image of the batch
+    result = np.asarray(result, dtype=np.float32)
+    result = result.reshape((-1, result.shape[-1]))
+    result_exp = np.exp(result - np.max(result, axis=1, keepdims=True))
+    result = result_exp / np.sum(result_exp, axis=1, keepdims=True)
 
+    if len(result) == 1:
+        result = result[0]
     response_body = json.dumps(result.tolist())
     content_type = 'application/json'
 
     return response_body, content_type
 
-
 if __name__ == '__main__':
     args = parse_args()
     num_gpus = int(os.environ['SM_NUM_GPUS'])
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+In-process benchmark of the TrackerErrorDetector lambda handler.
+
+Servo telemetry batches are sent through `error_detector.handler` with the fake
+`greengrasssdk` module installed. Throughput is reported per CPU second, which
+is the readings per second a single core can sustain.
+
+To learn more about the command line type:
+`python bench_error_detector.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+
+from fake_greengrasssdk import install_fake_greengrasssdk
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+lambda_dir = os.path.join(dir_path, '..', 'lambda', 'TrackerErrorDetector')
+
+
+def make_events(count, batch, servos, anomaly_rate):
+    events = list()
+    for i in range(count):
+        now = datetime.datetime.now().isoformat()
+        data = list()
+        for _ in range(batch):
+            goal = random.randint(0, 1023)
+            datum = {
+                "sensor_id": "servo{0}".format(random.randrange(servos)),
+                "ts": now,
+                "present_speed": random.randint(50, 300),
+                "present_position": goal + random.randint(-5, 5),
+                "present_load": random.gauss(200, 10),
+                "goal_position": goal,
+                "moving": True
+            }
+            if random.random() < anomaly_rate:
+                datum['present_load'] = 900
+                datum['present_speed'] = 0
+                datum['present_position'] = goal - 200
+            data.append(datum)
+        events.append(json.dumps({
+            "version": "2017-07-05",
+            "ggd_id": "servo_ggd",
+            "hostname": "bench",
+            "data": data
+        }))
+    return events
+
+
+def main(args):
+    fake_client = install_fake_greengrasssdk()
+    sys.path.insert(0, os.path.abspath(lambda_dir))
+    import error_detector
+
+    events = make_events(args.events, args.batch, args.servos,
+                         args.anomaly_rate)
+    readings = args.events * args.batch
+
+    wall_start = time.time()
+    cpu_start = time.process_time()
+    for event in events:
+        error_detector.handler(event, None)
+    cpu = time.process_time() - cpu_start
+    wall = time.time() - wall_start
+
+    result = {
+        "events": args.events,
+        "batch": args.batch,
+        "readings": readings,
+        "wall_s": wall,
+        "cpu_s": cpu,
+        "readings_per_s": readings / wall,
+        "readings_per_cpu_s": readings / cpu,
+        "error_publishes": fake_client.publishes,
+        "detector": error_detector.detector.stats()
+    }
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the TrackerErrorDetector handler in-process',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--events', default=10000, type=int,
+                        help="Number of telemetry events to handle.")
+    parser.add_argument('--batch', default=64, type=int,
+                        help="Number of readings per event.")
+    parser.add_argument('--servos', default=16, type=int,
+                        help="Number of distinct servos.")
+    parser.add_argument('--anomaly-rate', dest='anomaly_rate', default=0.001,
+                        type=float,
+                        help="Fraction of readings that are obstructed.")
+
+    main(parser.parse_args())
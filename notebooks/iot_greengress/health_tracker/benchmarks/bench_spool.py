@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Benchmark of the GGD `PublishSpool` through a simulated Core outage.
+
+Heart rate messages are published while the fake client is offline, then the
+client comes back online and the backlog is replayed. The spill rate, disk use
+and replay throughput help size the spool for multi-hour outages: at a given
+message rate, an outage of `N` seconds needs `rate * N * bytes_per_msg` of disk.
+
+To learn more about the command line type: `python bench_spool.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import datetime
+import tempfile
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..', 'tracker', 'ggd'))
+
+from spool import PublishSpool, POLICIES
+
+
+class FakeMQTTClient(object):
+    def __init__(self):
+        self.up = False
+        self.received = 0
+
+    def publish(self, topic, payload, qos):
+        if not self.up:
+            raise EnvironmentError("offline")
+        self.received += 1
+        return True
+
+
+def main(args):
+    spool_dir = args.spool_dir or tempfile.mkdtemp(prefix='spool_bench_')
+    client = FakeMQTTClient()
+    spool = PublishSpool(
+        client, spool_dir=spool_dir, name='bench',
+        memory_limit=args.memory_limit, max_disk_bytes=args.max_disk_mb << 20,
+        policy=args.policy, replay_batch=args.replay_batch)
+    spool.on_offline()
+
+    msg = {
+        "version": "2017-07-05",
+        "ggd_id": "heartrate_ggd",
+        "hostname": "bench",
+        "data": [{
+            "sensor_id": "user1",
+            "ts": datetime.datetime.now().isoformat(),
+            "value": 72
+        }]
+    }
+    payload = json.dumps(msg)
+
+    start = time.time()
+    for _ in range(args.messages):
+        spool.publish('heartrate', payload, 0)
+    spill_s = time.time() - start
+    offline_stats = spool.stats()
+
+    client.up = True
+    start = time.time()
+    spool.on_online()
+    spool.wait(args.timeout)
+    replay_s = time.time() - start
+
+    result = {
+        "messages": args.messages,
+        "spill_msgs_per_s": args.messages / spill_s,
+        "offline": offline_stats,
+        "bytes_per_msg": float(offline_stats['disk_bytes']) /
+        max(offline_stats['disk_depth'], 1),
+        "replay_s": replay_s,
+        "replay_msgs_per_s": client.received / replay_s,
+        "received": client.received,
+        "final": spool.stats()
+    }
+    print(json.dumps(result, indent=2, sort_keys=True))
+    spool.close()
+    if not args.spool_dir:
+        shutil.rmtree(spool_dir)
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the GGD publish spool through an outage',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--messages', default=200000, type=int,
+                        help="Messages published during the outage.")
+    parser.add_argument('--memory-limit', dest='memory_limit', default=1000,
+                        type=int, help="In-memory queue length.")
+    parser.add_argument('--max-disk-mb', dest='max_disk_mb', default=256,
+                        type=int, help="Disk budget of the spool in MB.")
+    parser.add_argument('--policy', default='drop_oldest', choices=POLICIES,
+                        help="Backpressure policy when the budget is full.")
+    parser.add_argument('--replay-batch', dest='replay_batch', default=100,
+                        type=int, help="Messages per replay batch.")
+    parser.add_argument('--spool-dir', dest='spool_dir',
+                        help="Spool directory. Defaults to a temp directory.")
+    parser.add_argument('--timeout', default=600, type=float,
+                        help="Seconds to wait for the replay.")
+
+    main(parser.parse_args())
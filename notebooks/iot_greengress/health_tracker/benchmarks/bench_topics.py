@@ -0,0 +1,178 @@
+#!/usr/bin/env python
+
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Benchmark of the GGD topic and connectivity indexes.
+
+Routes random topics through a `TopicTrie` of `--subscriptions` topic filters
+and through a linear scan of the same filters with paho's `topic_matches_sub`,
+which is how the MQTT client dispatches messages to per-topic callbacks, and
+checks that both return the same filters. Then looks up connectivity info
+values in a `ConnectivityIndex` and with a linear scan of the Cores'
+connectivity lists.
+
+To learn more about the command line type: `python bench_topics.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import random
+import argparse
+from collections import namedtuple
+
+from paho.mqtt.client import topic_matches_sub
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..', 'tracker', 'ggd'))
+
+from topics import ConnectivityIndex, TopicTrie
+
+ConnectivityInfo = namedtuple('ConnectivityInfo', 'id host port metadata')
+CoreConnectivityInfo = namedtuple(
+    'CoreConnectivityInfo', 'coreThingArn connectivityInfoList')
+
+
+def make_filters(count, depth, fanout):
+    levels = ['level{0}'.format(i) for i in range(fanout)]
+    filters = set()
+    while len(filters) < count:
+        f = [random.choice(levels) for _ in range(random.randint(1, depth))]
+        r = random.random()
+        if r < 0.1:
+            f[random.randrange(len(f))] = '+'
+        elif r < 0.15:
+            f.append('#')
+        filters.add('/'.join(f))
+    return sorted(filters), levels
+
+
+def make_topics(count, depth, levels):
+    return ['/'.join(random.choice(levels)
+                     for _ in range(random.randint(1, depth)))
+            for _ in range(count)]
+
+
+def linear_conn_info(core_connectivity_info_list, match):
+    conn_info = list()
+    for cil in core_connectivity_info_list:
+        for ci in cil.connectivityInfoList:
+            if match == ci.id or match == ci.host or match == ci.port or \
+                    match == ci.metadata:
+                conn_info.append(ci)
+    return conn_info
+
+
+def timed(func, items):
+    start = time.time()
+    results = [func(item) for item in items]
+    return time.time() - start, results
+
+
+def bench_topics(args):
+    filters, levels = make_filters(args.subscriptions, args.depth, args.fanout)
+    topics = make_topics(args.messages, args.depth, levels)
+
+    start = time.time()
+    trie = TopicTrie()
+    for f in filters:
+        trie.add(f, f)
+    build = time.time() - start
+
+    trie_s, trie_matches = timed(trie.match, topics)
+    linear_s, linear_matches = timed(
+        lambda t: [f for f in filters if topic_matches_sub(f, t)], topics)
+    mismatches = sum(
+        1 for a, b in zip(trie_matches, linear_matches) if set(a) != set(b))
+    return {
+        "subscriptions": len(filters),
+        "messages": len(topics),
+        "avg_matches": sum(len(m) for m in trie_matches) / float(len(topics)),
+        "trie_build_s": build,
+        "trie_msgs_per_s": len(topics) / trie_s,
+        "linear_msgs_per_s": len(topics) / linear_s,
+        "speedup": linear_s / trie_s,
+        "mismatches": mismatches
+    }
+
+
+def bench_connectivity(args):
+    cores = list()
+    for c in range(args.cores):
+        cores.append(CoreConnectivityInfo(
+            "arn:core{0}".format(c), [
+                ConnectivityInfo("ci{0}_{1}".format(c, i),
+                                 "10.{0}.{1}.{2}".format(c % 256, i // 256,
+                                                         i % 256),
+                                 8883, "core{0}".format(c))
+                for i in range(args.endpoints)
+            ]))
+    lookups = [
+        random.choice(["ci{0}_{1}", "10.{0}.0.{1}"]).format(
+            random.randrange(args.cores), random.randrange(args.endpoints))
+        for _ in range(args.lookups)
+    ]
+
+    start = time.time()
+    index = ConnectivityIndex(cores)
+    build = time.time() - start
+    index_s, index_results = timed(index.get, lookups)
+    linear_s, linear_results = timed(
+        lambda m: linear_conn_info(cores, m), lookups)
+    return {
+        "connectivity_infos": args.cores * args.endpoints,
+        "lookups": len(lookups),
+        "index_build_s": build,
+        "index_lookups_per_s": len(lookups) / index_s,
+        "linear_lookups_per_s": len(lookups) / linear_s,
+        "speedup": linear_s / index_s,
+        "mismatches": sum(
+            1 for a, b in zip(index_results, linear_results) if a != b)
+    }
+
+
+def main(args):
+    random.seed(args.seed)
+    result = {
+        "topics": bench_topics(args),
+        "connectivity": bench_connectivity(args)
+    }
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the GGD topic trie and connectivity index',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--subscriptions', default=10000, type=int,
+                        help="Number of distinct topic filters.")
+    parser.add_argument('--messages', default=1000, type=int,
+                        help="Number of topics to route.")
+    parser.add_argument('--depth', default=6, type=int,
+                        help="Maximum number of levels per topic.")
+    parser.add_argument('--fanout', default=8, type=int,
+                        help="Number of distinct names per topic level.")
+    parser.add_argument('--cores', default=100, type=int,
+                        help="Number of Cores in the connectivity list.")
+    parser.add_argument('--endpoints', default=100, type=int,
+                        help="Number of connectivity infos per Core.")
+    parser.add_argument('--lookups', default=2000, type=int,
+                        help="Number of connectivity lookups.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+
+    main(parser.parse_args())
@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+In-process benchmark of the TrackerBrain lambda handler.
+
+The `greengrasssdk` module only exists on a Greengrass Core, so the fake module
+from `fake_greengrasssdk` is installed before `tracker_brain` is imported.
+
+To learn more about the command line type:
+`python bench_tracker_brain.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import datetime
+
+from fake_greengrasssdk import install_fake_greengrasssdk
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+lambda_dir = os.path.join(dir_path, '..', 'lambda', 'TrackerBrain')
+
+
+class FakeContext(object):
+    function_name = 'TrackerBrain'
+    client_context = None
+
+
+def make_events(count, batch, sensors, ggd_id):
+    events = list()
+    for i in range(count):
+        now = datetime.datetime.now().isoformat()
+        events.append(json.dumps({
+            "version": "2017-07-05",
+            "ggd_id": ggd_id,
+            "hostname": "bench",
+            "data": [{
+                "sensor_id": "user{0}".format(random.randrange(sensors)),
+                "ts": now,
+                "value": random.randint(60, 100)
+            } for _ in range(batch)]
+        }))
+    return events
+
+
+def main(args):
+    fake_client = install_fake_greengrasssdk()
+    sys.path.insert(0, os.path.abspath(lambda_dir))
+    import tracker_brain
+
+    events = make_events(args.events, args.batch, args.sensors, args.ggd_id)
+    context = FakeContext()
+
+    start = time.time()
+    for event in events:
+        tracker_brain.handler(event, context)
+    elapsed = time.time() - start
+
+    result = {
+        "events": args.events,
+        "batch": args.batch,
+        "elapsed_s": elapsed,
+        "events_per_s": args.events / elapsed,
+        "data_per_s": args.events * args.batch / elapsed,
+        "shadow_updates": fake_client.shadow_updates,
+        "router": tracker_brain.router.stats()
+    }
+    if hasattr(tracker_brain, 'shadow_writer'):
+        result['shadow_writer'] = tracker_brain.shadow_writer.stats()
+    if hasattr(tracker_brain, 'hr_stats'):
+        result['hr_stats'] = tracker_brain.hr_stats.stats()
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the TrackerBrain handler in-process',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--events', default=100000, type=int,
+                        help="Number of events to handle.")
+    parser.add_argument('--batch', default=1, type=int,
+                        help="Number of data elements per event.")
+    parser.add_argument('--sensors', default=100, type=int,
+                        help="Number of distinct heart rate sensors.")
+    parser.add_argument('--ggd-id', dest='ggd_id', default='hr_ggd',
+                        help="The ggd_id placed in every event.")
+
+    main(parser.parse_args())
@@ -0,0 +1,48 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+In-memory stand-in for the `greengrasssdk` module, which only exists on a
+Greengrass Core, so the Tracker lambdas can be benchmarked in-process.
+"""
+
+import sys
+import types
+
+
+class FakeIotDataClient(object):
+    """Records the calls a Greengrass `iot-data` client would receive"""
+
+    def __init__(self):
+        self.shadow_updates = 0
+        self.publishes = 0
+        self.published = dict()
+
+    def update_thing_shadow(self, thingName, payload):
+        self.shadow_updates += 1
+        return {'payload': payload}
+
+    def publish(self, topic, payload, qos=0):
+        self.publishes += 1
+        self.published[topic] = self.published.get(topic, 0) + 1
+
+
+def install_fake_greengrasssdk():
+    """
+    Install the fake module into `sys.modules` and return the client every
+    `greengrasssdk.client('iot-data')` call will share.
+    """
+    fake_client = FakeIotDataClient()
+    module = types.ModuleType('greengrasssdk')
+    module.client = lambda name: fake_client
+    sys.modules['greengrasssdk'] = module
+    return fake_client
@@ -0,0 +1,316 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import json
+import hashlib
+import logging
+
+# (definition kind, config file key, definition version parameter)
+DEFINITION_KINDS = (
+    ('core', 'core_def', 'Cores'),
+    ('device', 'device_def', 'Devices'),
+    ('function', 'func_def', 'Functions'),
+    ('logger', 'logger_def', 'Loggers'),
+    ('subscription', 'subscription_def', 'Subscriptions')
+)
+
+# the loggers created by `gg_group_setup`
+DEFAULT_LOGGERS = [{
+    "Id": "gg-logging",
+    "Component": "GreengrassSystem", "Level": "INFO",
+    "Space": 5000,  # size in KB
+    "Type": "FileSystem"
+}, {
+    "Id": "func-logging",
+    "Component": "Lambda", "Level": "INFO",
+    "Space": 5000,  # size in KB
+    "Type": "FileSystem"
+}]
+
+
+def _normalize(definition):
+    return sorted(definition, key=lambda d: d['Id'])
+
+
+def digest(definition):
+    """
+    :return: a digest of a definition that ignores the order of its entries
+    """
+    data = json.dumps(_normalize(definition), sort_keys=True)
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+
+def diff_definition(deployed, desired):
+    """
+    Structurally compare two definitions, entry by entry using their `Id`.
+
+    :return: a dict with the `added` and `removed` entry Ids, and the
+        `changed` entry Ids mapped to their changed fields, or `None` when
+        both definitions are the same
+    """
+    if deployed is None:
+        return {
+            "added": sorted(d['Id'] for d in desired),
+            "removed": [],
+            "changed": {}
+        }
+    old = dict((d['Id'], d) for d in deployed)
+    new = dict((d['Id'], d) for d in desired)
+    changed = dict()
+    for entry_id in set(old) & set(new):
+        fields = sorted(
+            k for k in set(old[entry_id]) | set(new[entry_id])
+            if old[entry_id].get(k) != new[entry_id].get(k)
+        )
+        if fields:
+            changed[entry_id] = fields
+    added = sorted(set(new) - set(old))
+    removed = sorted(set(old) - set(new))
+    if not (added or removed or changed):
+        return None
+    return {"added": added, "removed": removed, "changed": changed}
+
+
+class DeployedState(object):
+    """
+    Local cache of what was last deployed for a group, stored next to the
+    group's config file as `<config>.deployed.json`.
+
+    For every definition kind it keeps the definition and version ARN that was
+    last created, so a plan can be computed without any API calls.
+    """
+
+    def __init__(self, config_file):
+        root, _ = os.path.splitext(config_file)
+        self.state_file = root + '.deployed.json'
+        self.state = self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {"definitions": {}, "functions": {}}
+
+    def definition(self, kind):
+        return self.state['definitions'].get(kind)
+
+    def set_definition(self, kind, definition_id, version_arn, definition):
+        self.state['definitions'][kind] = {
+            "id": definition_id,
+            "version_arn": version_arn,
+            "digest": digest(definition),
+            "definition": _normalize(definition)
+        }
+
+    def function(self, name):
+        return self.state['functions'].get(name)
+
+    def set_function(self, name, arn, configuration, version):
+        self.state['functions'][name] = {
+            "arn": arn,
+            "configuration": configuration,
+            "version": version
+        }
+
+    def save(self):
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self.state, f, indent=2, separators=(',', ': '),
+                      sort_keys=True)
+        os.rename(tmp_file, self.state_file)
+
+
+class GroupPlanner(object):
+    """
+    Incremental deployment of a Greengrass group.
+
+    `plan` builds the desired core, device, function, logger and subscription
+    definitions from the group type and config, and diffs each against the
+    `DeployedState`. `apply` then creates new versions of only the changed
+    definitions, a new group version only when a definition changed, and a
+    deployment only when the group version or a function's code changed.
+    """
+
+    def __init__(self, group_type, config, state):
+        self.group_type = group_type
+        self.config = config
+        self.state = state
+
+    def _function_definition(self, cfg, configurations):
+        functions = list()
+        for name, func in sorted(cfg['lambda_functions'].items()):
+            if not func.get('arn'):
+                continue
+            functions.append({
+                "Id": name.lower(),
+                "FunctionArn": func['arn'],
+                "FunctionConfiguration": configurations.get(name)
+            })
+        return functions
+
+    def desired(self, function_configurations=None):
+        """
+        :param function_configurations: the `FunctionConfiguration` of each
+            Lambda by name, by default those cached in the deployed state
+        :return: the desired definitions by kind
+        """
+        cfg = self.config.get_config()
+        if function_configurations is None:
+            function_configurations = dict(
+                (name, f['configuration'])
+                for name, f in self.state.state['functions'].items()
+            )
+        return {
+            "core": self.group_type.get_core_definition(config=cfg),
+            "device": self.group_type.get_device_definition(config=cfg),
+            "function": self._function_definition(
+                cfg, function_configurations),
+            "logger": list(DEFAULT_LOGGERS),
+            "subscription":
+                self.group_type.get_subscription_definition(config=cfg)
+        }
+
+    def plan(self, desired=None):
+        """
+        :return: a dict of the changes of each changed definition kind
+        """
+        if desired is None:
+            desired = self.desired()
+        changes = dict()
+        for kind, _, _ in DEFINITION_KINDS:
+            deployed = self.state.definition(kind)
+            if deployed is not None and \
+                    deployed['digest'] == digest(desired[kind]):
+                continue
+            change = diff_definition(
+                deployed['definition'] if deployed else None, desired[kind])
+            if change is not None:
+                changes[kind] = change
+        return changes
+
+    def _refresh_functions(self, lambda_client, cfg):
+        """
+        Get the configuration and alias version of every configured Lambda.
+
+        :return: a `(configurations, updated)` tuple of the Lambda
+            configurations by name and the names of the Lambdas whose alias
+            points at a new version
+        """
+        updated = list()
+        configurations = dict()
+        for name, func in sorted(cfg['lambda_functions'].items()):
+            if not func.get('arn'):
+                continue
+            f = lambda_client.get_function(
+                FunctionName=name, Qualifier=func['arn_qualifier'])
+            c = f['Configuration']
+            configurations[name] = {
+                "Executable": c['Handler'],
+                "MemorySize": int(c['MemorySize']) * 1000,
+                "Timeout": int(c['Timeout'])
+            }
+            cached = self.state.function(name)
+            if cached is None or cached['version'] != c['Version']:
+                updated.append(name)
+            self.state.set_function(
+                name, func['arn'], configurations[name], c['Version'])
+        return configurations, updated
+
+    def apply(self, gg_client, lambda_client, group_name, refresh=False,
+              force_deploy=False):
+        """
+        Create the changed definition versions and deploy them.
+
+        :param refresh: get the Lambda configurations and versions from the
+            Lambda service instead of using the cached ones
+        :param force_deploy: deploy even when nothing changed
+        :return: a dict describing the applied plan and deployment
+        """
+        cfg = self.config.get_config()
+        cached = self.state.state['functions']
+        missing = [n for n, f in cfg['lambda_functions'].items()
+                   if f.get('arn') and n not in cached]
+        updated_functions = list()
+        configurations = None
+        if refresh or missing:
+            configurations, updated_functions = self._refresh_functions(
+                lambda_client, cfg)
+
+        desired = self.desired(configurations)
+        changes = self.plan(desired)
+
+        for kind, config_key, param in DEFINITION_KINDS:
+            if kind not in changes:
+                continue
+            if kind == 'function' and not desired[kind]:
+                continue
+            definition_id = cfg[config_key].get('id')
+            if not definition_id:
+                definition_id = getattr(
+                    gg_client, 'create_{0}_definition'.format(kind))(
+                    Name="{0}_{1}_def".format(group_name, kind))['Id']
+            kwargs = {
+                "{0}DefinitionId".format(kind.capitalize()): definition_id,
+                param: desired[kind]
+            }
+            version = getattr(
+                gg_client, 'create_{0}_definition_version'.format(kind))(
+                **kwargs)
+            logging.info("[apply] created {0} definition version:{1}".format(
+                kind, version['Arn']))
+            cfg[config_key] = {
+                'id': definition_id, 'version_arn': version['Arn']
+            }
+            self.state.set_definition(
+                kind, definition_id, version['Arn'], desired[kind])
+
+        group = cfg['group']
+        if changes:
+            kwargs = dict(GroupId=group['id'])
+            for kind, config_key, _ in DEFINITION_KINDS:
+                arn = cfg[config_key].get('version_arn')
+                if arn:
+                    kwargs["{0}DefinitionVersionArn".format(
+                        kind.capitalize())] = arn
+            grp = gg_client.create_group_version(**kwargs)
+            group['version_arn'] = grp['Arn']
+            group['version'] = grp['Version']
+            logging.info("[apply] created group version:{0}".format(
+                grp['Version']))
+
+        deployment_id = None
+        needs_deploy = force_deploy or updated_functions or \
+            self.state.state.get('deployed_version') != group.get('version')
+        if needs_deploy:
+            dep = gg_client.create_deployment(
+                GroupId=group['id'], GroupVersionId=group['version'],
+                DeploymentType="NewDeployment")
+            deployment_id = dep['DeploymentId']
+            self.state.state['deployed_version'] = group['version']
+            self.state.state['deployment_id'] = deployment_id
+            logging.info("[apply] deployment_id:{0}".format(deployment_id))
+        else:
+            logging.info("[apply] nothing changed, skipping deployment")
+
+        if changes:
+            # write the config file once, with every new version ARN
+            cfg['group'] = group
+            self.config.write_config(cfg)
+        self.state.save()
+        return {
+            "changes": changes,
+            "updated_functions": updated_functions,
+            "group_version": group.get('version'),
+            "deployment_id": deployment_id
+        }
@@ -14,11 +14,13 @@
 
 import fire
 import json
+import boto3
 import logging
 
 from gg_group_setup import GroupConfigFile
 from gg_group_setup import GroupCommands
 from gg_group_setup import GroupType
+from group_plan import DeployedState, GroupPlanner
 
 
 logging.basicConfig(format='%(asctime)s|%(name)-8s|%(levelname)s: %(message)s',
@@ -111,10 +113,16 @@ class TrackerGroupType(GroupType):
         """
         Get the Tracker Group Type's subscription definition
 
+        The definition only depends on the config's devices, Lambda functions
+        and subscription topics, so it is built once and reused until one of
+        those changes.
+
         :param config: gg_group_setup.GroupConfigFile used with the Group Type
         :return: the subscription definition used to provision the group
         """
-        cfg = config
+        # read the config file once instead of once per section
+        cfg = config.get_config() if hasattr(config, 'get_config') else config
+
         d = cfg['devices']
         l = cfg['lambda_functions']
         s = cfg['subscriptions']
@@ -132,6 +140,12 @@ class TrackerGroupType(GroupType):
                 "Subject": s['errors'],
                 "Target": "cloud"
             },
+            {  # from TrackerBrain Lambda heart rate alerts to AWS cloud
+                "Id": "14",
+                "Source": l['TrackerBrain']['arn'],
+                "Subject": s.get('alerts', 'tracker/alerts'),
+                "Target": "cloud"
+            },
             {  # from Tracker web device to Greengrass Core local shadow
                 "Id": "16",
                 "Source": d[self.web_ggd_name]['thing_arn'],
@@ -171,6 +185,56 @@ class TrackerGroupCommands(GroupCommands):
             TrackerGroupType.CORE_TYPE: TrackerGroupType
         })
 
+    def _planner(self, config_file, group_type=TrackerGroupType.CORE_TYPE,
+                 region=None):
+        config = GroupConfigFile(config_file=config_file)
+        if config.is_fresh():
+            raise ValueError("Config not yet tracking a group. Cannot plan.")
+        gt = self.group_types[group_type](
+            config=config, region=region or self._region)
+        return GroupPlanner(gt, config, DeployedState(config_file))
+
+    def plan(self, config_file, group_type=TrackerGroupType.CORE_TYPE):
+        """
+        Show the definition changes `apply` would deploy, using only the local
+        config file and cached deployed state.
+
+        :param config_file: config file of the group to plan
+        :param group_type: the type of the group
+        """
+        changes = self._planner(config_file, group_type).plan()
+        if not changes:
+            print("No changes. The deployed group is up to date.")
+        else:
+            print(json.dumps(changes, indent=2, sort_keys=True))
+        return changes
+
+    def apply(self, config_file, group_type=TrackerGroupType.CORE_TYPE,
+              region=None, refresh=False, force=False):
+        """
+        Create new versions of only the changed definitions and deploy the
+        group when a definition or a Lambda's aliased version changed.
+
+        :param config_file: config file of the group to deploy
+        :param group_type: the type of the group
+        :param region: the region of the group
+        :param refresh: get the Lambda configurations and versions from the
+            Lambda service, needed to deploy updated Lambda code
+        :param force: deploy even when nothing changed
+        """
+        if region is None:
+            region = self._region
+        planner = self._planner(config_file, group_type, region)
+        group = planner.config['group']
+        result = planner.apply(
+            gg_client=boto3.client("greengrass", region_name=region),
+            lambda_client=boto3.client("lambda", region_name=region),
+            group_name=group.get('name') or group_type,
+            refresh=refresh, force_deploy=force
+        )
+        print(json.dumps(result, indent=2, sort_keys=True))
+        return result
+
     @staticmethod
     def associate_lambda(group_config, lambda_config):
         """
@@ -188,13 +252,18 @@ class TrackerGroupCommands(GroupCommands):
 
         config = GroupConfigFile(config_file=group_config)
 
-        lambdas = config['lambda_functions']
-        lambdas[cfg['func_name']] = {
+        group_cfg = config.get_config()
+        func = {
             'arn': cfg['lambda_arn'],
             'arn_qualifier': cfg['lambda_alias']
         }
+        if group_cfg['lambda_functions'].get(cfg['func_name']) == func:
+            logging.info("[associate_lambda] {0} already associated".format(
+                cfg['func_name']))
+            return
 
-        config['lambda_functions'] = lambdas
+        group_cfg['lambda_functions'][cfg['func_name']] = func
+        config.write_config(group_cfg)
 
 
 if __name__ == '__main__':
@@ -203,7 +272,8 @@ if __name__ == '__main__':
     uses the two sub-classed GroupType classes. 
     
     The sub-class of GroupCommands will then use the sub-classed GroupTypes to 
-    expose the `create`, `deploy`, `clean-all`, `clean-file`, etc. commands.
+    expose the `create`, `deploy`, `clean-all`, `clean-file`, etc. commands, 
+    and the incremental `plan` and `apply` commands.
     
     Note: executing `clean-file` will result in stranded provisioned artifacts 
     in the AWS Greengrass service. These will artifacts will need manual 
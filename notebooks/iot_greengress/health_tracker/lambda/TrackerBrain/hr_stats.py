@@ -0,0 +1,175 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from __future__ import print_function
+import math
+import time
+from array import array
+
+INF = float('inf')
+
+
+class SensorStatsTable(object):
+    """
+    Streaming heart rate statistics for many sensors in O(1) memory each.
+
+    Every statistic is a column stored in a compact `array.array`, and each
+    sensor id maps to a row index, so 100k sensors need a few megabytes rather
+    than one dict per sensor. For every reading the table updates:
+
+    - Welford's running mean and variance
+    - an exponentially weighted moving average and variance (EWMA)
+    - the min/max of the current and previous `window` second windows, which
+      together cover the last `window` to `2 * window` seconds
+
+    `update` returns the alerts raised by the reading: `low` and `high` for
+    values outside `[low, high]`, and `deviation` for values more than
+    `max_sigma` EWMA standard deviations from the EWMA, once a sensor has seen
+    `warmup` readings.
+    """
+
+    COLUMNS = (
+        'count', 'mean', 'm2', 'ewma', 'ewmvar', 'window_start',
+        'cur_min', 'cur_max', 'prev_min', 'prev_max'
+    )
+
+    def __init__(self, low=40, high=180, max_sigma=4.0, alpha=0.1,
+                 window=60.0, warmup=10):
+        self.low = low
+        self.high = high
+        self.max_sigma = max_sigma
+        self.alpha = alpha
+        self.window = window
+        self.warmup = warmup
+
+        self._rows = dict()
+        self.count = array('l')
+        self.mean = array('d')
+        self.m2 = array('d')
+        self.ewma = array('d')
+        self.ewmvar = array('d')
+        self.window_start = array('d')
+        self.cur_min = array('d')
+        self.cur_max = array('d')
+        self.prev_min = array('d')
+        self.prev_max = array('d')
+        self.alerts = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _row(self, sensor_id, now):
+        row = self._rows.get(sensor_id)
+        if row is None:
+            row = self._rows[sensor_id] = len(self.count)
+            self.count.append(0)
+            for column in (self.mean, self.m2, self.ewma, self.ewmvar):
+                column.append(0.0)
+            self.window_start.append(now)
+            self.cur_min.append(INF)
+            self.cur_max.append(-INF)
+            self.prev_min.append(INF)
+            self.prev_max.append(-INF)
+        return row
+
+    def update(self, sensor_id, value, now=None):
+        """
+        Add a reading to the sensor's statistics.
+
+        :return: a list of zero or more alert names raised by the reading
+        """
+        if now is None:
+            now = time.time()
+        row = self._row(sensor_id, now)
+        value = float(value)
+        alerts = list()
+
+        if value < self.low:
+            alerts.append('low')
+        elif value > self.high:
+            alerts.append('high')
+
+        n = self.count[row]
+        ewma = self.ewma[row]
+        ewmvar = self.ewmvar[row]
+        if n >= self.warmup and ewmvar > 0 and \
+                abs(value - ewma) > self.max_sigma * math.sqrt(ewmvar):
+            alerts.append('deviation')
+
+        # Welford's online mean and variance
+        n += 1
+        delta = value - self.mean[row]
+        mean = self.mean[row] + delta / n
+        self.m2[row] += delta * (value - mean)
+        self.mean[row] = mean
+        self.count[row] = n
+
+        # exponentially weighted moving average and variance
+        if n == 1:
+            self.ewma[row] = value
+        else:
+            diff = value - ewma
+            incr = self.alpha * diff
+            self.ewma[row] = ewma + incr
+            self.ewmvar[row] = (1 - self.alpha) * (ewmvar + diff * incr)
+
+        # tumbling min/max windows
+        elapsed = now - self.window_start[row]
+        if elapsed >= self.window:
+            if elapsed < 2 * self.window:
+                self.prev_min[row] = self.cur_min[row]
+                self.prev_max[row] = self.cur_max[row]
+            else:
+                self.prev_min[row] = INF
+                self.prev_max[row] = -INF
+            self.cur_min[row] = INF
+            self.cur_max[row] = -INF
+            self.window_start[row] = now
+        if value < self.cur_min[row]:
+            self.cur_min[row] = value
+        if value > self.cur_max[row]:
+            self.cur_max[row] = value
+
+        if alerts:
+            self.alerts += 1
+        return alerts
+
+    def snapshot(self, sensor_id):
+        """Return the current statistics of one sensor as a dict"""
+        row = self._rows.get(sensor_id)
+        if row is None:
+            return None
+        n = self.count[row]
+        return {
+            "count": n,
+            "mean": self.mean[row],
+            "stddev": math.sqrt(self.m2[row] / (n - 1)) if n > 1 else 0.0,
+            "ewma": self.ewma[row],
+            "ewm_stddev": math.sqrt(self.ewmvar[row]),
+            "min": min(self.cur_min[row], self.prev_min[row]),
+            "max": max(self.cur_max[row], self.prev_max[row])
+        }
+
+    def stats(self):
+        return {
+            "sensors": len(self._rows),
+            "alerts": self.alerts,
+            "table_bytes": sum(
+                getattr(self, c).itemsize * len(getattr(self, c))
+                for c in self.COLUMNS
+            )
+        }
@@ -0,0 +1,142 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from __future__ import print_function
+import json
+import logging
+from timeit import default_timer as timer
+
+log = logging.getLogger('brain')
+
+
+class HandlerMetrics(object):
+    """Call count and latency of one registered device handler"""
+
+    __slots__ = ('calls', 'data', 'errors', 'total', 'max')
+
+    def __init__(self):
+        self.calls = 0
+        self.data = 0
+        self.errors = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, elapsed, data):
+        self.calls += 1
+        self.data += data
+        self.total += elapsed
+        if elapsed > self.max:
+            self.max = elapsed
+
+    def as_dict(self):
+        return {
+            "calls": self.calls,
+            "data": self.data,
+            "errors": self.errors,
+            "mean_ms": self.total / self.calls * 1e3 if self.calls else 0.0,
+            "max_ms": self.max * 1e3
+        }
+
+
+class DeviceRouter(object):
+    """
+    Routes GGD messages to the handler registered for the message's `ggd_id`.
+
+    Every element of the message's `data` list is passed to the handler as
+    `handler(msg, datum)`. Messages are validated against the GGD message
+    format before dispatch; invalid and unroutable messages are counted and
+    logged instead of raising.
+    """
+
+    def __init__(self):
+        self._handlers = dict()
+        self.metrics = dict()
+        self.invalid = 0
+        self.unknown = 0
+
+    def register(self, ggd_id, handler=None):
+        """
+        Register `handler` for messages from `ggd_id`. Can be used as a
+        decorator: `@router.register('hr_ggd')`.
+        """
+        if handler is None:
+            def decorator(func):
+                self.register(ggd_id, func)
+                return func
+            return decorator
+
+        self._handlers[ggd_id] = handler
+        self.metrics[ggd_id] = HandlerMetrics()
+        return handler
+
+    def route(self, event):
+        """
+        Decode `event` when needed, validate it and dispatch every datum.
+
+        :param event: the raw lambda event, either a JSON document or an
+            already decoded `dict`
+        :return: the number of data elements handled
+        """
+        if isinstance(event, dict):
+            msg = event
+        else:
+            try:
+                msg = json.loads(event)
+            except ValueError as ve:
+                self.invalid += 1
+                log.error("[route] undecodable event:%s error:%s", event, ve)
+                return 0
+
+        ggd_id = msg.get('ggd_id') if isinstance(msg, dict) else None
+        data = msg.get('data') if isinstance(msg, dict) else None
+        if ggd_id is None or not isinstance(data, list):
+            self.invalid += 1
+            log.error("[route] invalid message:%s", msg)
+            return 0
+
+        func = self._handlers.get(ggd_id)
+        if func is None:
+            self.unknown += 1
+            log.error("[route] unknown ggd_id:%s", ggd_id)
+            return 0
+
+        metrics = self.metrics[ggd_id]
+        handled = 0
+        start = timer()
+        for datum in data:
+            if not isinstance(datum, dict):
+                self.invalid += 1
+                log.error("[route] invalid datum:%s ggd_id:%s", datum, ggd_id)
+                continue
+            try:
+                func(msg, datum)
+                handled += 1
+            except Exception as e:
+                metrics.errors += 1
+                log.exception("[route] handler for ggd_id:%s failed:%s",
+                              ggd_id, e)
+        metrics.record(timer() - start, handled)
+        return handled
+
+    def stats(self):
+        return {
+            "invalid": self.invalid,
+            "unknown": self.unknown,
+            "handlers": dict(
+                (ggd_id, m.as_dict()) for ggd_id, m in self.metrics.items()
+            )
+        }
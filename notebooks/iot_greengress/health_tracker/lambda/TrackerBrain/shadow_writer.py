@@ -0,0 +1,180 @@
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+from __future__ import print_function
+import json
+import time
+import logging
+import threading
+
+log = logging.getLogger('brain')
+
+
+class ShadowWriter(object):
+    """
+    Coalesces per-sensor desired state into bounded-rate shadow updates.
+
+    The latest value of every sensor is kept as pending state and written to
+    the shadow as a single merged delta, at most once per `min_interval`
+    seconds. A change of at least `threshold` from the last written value is
+    flushed sooner, but never more often than once per `urgent_interval`.
+    Values equal to what the shadow already holds are never written. A failed
+    write is retried by a timer after `retry_interval` seconds, doubling after
+    every failure up to `max_retry_interval`.
+
+    The desired state keeps the shape it had before the coalescing:
+    `state_key` holds the latest value, of the sensor that changed last. The
+    value of every sensor is written under `<state_key>_sensors` as
+    `{sensor_id: value}`, which the shadow service merges with the existing
+    document. Each write also reports the writer's `stats()` under
+    `reported.shadow_writer`, so the coalescing can be observed in the shadow.
+    """
+
+    def __init__(self, gg_client, thing_name, state_key, min_interval=1.0,
+                 threshold=5, urgent_interval=0.1, retry_interval=1.0,
+                 max_retry_interval=30.0):
+        self.gg_client = gg_client
+        self.thing_name = thing_name
+        self.state_key = state_key
+        self.min_interval = min_interval
+        self.threshold = threshold
+        self.urgent_interval = urgent_interval
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+
+        self._pending = dict()
+        self._written = dict()
+        # the latest changed value, and the one the shadow holds
+        self._latest = None
+        self._written_latest = None
+        self._last_flush = 0.0
+        self._timer = None
+        self._retry_delay = retry_interval
+        self._lock = threading.Lock()
+
+        self.received = 0
+        self.coalesced = 0
+        self.skipped = 0
+        self.writes = 0
+        self.write_errors = 0
+
+    def update(self, sensor_id, value):
+        """
+        Record the latest `value` of `sensor_id`, flushing when due.
+
+        :return: True if this update caused a shadow write
+        """
+        with self._lock:
+            self.received += 1
+            if sensor_id in self._pending:
+                self.coalesced += 1
+            elif self._written.get(sensor_id) == value:
+                self.skipped += 1
+                return False
+
+            self._pending[sensor_id] = value
+            self._latest = value
+            elapsed = time.time() - self._last_flush
+            if elapsed >= self.min_interval or (
+                    elapsed >= self.urgent_interval and
+                    self._is_significant(sensor_id, value)):
+                return self._flush()
+
+            self._schedule(self.min_interval - elapsed)
+            return False
+
+    def flush(self):
+        """Write any pending state now, regardless of the rate bound."""
+        with self._lock:
+            return self._flush()
+
+    def stats(self):
+        return {
+            "received": self.received,
+            "coalesced": self.coalesced,
+            "skipped": self.skipped,
+            "writes": self.writes,
+            "write_errors": self.write_errors,
+            "pending": len(self._pending)
+        }
+
+    def _is_significant(self, sensor_id, value):
+        last = self._written.get(sensor_id)
+        if last is None:
+            return True
+        try:
+            return abs(value - last) >= self.threshold
+        except TypeError:
+            return value != last
+
+    def _schedule(self, delay):
+        if self._timer is not None:
+            return
+        self._timer = threading.Timer(max(delay, 0.0), self.flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        # drop values that drifted back to what the shadow already holds
+        delta = dict(
+            (k, v) for k, v in self._pending.items()
+            if self._written.get(k) != v
+        )
+        self._pending.clear()
+        if not delta:
+            return False
+
+        self._last_flush = time.time()
+        desired = {self.state_key + "_sensors": delta}
+        latest = self._latest
+        if latest != self._written_latest:
+            desired[self.state_key] = latest
+        try:
+            self.gg_client.update_thing_shadow(
+                thingName=self.thing_name, payload=json.dumps({
+                    "state": {
+                        "desired": desired,
+                        "reported": {
+                            "shadow_writer": self.stats()
+                        }
+                    }
+                }).encode()
+            )
+        except Exception as e:
+            self.write_errors += 1
+            log.error("[shadow_writer] update failed:%s retry in:%ss",
+                      e, self._retry_delay)
+            # keep the unwritten state and retry it, even without new updates
+            for k, v in delta.items():
+                self._pending.setdefault(k, v)
+            self._schedule(self._retry_delay)
+            self._retry_delay = min(self._retry_delay * 2,
+                                    self.max_retry_interval)
+            return False
+
+        self._written.update(delta)
+        self._written_latest = latest
+        self.writes += 1
+        self._retry_delay = self.retry_interval
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("[shadow_writer] wrote %s sensors stats:%s",
+                      len(delta), self.stats())
+        return True
@@ -21,6 +21,10 @@ import logging
 import datetime
 import greengrasssdk
 
+from hr_stats import SensorStatsTable
+from router import DeviceRouter
+from shadow_writer import ShadowWriter
+
 log = logging.getLogger('brain')
 handler = logging.StreamHandler()
 formatter = logging.Formatter(
@@ -30,6 +34,7 @@ log.addHandler(handler)
 log.setLevel(logging.INFO)
 
 GGC_SHADOW_NAME = "tracker_brain"
+ALERTS_TOPIC = "tracker/alerts"
 
 gg_client = greengrasssdk.client('iot-data')
 
@@ -43,40 +48,61 @@ gg_client.update_thing_shadow(
     }).encode()
 )
 
+# coalesce heart rate updates into at most one shadow write per second
+shadow_writer = ShadowWriter(
+    gg_client, GGC_SHADOW_NAME, state_key="heartrate",
+    min_interval=1.0, threshold=5
+)
 
-def handle_heartrate(msg):
-    hr_id = msg['data'][0]['sensor_id']
-    value = msg['data'][0]['value']
-    log.info("[handle_hr] hr id:'{0}' value:'{1}'".format(hr_id, value))
-    gg_client.update_thing_shadow(
-        thingName=GGC_SHADOW_NAME, payload=json.dumps({
-            "state": {
-                "desired": {
-                    "heartrate": value
-                }
-            }
-        }).encode()
-    )
+# streaming per-sensor heart rate statistics used to raise alerts
+hr_stats = SensorStatsTable(low=40, high=180, max_sigma=4.0)
 
-# Handler for processing lambda work items
-def handler(event, context):
-    log.debug("[handler] raw event:{0}".format(event))
-    # Unwrap the message
-    log.debug("[handler] context.function_name:{0}".format(
-        context.function_name))
-    log.debug("[handler] context.client_context:{0}".format(
-        context.client_context))
-    msg = json.loads(event)
-    # topic = context.client_context.custom['subject']
+router = DeviceRouter()
+
+
+@router.register("hr_ggd")
+def handle_heartrate(msg, datum):
+    hr_id = datum['sensor_id']
+    value = datum['value']
+    log.debug("[handle_hr] hr id:'%s' value:'%s'", hr_id, value)
+    alerts = hr_stats.update(hr_id, value)
+    if alerts:
+        publish_alert(hr_id, datum, alerts)
+    shadow_writer.update(hr_id, value)
 
-    ggd_id = ''
-    if 'ggd_id' in msg:
-        ggd_id = msg['ggd_id']
 
-    if ggd_id == "hr_ggd":
-        handle_heartrate(msg)
-    elif ggd_id == "bp_ggd":
-        log.debug("[handler] message from the blood pressure device")
-    else:
-        log.error("[handler] unknown ggd_id:{0}".format(ggd_id))
+def publish_alert(sensor_id, datum, alerts):
+    log.warning("[publish_alert] sensor:%s value:%s alerts:%s",
+                sensor_id, datum['value'], alerts)
+    alert = {
+        "sensor_id": sensor_id,
+        "ts": datum.get('ts'),
+        "value": datum['value'],
+        "alerts": alerts
+    }
+    alert.update(hr_stats.snapshot(sensor_id))
+    gg_client.publish(topic=ALERTS_TOPIC, payload=json.dumps({
+        "version": "2017-07-05",  # YYYY-MM-DD
+        "ggd_id": GGC_SHADOW_NAME,
+        "data": [alert]
+    }))
 
+
+@router.register("bp_ggd")
+def handle_blood_pressure(msg, datum):
+    log.debug("[handle_bp] message from the blood pressure device")
+
+
+@router.register("error_detector")
+def handle_error(msg, datum):
+    log.warning("[handle_error] servo:%s rules:%s ts:%s", datum.get('sensor_id'),
+                datum.get('rules'), datum.get('ts'))
+
+
+# Handler for processing lambda work items
+def handler(event, context):
+    log.debug("[handler] raw event:%s", event)
+    log.debug("[handler] context.function_name:%s", context.function_name)
+    log.debug("[handler] context.client_context:%s", context.client_context)
+    # topic = context.client_context.custom['subject']
+    router.route(event)
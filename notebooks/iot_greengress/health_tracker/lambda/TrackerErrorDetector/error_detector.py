@@ -13,32 +13,43 @@
 
 from __future__ import print_function
 import json
+import datetime
 import greengrasssdk
 
-gg_client = greengrasssdk.client('iot-data')
-
+from obstruction import ObstructionDetector
 
-def check_obstruction(datum):
-    present_speed = datum['present_speed']
-    present_position = datum['present_position']
-    present_load = datum['present_load']
-    goal_position = datum['goal_position']
-    moving = datum['moving']
+ERRORS_TOPIC = "tracker/errors"
+DETECTOR_ID = "error_detector"
 
-    print("[check_obstruction] present speed:{0} position:{1} load:{2}".format(
-        present_speed, present_position, present_load
-    ))
-    print("[check_obstruction] goal_position:{0} moving:{1}".format(
-        goal_position, moving
-    ))
+gg_client = greengrasssdk.client('iot-data')
+detector = ObstructionDetector()
+
+
+def check_obstruction(msg):
+    """
+    Run the obstruction rules over the message's whole `data` batch and publish
+    any anomalies to the errors topic.
+
+    :return: the list of detected anomalies
+    """
+    anomalies = detector.detect(msg['data'], ggd_id=msg.get('ggd_id'))
+    if anomalies:
+        print("[check_obstruction] {0} anomalies from ggd_id:{1}".format(
+            len(anomalies), msg.get('ggd_id')))
+        gg_client.publish(topic=ERRORS_TOPIC, payload=json.dumps({
+            "version": "2017-07-05",  # YYYY-MM-DD
+            "ggd_id": DETECTOR_ID,
+            "source_ggd_id": msg.get('ggd_id'),
+            "ts": datetime.datetime.now().isoformat(),
+            "data": anomalies
+        }))
+    return anomalies
 
 
 # Handler for processing lambda work items
 def handler(event, context):
     # Unwrap the message
-    msg = json.loads(event)
-    print("[error_detector] looking for errors")
+    msg = event if isinstance(event, dict) else json.loads(event)
 
-    if 'data' in msg:
-        for datum in msg['data']:
-            check_obstruction(datum)
+    if msg.get('data'):
+        check_obstruction(msg)
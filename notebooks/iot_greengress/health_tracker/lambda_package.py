@@ -0,0 +1,137 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import json
+import base64
+import hashlib
+import logging
+import zipfile
+from os.path import basename
+from concurrent.futures import ThreadPoolExecutor
+
+# every entry gets the same timestamp and permissions, so the same inputs
+# always produce a byte-identical zip and the same CodeSha256
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ZIP_FILE_MODE = 0o644 << 16
+# change when the zip layout changes, to invalidate previous builds
+BUILD_FORMAT = '1'
+
+
+def code_sha256(zip_path):
+    """
+    :return: the base64 encoded SHA-256 of a deployment package, the format of
+        a Lambda function's `CodeSha256`
+    """
+    sha = hashlib.sha256()
+    with open(zip_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            sha.update(chunk)
+    return base64.b64encode(sha.digest()).decode('ascii')
+
+
+def _entries(lambda_files, lambda_dir):
+    """:return: the sorted `(arcname, path)` entries of a package"""
+    return sorted(
+        (basename(f), os.path.join(lambda_dir, f)) for f in lambda_files)
+
+
+def inputs_digest(lambda_files, lambda_dir):
+    """:return: a digest of the names and contents of a package's files"""
+    sha = hashlib.sha256(BUILD_FORMAT.encode('ascii'))
+    for arcname, path in _entries(lambda_files, lambda_dir):
+        sha.update(arcname.encode('utf-8') + b'\0')
+        with open(path, 'rb') as f:
+            data = f.read()
+        sha.update(str(len(data)).encode('ascii') + b'\0')
+        sha.update(data)
+    return sha.hexdigest()
+
+
+class Package(object):
+    """A built deployment package"""
+
+    def __init__(self, func_name, zip_path, code_sha256, built):
+        self.func_name = func_name
+        self.zip_path = zip_path
+        self.code_sha256 = code_sha256
+        self.built = built
+
+    def read(self):
+        with open(self.zip_path, 'rb') as f:
+            return f.read()
+
+
+def build_zip(func_name, lambda_files, lambda_dir, build_dir):
+    """
+    Build the deployment package of a function as `<build_dir>/<func>.zip`.
+
+    Entries are sorted and written with a fixed timestamp and mode, so the
+    package is reproducible. The digest of the inputs is kept next to the zip
+    in `<func>.json`, and the zip is only rebuilt when the inputs change.
+
+    :return: the `Package`
+    """
+    if not os.path.exists(build_dir):
+        os.makedirs(build_dir)
+    zip_path = os.path.join(build_dir, func_name + '.zip')
+    meta_path = os.path.join(build_dir, func_name + '.json')
+
+    digest = inputs_digest(lambda_files, lambda_dir)
+    try:
+        with open(meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta['inputs'] == digest and os.path.exists(zip_path):
+            logging.info("[build_zip] {0} unchanged, reusing {1}".format(
+                func_name, zip_path))
+            return Package(func_name, zip_path, meta['code_sha256'], False)
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    # build into a temporary file so an interrupted build leaves no zip behind
+    tmp_path = zip_path + '.tmp'
+    with zipfile.ZipFile(tmp_path, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for arcname, path in _entries(lambda_files, lambda_dir):
+            info = zipfile.ZipInfo(arcname, date_time=ZIP_DATE_TIME)
+            info.external_attr = ZIP_FILE_MODE
+            info.compress_type = zipfile.ZIP_DEFLATED
+            with open(path, 'rb') as f:
+                zf.writestr(info, f.read())
+    os.rename(tmp_path, zip_path)
+
+    sha = code_sha256(zip_path)
+    with open(meta_path, 'w') as f:
+        json.dump({'inputs': digest, 'code_sha256': sha}, f, indent=2,
+                  separators=(',', ': '), sort_keys=True)
+    logging.info("[build_zip] built {0} CodeSha256:{1}".format(zip_path, sha))
+    return Package(func_name, zip_path, sha, True)
+
+
+def build_from_config(lambda_config, base_dir, build_dir):
+    """Build the package of the function described by a lambda config file"""
+    with open(lambda_config, 'r') as f:
+        cfg = json.load(f)
+    return build_zip(
+        cfg['func_name'], cfg['lambda_files'],
+        os.path.join(base_dir, cfg['lambda_dir']), build_dir)
+
+
+def build_all(lambda_configs, base_dir, build_dir, max_workers=4):
+    """
+    Build the packages of many lambda config files in parallel.
+
+    :return: the `Package` of each config, in order
+    """
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(
+            lambda c: build_from_config(c, base_dir, build_dir),
+            lambda_configs))
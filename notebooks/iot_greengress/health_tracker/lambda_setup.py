@@ -16,22 +16,25 @@ from __future__ import print_function
 import os
 import fire
 import json
+import time
 import boto3
 import logging
-import zipfile
-from os.path import basename
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from datetime import timedelta, tzinfo
-from botocore.exceptions import ClientError
+from botocore.exceptions import ClientError, WaiterError
 from retrying import retry
 
+import lambda_package
+
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
 logging.basicConfig(format='%(asctime)s|%(name)-8s|%(levelname)s: %(message)s',
                     level=logging.INFO)
 
 print("path: {0}".format(dir_path))
-temp_deploy_zip = "deploy.zip"
+build_dir = os.path.join(dir_path, 'build')
 
 
 def create(lambda_config, runtime='python2.7', role_name='NoServiceAccess',
@@ -54,9 +57,10 @@ def create(lambda_config, runtime='python2.7', role_name='NoServiceAccess',
                                        role_name=role_name,
                                        role_policy=role_policy)
 
-    refresh_lambda_zip(lambda_files, abs_lambda_dir)
+    package = refresh_lambda_zip(lambda_files, abs_lambda_dir, func_name)
     lambda_resp = _create_lambda(
-        role_arn, func_name, func_desc, lambda_handler, lambda_main, runtime
+        role_arn, func_name, func_desc, lambda_handler, lambda_main, runtime,
+        package
     )
     _publish_lambda_version(func_arn=lambda_resp['FunctionArn'])
     alias_resp = _create_function_alias(
@@ -71,8 +75,6 @@ def create(lambda_config, runtime='python2.7', role_name='NoServiceAccess',
             separators=(',', ': '), sort_keys=True
         )
 
-    os.remove(temp_deploy_zip)
-
 
 def _create_lambda_policies(assume_role_policy_doc, func_name, lambda_dir,
                             role_name, role_policy):
@@ -116,11 +118,10 @@ def _create_lambda_policies(assume_role_policy_doc, func_name, lambda_dir,
 
 @retry(wait_random_min=4000, wait_random_max=6000, stop_max_attempt_number=3)
 def _create_lambda(arn, func_name, func_desc, lambda_handler, lambda_main,
-                   runtime):
+                   runtime, package):
     func = dict()
     lamb = boto3.client('lambda')
-    with open(temp_deploy_zip) as deploy:
-        func['ZipFile'] = deploy.read()
+    func['ZipFile'] = package.read()
     try:
         resp = lamb.create_function(
             FunctionName=func_name, Runtime=runtime, Publish=True,
@@ -187,21 +188,24 @@ def update(config_file, runtime='python2.7', role_name='NoServiceAccess',
     lambda_dir = dir_path + '/' + cfg['lambda_dir']
     lambda_files = cfg['lambda_files']
 
-    refresh_lambda_zip(lambda_files, lambda_dir)
+    package = refresh_lambda_zip(lambda_files, lambda_dir, func_name)
+    if package.code_sha256 == resp['Configuration']['CodeSha256']:
+        logging.info("Function {0} code unchanged, skipping upload".format(
+            func_name))
+        return
 
-    with open(temp_deploy_zip) as zip_file:
-        func_version = _update_lambda_function(zip_file, func_name)
-        _update_lambda_alias(lambda_alias, func_name, func_version)
-        logging.info("Updated function {0} with new code as of {1}".format(
-            func_name, now))
+    func_version = _update_lambda_function(package, func_name)
+    _update_lambda_alias(lambda_alias, func_name, func_version)
+    logging.info("Updated function {0} with new code as of {1}".format(
+        func_name, now))
 
 
-def _update_lambda_function(zip_file, func_name):
+def _update_lambda_function(package, func_name):
     lamb = boto3.client('lambda')
     try:
         resp = lamb.update_function_code(
             FunctionName=func_name,
-            ZipFile=zip_file.read(),
+            ZipFile=package.read(),
             Publish=True
         )
         return resp['Version']
@@ -232,10 +236,226 @@ def _update_lambda_alias(func_alias, func_name, func_version):
             logging.error("Unexpected Error: {0}".format(ce))
 
 
-def refresh_lambda_zip(lambda_files, lambda_dir):
-    with zipfile.ZipFile(temp_deploy_zip, "w", zipfile.ZIP_DEFLATED) as zf:
-        for f in lambda_files:
-            zf.write(lambda_dir + '/' + f, basename(f))
+def refresh_lambda_zip(lambda_files, lambda_dir, func_name):
+    """
+    Build, or reuse when its files are unchanged, the reproducible deployment
+    package of a function in `build/<func_name>.zip`.
+
+    :return: the `lambda_package.Package`
+    """
+    return lambda_package.build_zip(
+        func_name, lambda_files, lambda_dir, build_dir)
+
+
+def package(*lambda_configs, **kwargs):
+    """
+    Build the deployment packages of many Lambda configs in parallel.
+
+    :param lambda_configs: the cfg_lambda.json files of the functions
+    :param workers: the number of packages built at the same time
+    """
+    workers = kwargs.get('workers', 4)
+    packages = lambda_package.build_all(
+        lambda_configs, dir_path, build_dir, max_workers=workers)
+    for p in packages:
+        print("{0:<24} {1:<8} {2} {3}".format(
+            p.func_name, 'built' if p.built else 'cached', p.code_sha256,
+            p.zip_path))
+
+
+class DeployTimer(object):
+    """Wall clock time of each deploy step, per function"""
+
+    def __init__(self):
+        self.steps = dict()
+        self.started = time.time()
+
+    @contextmanager
+    def step(self, func_name, step):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.steps.setdefault(func_name, []).append(
+                (step, time.time() - start))
+
+    def report(self):
+        lines = ["{0:<24} {1:>8}  {2}".format('function', 'total_s', 'steps')]
+        for func_name in sorted(self.steps):
+            steps = self.steps[func_name]
+            lines.append("{0:<24} {1:>8.2f}  {2}".format(
+                func_name, sum(t for _, t in steps),
+                ' '.join('{0}={1:.2f}'.format(n, t) for n, t in steps)))
+        lines.append("{0:<24} {1:>8.2f}".format(
+            'wall clock', time.time() - self.started))
+        return '\n'.join(lines)
+
+
+def _role_not_ready(client_error):
+    """
+    :return: True when Lambda rejected a function only because its role is too
+        new to be assumed yet, rather than for a bad parameter
+    """
+    error = client_error.response['Error']
+    return error['Code'] == 'InvalidParameterValueException' and \
+        'cannot be assumed' in error.get('Message', '')
+
+
+def _create_or_update_function(lamb, cfg, role_arn, package, runtime, timer,
+                               max_role_wait=60):
+    """
+    Create or update one function, publish a version and point its alias at
+    it, waiting on the Lambda waiters between dependent steps.
+
+    :return: the alias ARN
+    """
+    func_name = cfg['func_name']
+    lambda_alias = cfg['lambda_alias']
+
+    with timer.step(func_name, 'get'):
+        try:
+            current = lamb.get_function(FunctionName=func_name)
+        except ClientError as ce:
+            if ce.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+            current = None
+
+    if current is None:
+        with timer.step(func_name, 'create'):
+            # a new role can take a few seconds before Lambda may assume it
+            delay, waited = 1, 0
+            while True:
+                try:
+                    lamb.create_function(
+                        FunctionName=func_name, Runtime=runtime,
+                        Description=cfg['func_desc'], Role=role_arn,
+                        Code={'ZipFile': package.read()},
+                        Handler='{0}.{1}'.format(
+                            cfg['lambda_main'], cfg['lambda_handler']))
+                    break
+                except ClientError as ce:
+                    if not _role_not_ready(ce) or waited >= max_role_wait:
+                        raise
+                    logging.info("[deploy_all] waiting for role of {0}".format(
+                        func_name))
+                    time.sleep(delay)
+                    waited += delay
+                    delay = min(delay * 2, 8)
+        with timer.step(func_name, 'wait_active'):
+            lamb.get_waiter('function_active').wait(FunctionName=func_name)
+    elif current['Configuration']['CodeSha256'] != package.code_sha256:
+        with timer.step(func_name, 'upload'):
+            lamb.update_function_code(
+                FunctionName=func_name, ZipFile=package.read())
+        with timer.step(func_name, 'wait_updated'):
+            lamb.get_waiter('function_updated').wait(FunctionName=func_name)
+    else:
+        logging.info("[deploy_all] {0} code unchanged".format(func_name))
+
+    with timer.step(func_name, 'publish'):
+        # publishing unchanged code returns the latest version with that code
+        version = lamb.publish_version(
+            FunctionName=func_name, CodeSha256=package.code_sha256)['Version']
+
+    with timer.step(func_name, 'alias'):
+        try:
+            alias = lamb.update_alias(
+                Name=lambda_alias, FunctionName=func_name,
+                FunctionVersion=version)
+        except ClientError as ce:
+            if ce.response['Error']['Code'] != 'ResourceNotFoundException':
+                raise
+            alias = lamb.create_alias(
+                Name=lambda_alias, FunctionName=func_name,
+                FunctionVersion=version)
+    logging.info("[deploy_all] {0} alias {1} -> version {2}".format(
+        func_name, lambda_alias, version))
+    return alias['AliasArn']
+
+
+def deploy_all(*lambda_configs, **kwargs):
+    """
+    Create or update many functions concurrently.
+
+    The shared IAM role is created first. Then every function's role policy,
+    package build, upload, version publish and alias update run concurrently
+    with the other functions, each step waiting only for the steps it
+    depends on. A per-function timing report is printed at the end.
+
+    :param lambda_configs: the cfg_lambda.json files of the functions
+    :param runtime: the runtime of new functions
+    :param role_name: the IAM role shared by the functions
+    :param workers: the number of functions deployed at the same time
+    """
+    runtime = kwargs.get('runtime', 'python2.7')
+    role_name = kwargs.get('role_name', 'NoServiceAccess')
+    role_policy = kwargs.get('role_policy', 'policy.json')
+    assume_role_policy_doc = kwargs.get('assume_role_policy_doc', 'trust.json')
+    workers = kwargs.get('workers', 8)
+
+    configs = list()
+    for lambda_config in lambda_configs:
+        with open(lambda_config, "r") as in_file:
+            configs.append(json.load(in_file))
+    if not configs:
+        return
+
+    timer = DeployTimer()
+    lamb = boto3.client('lambda')
+
+    def lambda_dir(cfg):
+        return dir_path + '/' + cfg['lambda_dir']
+
+    def put_policy(cfg):
+        with timer.step(cfg['func_name'], 'iam'):
+            return _create_lambda_policies(
+                assume_role_policy_doc, func_name=cfg['func_name'],
+                lambda_dir=lambda_dir(cfg), role_name=role_name,
+                role_policy=role_policy)
+
+    def build(cfg):
+        with timer.step(cfg['func_name'], 'package'):
+            return refresh_lambda_zip(
+                cfg['lambda_files'], lambda_dir(cfg), cfg['func_name'])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # every function depends on the shared role, create it once first
+        packages = [pool.submit(build, cfg) for cfg in configs]
+        role_arn = put_policy(configs[0])
+        policies = [pool.submit(put_policy, cfg) for cfg in configs[1:]]
+        for f in policies:
+            f.result()
+        iam = boto3.client('iam')
+        iam.get_waiter('role_exists').wait(RoleName=role_name)
+
+        deploys = [
+            pool.submit(_create_or_update_function, lamb, cfg, role_arn,
+                        p.result(), runtime, timer)
+            for cfg, p in zip(configs, packages)
+        ]
+        errors = 0
+        for lambda_config, cfg, f in zip(lambda_configs, configs, deploys):
+            try:
+                alias_arn = f.result()
+            except (ClientError, WaiterError) as e:
+                # a function that failed or never became active doesn't stop
+                # the others from being recorded
+                errors += 1
+                logging.error("[deploy_all] {0} failed: {1}".format(
+                    cfg['func_name'], e))
+                continue
+            if cfg.get('lambda_arn') != alias_arn:
+                cfg['lambda_arn'] = alias_arn
+                with open(lambda_config, "w") as out_file:
+                    json.dump(
+                        cfg, out_file, indent=2,
+                        separators=(',', ': '), sort_keys=True
+                    )
+
+    print(timer.report())
+    if errors:
+        raise RuntimeError("{0} of {1} functions failed to deploy".format(
+            errors, len(configs)))
 
 
 def string_as_datetime(time_str):
@@ -276,5 +496,7 @@ if __name__ == "__main__":
 
     fire.Fire({
         'create': create,
-        'update': update
+        'update': update,
+        'package': package,
+        'deploy-all': deploy_all
     })
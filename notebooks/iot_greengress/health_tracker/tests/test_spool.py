@@ -0,0 +1,169 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Tests of the GGD `PublishSpool`: `python -m unittest discover tests`
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+import unittest
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..', 'tracker', 'ggd'))
+
+from spool import PublishSpool
+
+
+class FlakyMQTTClient(object):
+    """Fails its next `failures` publishes, while staying connected"""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.received = list()
+
+    def publish(self, topic, payload, qos):
+        if self.failures:
+            self.failures -= 1
+            raise EnvironmentError("publish timed out")
+        self.received.append(payload)
+        return True
+
+
+class PublishSpoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.spool_dir = tempfile.mkdtemp(prefix='spool_test_')
+
+    def tearDown(self):
+        shutil.rmtree(self.spool_dir)
+
+    def make_spool(self, client, **kwargs):
+        spool = PublishSpool(client, spool_dir=self.spool_dir, name='test',
+                             retry_interval=0.01, **kwargs)
+        self.addCleanup(spool.close)
+        return spool
+
+    def test_failed_publish_while_connected_is_retried(self):
+        client = FlakyMQTTClient(failures=1)
+        spool = self.make_spool(client)
+
+        self.assertTrue(spool.publish('t', 'a'))
+        self.assertTrue(spool.online)
+        # published after the buffered message, in order
+        self.assertTrue(spool.publish('t', 'b'))
+
+        self.assertTrue(self.wait_for(spool))
+        self.assertEqual(client.received, ['a', 'b'])
+        self.assertTrue(spool.online)
+        self.assertEqual(spool.stats()['publish_errors'], 1)
+
+        self.assertTrue(spool.publish('t', 'c'))
+        self.assertEqual(client.received, ['a', 'b', 'c'])
+
+    def test_failed_replay_after_reconnect_is_retried(self):
+        client = FlakyMQTTClient()
+        spool = self.make_spool(client, memory_limit=2)
+        spool.on_offline()
+        for payload in ('a', 'b', 'c', 'd'):
+            spool.publish('t', payload)
+        self.assertEqual(spool.depth(), 4)
+
+        # the SDK is still resubscribing when it reports being online
+        client.failures = 2
+        spool.on_online()
+
+        self.assertTrue(self.wait_for(spool))
+        self.assertEqual(client.received, ['a', 'b', 'c', 'd'])
+        self.assertTrue(spool.online)
+
+    def test_offline_stops_retries(self):
+        client = FlakyMQTTClient(failures=1)
+        spool = self.make_spool(client)
+        spool.publish('t', 'a')
+        spool.on_offline()
+
+        self.assertFalse(spool.wait(0.1))
+        self.assertEqual(client.received, [])
+        self.assertEqual(spool.depth(), 1)
+
+        spool.on_online()
+        self.assertTrue(self.wait_for(spool))
+        self.assertEqual(client.received, ['a'])
+
+    def test_memory_queue_survives_restart(self):
+        spool = self.make_spool(FlakyMQTTClient(), memory_limit=3)
+        spool.on_offline()
+        for i in range(5):
+            spool.publish('t', str(i))
+        spool.close()
+
+        client = FlakyMQTTClient()
+        restarted = self.make_spool(client, memory_limit=3)
+        self.assertEqual(restarted.depth(), 5)
+        restarted.on_online()
+        self.assertTrue(self.wait_for(restarted))
+        self.assertEqual(client.received, [str(i) for i in range(5)])
+
+    def test_drop_oldest_drops_the_oldest_messages(self):
+        client = FlakyMQTTClient()
+        spool = self.make_spool(client, memory_limit=3, segment_bytes=40,
+                                max_disk_bytes=200)
+        spool.on_offline()
+        for i in range(20):
+            spool.publish('t', str(i))
+        self.assertGreater(spool.stats()['dropped'], 0)
+
+        spool.on_online()
+        self.assertTrue(self.wait_for(spool))
+        # whatever was dropped, the newest messages are kept, in order
+        kept = [int(p) for p in client.received]
+        self.assertEqual(kept, list(range(20 - len(kept), 20)))
+        self.assertEqual(len(kept) + spool.stats()['dropped'], 20)
+
+    def test_corrupt_records_are_skipped(self):
+        spool = self.make_spool(FlakyMQTTClient(), memory_limit=0)
+        spool.on_offline()
+        for payload in ('a', 'b', 'c'):
+            spool.publish('t', payload)
+        spool.close()
+        segment = [f for f in os.listdir(self.spool_dir)
+                   if f.endswith('.seg')][0]
+        path = os.path.join(self.spool_dir, segment)
+        with open(path, 'rb') as f:
+            lines = f.readlines()
+        lines[1] = b'{not json\n'
+        with open(path, 'wb') as f:
+            f.writelines(lines)
+
+        client = FlakyMQTTClient()
+        restarted = self.make_spool(client, memory_limit=0)
+        restarted.on_online()
+        self.assertTrue(self.wait_for(restarted))
+        self.assertEqual(client.received, ['a', 'c'])
+        self.assertEqual(restarted.stats()['corrupt'], 1)
+
+    def wait_for(self, spool, timeout=5.0):
+        """Wait for the retries to empty the backlog"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            if spool.wait(0.05):
+                return True
+            time.sleep(0.01)
+        return False
+
+
+if __name__ == '__main__':
+    unittest.main()
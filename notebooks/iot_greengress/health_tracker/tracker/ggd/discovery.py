@@ -0,0 +1,131 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import json
+import time
+import socket
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from AWSIoTPythonSDK.core.greengrass.discovery.models import DiscoveryInfo
+
+
+class DiscoveryCache(object):
+    """
+    On-disk cache of Greengrass discovery results.
+
+    The raw discovery document of each thing, which includes the Group CAs, is
+    stored as `<thing_name>_discovery.json` in `cache_dir` and reused for `ttl`
+    seconds, so restarting a device doesn't need a cloud discovery call.
+    """
+
+    def __init__(self, cache_dir, ttl=3600):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+
+    def _path(self, thing_name):
+        return os.path.join(self.cache_dir, thing_name + "_discovery.json")
+
+    def get(self, thing_name):
+        """
+        :return: the cached `DiscoveryInfo` of `thing_name`, or `None` when
+            there is no fresh cache entry
+        """
+        path = self._path(thing_name)
+        try:
+            with open(path, "r") as f:
+                entry = json.load(f)
+            age = time.time() - entry['fetched']
+            if age > self.ttl:
+                logging.info("[discovery_cache] entry for {0} expired".format(
+                    thing_name))
+                return None
+            logging.info(
+                "[discovery_cache] using cached discovery for {0} age:{1:.0f}s"
+                .format(thing_name, age))
+            return DiscoveryInfo(entry['raw_json'])
+        except (IOError, OSError, ValueError, KeyError) as e:
+            logging.debug("[discovery_cache] no entry for {0}:{1}".format(
+                thing_name, e))
+            return None
+
+    def put(self, thing_name, discovery_info):
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        path = self._path(thing_name)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "fetched": time.time(),
+                "raw_json": discovery_info.rawJson
+            }, f)
+        # rename so a concurrently starting device never reads a partial file
+        os.rename(tmp_path, path)
+        logging.info("[discovery_cache] saved discovery for {0}".format(
+            thing_name))
+
+    def invalidate(self, thing_name):
+        """
+        Remove the cache entry of `thing_name`.
+
+        :return: True if there was an entry to remove
+        """
+        try:
+            os.remove(self._path(thing_name))
+            logging.info("[discovery_cache] invalidated {0}".format(
+                thing_name))
+            return True
+        except OSError:
+            return False
+
+
+def _probe(connectivity_info, timeout):
+    sock = socket.create_connection(
+        (connectivity_info.host, int(connectivity_info.port)), timeout)
+    sock.close()
+    return connectivity_info
+
+
+def race_endpoints(connectivity_info_list, timeout=5):
+    """
+    Probe every core endpoint with a TCP connect in parallel.
+
+    :return: the connectivity info objects with the first endpoint to accept a
+        connection moved to the front. The remaining probes are abandoned, so
+        dead endpoints never delay the winner.
+    """
+    if len(connectivity_info_list) < 2:
+        return list(connectivity_info_list)
+
+    winner = None
+    pool = ThreadPoolExecutor(max_workers=len(connectivity_info_list))
+    try:
+        futures = [
+            pool.submit(_probe, ci, timeout) for ci in connectivity_info_list
+        ]
+        for future in as_completed(futures):
+            try:
+                winner = future.result()
+                break
+            except (socket.error, socket.timeout, ValueError) as e:
+                logging.debug("[race_endpoints] probe failed:{0}".format(e))
+    finally:
+        pool.shutdown(wait=False)
+
+    if winner is None:
+        logging.info("[race_endpoints] no endpoint accepted a connection")
+        return list(connectivity_info_list)
+
+    logging.info("[race_endpoints] fastest endpoint {0}:{1}".format(
+        winner.host, winner.port))
+    return [winner] + [ci for ci in connectivity_info_list if ci is not winner]
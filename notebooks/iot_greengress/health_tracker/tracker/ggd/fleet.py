@@ -0,0 +1,498 @@
+#!/usr/bin/env python
+
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Greengrass device fleet simulator
+
+This tool simulates a fleet of virtual Greengrass devices (GGDs) on a single
+asyncio loop. Each virtual device publishes messages with the same format as the
+`heartbeat`, `heartrate` and servo telemetry devices, at a configurable rate and
+burst pattern, to a local MQTT broker or Greengrass Core.
+
+A listener connection subscribes to the topics of interest and measures the
+end-to-end latency of every received datum using the datum's `ts` value, so the
+simulator can be used to capacity-plan the `TrackerBrain`,
+`TrackerErrorDetector` and `web` components.
+
+To learn more about the command line type: `python fleet.py --help`
+"""
+
+import json
+import math
+import time
+import random
+import socket
+import asyncio
+import argparse
+import datetime
+import logging
+import threading
+
+import paho.mqtt.client as mqtt
+
+
+log = logging.getLogger('fleet')
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    '%(asctime)s|%(name)-8s|%(levelname)s: %(message)s')
+handler.setFormatter(formatter)
+log.addHandler(handler)
+log.setLevel(logging.INFO)
+
+HEARTBEAT_TOPIC = '/heart/beat'
+HEARTRATE_TOPIC = 'heartrate'
+TELEMETRY_TOPIC = '/tracker/telemetry'
+MSG_VERSION = "2017-07-05"  # YYYY-MM-DD
+
+hostname = socket.gethostname()
+
+
+def heartbeat_datum(sensor_id, now, start):
+    return {
+        "sensor_id": "heartbeat",
+        "ts": now.isoformat(),
+        "duration": str(now - start)
+    }
+
+
+def heartrate_datum(sensor_id, now, start):
+    return {
+        "sensor_id": sensor_id,
+        "ts": now.isoformat(),
+        "value": random.randint(60, 100)
+    }
+
+
+def telemetry_datum(sensor_id, now, start):
+    goal = random.randint(0, 1023)
+    return {
+        "sensor_id": sensor_id,
+        "ts": now.isoformat(),
+        "present_speed": random.randint(0, 1023),
+        "present_position": max(0, min(1023, goal + random.randint(-8, 8))),
+        "present_load": random.randint(0, 400),
+        "goal_position": goal,
+        "moving": random.random() < 0.5
+    }
+
+
+# payload schema name -> (default topic, datum factory)
+SCHEMAS = {
+    'heartbeat': (HEARTBEAT_TOPIC, heartbeat_datum),
+    'heartrate': (HEARTRATE_TOPIC, heartrate_datum),
+    'telemetry': (TELEMETRY_TOPIC, telemetry_datum),
+}
+
+
+def _parse_ts(ts):
+    """Parse the `datetime.isoformat()` value used by the devices' `ts` field"""
+    if '.' in ts:
+        return datetime.datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S.%f')
+    return datetime.datetime.strptime(ts, '%Y-%m-%dT%H:%M:%S')
+
+
+class LatencyHistogram(object):
+    """
+    Log-linear latency histogram with ~9% relative bucket error.
+
+    Bucket `i` covers latencies in microseconds of `[2**(i/8), 2**((i+1)/8))`,
+    so memory stays constant regardless of the number of samples recorded.
+    """
+    BUCKETS_PER_DOUBLING = 8
+
+    def __init__(self):
+        self.counts = dict()
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        us = max(seconds * 1e6, 1.0)
+        bucket = int(math.log(us, 2) * self.BUCKETS_PER_DOUBLING)
+        with self._lock:
+            self.counts[bucket] = self.counts.get(bucket, 0) + 1
+            self.count += 1
+            self.total += seconds
+            if self.min is None or seconds < self.min:
+                self.min = seconds
+            if self.max is None or seconds > self.max:
+                self.max = seconds
+
+    def percentile(self, q):
+        """Return the upper bound in seconds of the bucket holding quantile `q`"""
+        with self._lock:
+            if self.count == 0:
+                return None
+            rank = q / 100.0 * self.count
+            seen = 0
+            for bucket in sorted(self.counts):
+                seen += self.counts[bucket]
+                if seen >= rank:
+                    upper = 2 ** ((bucket + 1.0) / self.BUCKETS_PER_DOUBLING)
+                    return min(upper / 1e6, self.max)
+        return self.max
+
+    def summary(self):
+        if self.count == 0:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1e3,
+            "min_ms": self.min * 1e3,
+            "p50_ms": self.percentile(50) * 1e3,
+            "p90_ms": self.percentile(90) * 1e3,
+            "p99_ms": self.percentile(99) * 1e3,
+            "p999_ms": self.percentile(99.9) * 1e3,
+            "max_ms": self.max * 1e3
+        }
+
+    def buckets(self):
+        """Return `(upper_bound_ms, count)` pairs for every non-empty bucket"""
+        with self._lock:
+            return [
+                (2 ** ((b + 1.0) / self.BUCKETS_PER_DOUBLING) / 1e3,
+                 self.counts[b])
+                for b in sorted(self.counts)
+            ]
+
+
+class FleetStats(object):
+    """Publish/receive counters and the end-to-end latency histogram"""
+
+    def __init__(self):
+        self.published = 0
+        self.publish_errors = 0
+        self.received = 0
+        self.received_data = 0
+        self.malformed = 0
+        self.latency = LatencyHistogram()
+        self.started = time.time()
+        self._lock = threading.Lock()
+        self._last = (self.started, 0, 0)
+
+    def on_publish(self, ok):
+        if ok:
+            self.published += 1
+        else:
+            self.publish_errors += 1
+
+    def on_message(self, payload):
+        """
+        Record a received MQTT payload. It runs in paho's network thread, so a
+        payload that isn't a JSON message with a `data` list is only counted
+        as malformed.
+        """
+        try:
+            data = json.loads(payload).get('data', [])
+            if not isinstance(data, list):
+                raise ValueError("data is not a list")
+            self.on_receive(data)
+        except (ValueError, TypeError, AttributeError) as e:
+            with self._lock:
+                self.malformed += 1
+            log.debug('[on_message] malformed payload:%s', e)
+
+    def on_receive(self, data):
+        now = datetime.datetime.now()
+        # parsed first, so a bad `ts` doesn't count the message as received
+        latencies = [(now - _parse_ts(datum['ts'])).total_seconds()
+                     for datum in data
+                     if isinstance(datum, dict) and 'ts' in datum]
+        with self._lock:
+            self.received += 1
+            self.received_data += len(data)
+        for latency in latencies:
+            self.latency.record(latency)
+
+    def interval_rates(self):
+        """Return the publish and receive rates since the previous call"""
+        now = time.time()
+        last_time, last_pub, last_recv = self._last
+        self._last = (now, self.published, self.received)
+        elapsed = max(now - last_time, 1e-9)
+        return ((self.published - last_pub) / elapsed,
+                (self.received - last_recv) / elapsed)
+
+    def summary(self):
+        elapsed = max(time.time() - self.started, 1e-9)
+        return {
+            "elapsed_s": elapsed,
+            "published": self.published,
+            "publish_errors": self.publish_errors,
+            "received": self.received,
+            "received_data": self.received_data,
+            "malformed": self.malformed,
+            "publish_msgs_per_s": self.published / elapsed,
+            "receive_msgs_per_s": self.received / elapsed,
+            "receive_data_per_s": self.received_data / elapsed,
+            "latency": self.latency.summary()
+        }
+
+
+def _mqtt_client(client_id):
+    if hasattr(mqtt, 'CallbackAPIVersion'):  # paho-mqtt >= 2.0
+        return mqtt.Client(mqtt.CallbackAPIVersion.VERSION1,
+                           client_id=client_id)
+    return mqtt.Client(client_id=client_id)
+
+
+def mqtt_connect(client_id, host, port, root_ca=None, certificate=None,
+                 private_key=None, keepalive=60):
+    """
+    Connect a paho MQTT client to the broker and start its network thread.
+
+    When `root_ca` is given the connection uses TLS mutual authentication, as
+    required by a Greengrass Core, otherwise a plain local broker is assumed.
+    """
+    client = _mqtt_client(client_id)
+    if root_ca:
+        client.tls_set(ca_certs=root_ca, certfile=certificate,
+                       keyfile=private_key)
+    # never let paho silently drop messages under load
+    client.max_inflight_messages_set(0)
+    client.max_queued_messages_set(0)
+    client.connect(host, port, keepalive)
+    client.loop_start()
+    log.info("[mqtt_connect] client:{0} connected to {1}:{2}".format(
+        client_id, host, port))
+    return client
+
+
+class VirtualDevice(object):
+    """
+    A simulated GGD publishing one payload schema at a configured rate.
+
+    :param ggd_id: the `ggd_id` placed in every message
+    :param schema: the payload schema name, one of `SCHEMAS`
+    :param topic: the topic to publish on
+    :param rate: mean messages per second
+    :param pattern: `steady`, `poisson` or `burst`
+    :param batch: number of `data` elements per message
+    :param burst_size: extra messages sent back-to-back in each burst
+    :param burst_every: seconds between bursts
+    """
+
+    def __init__(self, ggd_id, schema, topic, rate, pattern='steady', batch=1,
+                 burst_size=0, burst_every=0.0):
+        self.ggd_id = ggd_id
+        self.topic = topic
+        if rate <= 0:
+            raise ValueError("rate must be positive:{0}".format(rate))
+        self.interval = 1.0 / rate
+        self.pattern = pattern
+        self.batch = batch
+        self.burst_size = burst_size
+        self.burst_every = burst_every
+        self.datum_factory = SCHEMAS[schema][1]
+        self.start = datetime.datetime.now()
+
+    def message(self):
+        now = datetime.datetime.now()
+        return {
+            "version": MSG_VERSION,
+            "ggd_id": self.ggd_id,
+            "hostname": hostname,
+            "data": [
+                self.datum_factory(
+                    "{0}_{1}".format(self.ggd_id, i), now, self.start)
+                for i in range(self.batch)
+            ]
+        }
+
+    def _next_delay(self):
+        if self.pattern == 'poisson':
+            return random.expovariate(1.0 / self.interval)
+        return self.interval
+
+    async def run(self, client, stats, qos, stop_at):
+        loop = asyncio.get_event_loop()
+        # randomise the phase so the fleet doesn't publish in lock-step
+        next_send = loop.time() + random.random() * self.interval
+        next_burst = loop.time() + self.burst_every
+        while next_send < stop_at:
+            await asyncio.sleep(max(0.0, next_send - loop.time()))
+            count = 1
+            if self.pattern == 'burst' and loop.time() >= next_burst:
+                count += self.burst_size
+                next_burst += self.burst_every
+            for _ in range(count):
+                info = client.publish(
+                    self.topic, json.dumps(self.message()), qos)
+                stats.on_publish(info.rc == mqtt.MQTT_ERR_SUCCESS)
+            # schedule from the previous target time to avoid drift
+            next_send += self._next_delay()
+
+
+async def report(stats, interval, stop_at):
+    loop = asyncio.get_event_loop()
+    while loop.time() < stop_at:
+        await asyncio.sleep(interval)
+        pub_rate, recv_rate = stats.interval_rates()
+        lat = stats.latency.summary()
+        log.info(
+            "[report] publish:{0:.0f} msg/s receive:{1:.0f} msg/s "
+            "p50:{2} p99:{3} errors:{4}".format(
+                pub_rate, recv_rate,
+                _fmt_ms(lat.get('p50_ms')), _fmt_ms(lat.get('p99_ms')),
+                stats.publish_errors))
+
+
+def _fmt_ms(value):
+    if value is None:
+        return '-'
+    return '{0:.2f}ms'.format(value)
+
+
+async def simulate(devices, clients, stats, qos, duration, report_interval):
+    loop = asyncio.get_event_loop()
+    stop_at = loop.time() + duration
+    tasks = [
+        d.run(clients[i % len(clients)], stats, qos, stop_at)
+        for i, d in enumerate(devices)
+    ]
+    tasks.append(report(stats, report_interval, stop_at))
+    await asyncio.gather(*tasks)
+
+
+def build_fleet(count, schema, topic, rate, pattern, batch, burst_size,
+                burst_every, ggd_id_format):
+    return [
+        VirtualDevice(
+            ggd_id=ggd_id_format.format(i), schema=schema, topic=topic,
+            rate=rate, pattern=pattern, batch=batch,
+            burst_size=burst_size, burst_every=burst_every)
+        for i in range(count)
+    ]
+
+
+def main(args):
+    topic = args.topic or SCHEMAS[args.schema][0]
+    listen_topics = args.listen or [topic]
+    stats = FleetStats()
+
+    tls = dict(root_ca=args.root_ca, certificate=args.certificate,
+               private_key=args.private_key)
+    listener = mqtt_connect(
+        "{0}_listener".format(args.client_id), args.host, args.port, **tls)
+    listener.on_message = lambda client, userdata, message: \
+        stats.on_message(message.payload)
+    for t in listen_topics:
+        listener.subscribe(t, args.qos)
+        log.info('[main] listening on topic:{0}'.format(t))
+
+    clients = [
+        mqtt_connect("{0}_{1}".format(args.client_id, i),
+                     args.host, args.port, **tls)
+        for i in range(args.connections)
+    ]
+    devices = build_fleet(
+        count=args.devices, schema=args.schema, topic=topic, rate=args.rate,
+        pattern=args.pattern, batch=args.batch, burst_size=args.burst_size,
+        burst_every=args.burst_every, ggd_id_format=args.ggd_id_format)
+    log.info("[main] simulating {0} devices at {1} msg/s each on topic:{2}".format(
+        len(devices), args.rate, topic))
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    try:
+        loop.run_until_complete(simulate(
+            devices, clients, stats, args.qos, args.duration,
+            args.report_interval))
+        # give in-flight messages a chance to arrive before summarising
+        time.sleep(args.drain)
+    except KeyboardInterrupt:
+        log.info("[main] KeyboardInterrupt ... stopping fleet")
+    finally:
+        loop.close()
+        for c in clients + [listener]:
+            c.loop_stop()
+            c.disconnect()
+
+    summary = stats.summary()
+    summary['histogram_ms'] = stats.latency.buckets()
+    print(json.dumps(summary, indent=2, sort_keys=True))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+    return summary
+
+
+def positive_float(value):
+    """argparse type of a float greater than 0"""
+    number = float(value)
+    if not number > 0:
+        raise argparse.ArgumentTypeError(
+            "must be positive:{0}".format(value))
+    return number
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Simulated fleet of Greengrass devices for load testing',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--host', default='localhost',
+                        help="MQTT broker or Greengrass Core host.")
+    parser.add_argument('--port', default=1883, type=int,
+                        help="MQTT broker or Greengrass Core port.")
+    parser.add_argument('--root-ca', dest='root_ca',
+                        help="CA file used to verify the broker. Enables TLS.")
+    parser.add_argument('--certificate',
+                        help="File Path of the GGD Certificate used with TLS.")
+    parser.add_argument('--private-key', dest='private_key',
+                        help="File Path of the GGD Private Key used with TLS.")
+    parser.add_argument('--client-id', dest='client_id', default='fleet_sim',
+                        help="Prefix of the MQTT client ids.")
+    parser.add_argument('--devices', default=1000, type=int,
+                        help="Number of virtual devices.")
+    parser.add_argument('--connections', default=4, type=int,
+                        help="MQTT connections shared by the virtual devices.")
+    parser.add_argument('--schema', default='heartrate',
+                        choices=sorted(SCHEMAS.keys()),
+                        help="Payload schema of the published messages.")
+    parser.add_argument('--topic',
+                        help="Publish topic. Defaults to the schema's topic.")
+    parser.add_argument('--listen', action='append',
+                        help="Topic to measure end-to-end latency on. May be "
+                             "repeated. Defaults to the publish topic.")
+    parser.add_argument('--ggd-id-format', dest='ggd_id_format',
+                        default='sim_ggd_{0:05d}',
+                        help="Format string for each device's ggd_id.")
+    parser.add_argument('--rate', default=1.0, type=positive_float,
+                        help="Mean messages per second per device.")
+    parser.add_argument('--pattern', default='steady',
+                        choices=['steady', 'poisson', 'burst'],
+                        help="Inter-arrival pattern of each device.")
+    parser.add_argument('--batch', default=1, type=int,
+                        help="Number of data elements per message.")
+    parser.add_argument('--burst-size', dest='burst_size', default=10,
+                        type=int,
+                        help="Extra messages per burst with --pattern burst.")
+    parser.add_argument('--burst-every', dest='burst_every', default=5.0,
+                        type=float,
+                        help="Seconds between bursts with --pattern burst.")
+    parser.add_argument('--qos', default=0, type=int, choices=[0, 1],
+                        help="MQTT QoS used to publish and subscribe.")
+    parser.add_argument('--duration', default=60.0, type=float,
+                        help="Seconds to run the simulation.")
+    parser.add_argument('--drain', default=2.0, type=float,
+                        help="Seconds to wait for in-flight messages.")
+    parser.add_argument('--report-interval', dest='report_interval',
+                        default=5.0, type=float,
+                        help="Seconds between throughput reports.")
+    parser.add_argument('--output',
+                        help="Write the JSON summary to this file.")
+
+    main(parser.parse_args())
@@ -13,10 +13,7 @@ import datetime
 import logging
 
 from random import *
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient, DROP_OLDEST
-from AWSIoTPythonSDK.core.greengrass.discovery.providers import DiscoveryInfoProvider
 import utils
-from gg_group_setup import GroupConfigFile
 
 dir_path = os.path.dirname(os.path.realpath(__file__))
 
@@ -33,9 +30,11 @@ GGD_HR_TOPIC = "heartrate"
 hostname = socket.gethostname()
 mqttc = None
 ggd_name = None
+spool = None
 
 def heartrate(sensor_id):
     # MQTT client has connected to GG Core, start heartbeat messages
+    publisher = spool if spool is not None else mqttc
     try:
         start = datetime.datetime.now()
         hostname = socket.gethostname()
@@ -57,49 +56,17 @@ def heartrate(sensor_id):
                 ]
             }
             print("[hb] publishing heartrate msg: {0}".format(msg))
-            mqttc.publish(GGD_HR_TOPIC, json.dumps(msg), 0)
+            publisher.publish(GGD_HR_TOPIC, json.dumps(msg), 0)
             time.sleep(random() * 10)
 
     except KeyboardInterrupt:
         log.info("[hb] KeyboardInterrupt ... exiting heartrate")
+    if spool is not None:
+        log.info("[hb] spool stats:{0}".format(spool.stats()))
+        spool.close()
     mqttc.disconnect()
     time.sleep(2)
 
-def core_connect(device_name, config_file, root_ca, certificate, private_key, group_ca_path):
-    global ggd_name, mqttc
-    cfg = GroupConfigFile(config_file)
-    ggd_name = cfg['devices'][device_name]['thing_name']
-    iot_endpoint = cfg['misc']['iot_endpoint']
-
-    dip = DiscoveryInfoProvider()
-    dip.configureEndpoint(iot_endpoint)
-    dip.configureCredentials(
-        caPath=root_ca, certPath=certificate, keyPath=private_key
-    )
-    dip.configureTimeout(10)  # 10 sec
-    logging.info("[heartrate] Discovery using CA:{0} cert:{1} prv_key:{2}".format(
-        root_ca, certificate, private_key
-    ))
-
-    gg_core, discovery_info = utils.discover_configured_core(
-        device_name=device_name, dip=dip, config_file=config_file,
-    )
-    if not gg_core:
-        raise EnvironmentError("[heartrate] Couldn't find the Core")
-
-    ca_list = discovery_info.getAllCas()
-    group_id, ca = ca_list[0]
-    group_ca_file = utils.save_group_ca(ca, group_ca_path, group_id)
-
-    mqttc = AWSIoTMQTTClient(ggd_name)
-    # local Greengrass Core discovered, now connect to Core from this Device
-    log.info("[heartrate] gca_file:{0} cert:{1}".format(
-        group_ca_file, certificate))
-    mqttc.configureCredentials(group_ca_file, private_key, certificate)
-    mqttc.configureOfflinePublishQueueing(10, DROP_OLDEST)
-
-    return mqttc, gg_core
-
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(
@@ -117,15 +84,21 @@ if __name__ == '__main__':
                         help="File Path of GGD Private Key.")
     parser.add_argument('group_ca_path',
                         help="The directory path where the discovered Group CA will be saved.")
+    parser.add_argument('--discovery-ttl', dest='discovery_ttl', default=3600,
+                        type=int,
+                        help="Seconds to reuse a cached discovery result. "
+                             "Use 0 to always discover from the cloud.")
+    parser.add_argument('--spool-dir', dest='spool_dir',
+                        help="Directory used to spool messages published "
+                             "while the Core is unreachable.")
 
     pa = parser.parse_args()
 
-    client, core = core_connect(
+    mqttc, ggd_name, spool = utils.device_connect(
         device_name=pa.device_name,
         config_file=pa.config_file, root_ca=pa.root_ca,
         certificate=pa.certificate, private_key=pa.private_key,
-        group_ca_path=pa.group_ca_path
+        group_ca_dir=pa.group_ca_path, discovery_ttl=pa.discovery_ttl,
+        spool_dir=pa.spool_dir
     )
-
-    if utils.mqtt_connect(mqtt_client=client, core_info=core):
-        heartrate('user1')
\ No newline at end of file
+    heartrate('user1')
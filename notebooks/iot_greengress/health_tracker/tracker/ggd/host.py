@@ -0,0 +1,367 @@
+#!/usr/bin/env python
+
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Greengrass device host
+
+Runs many Greengrass device plugins (see `plugins.py`) in one process, on a
+single asyncio loop, instead of one Python process per device. Plugins of the
+same device share one connection to the Greengrass Core, and every incoming
+message is routed once, through a `TopicTrie` of the connection's topic
+filters, to the plugins subscribed to a filter matching its topic.
+
+The trie replaces matching each plugin's filters against every message, but
+not the SDK's own dispatch: AWSIoTPythonSDK 1.2.0 still checks every filter
+subscribed on the connection with `topic_matches_sub` for each message, even
+the filters subscribed without a callback. A filter subscribed by several
+plugins is only subscribed once, which keeps that scan to the connection's
+distinct filters.
+
+Each device's certificate and private key are expected in the certificate
+directory as `<device_name>.pem` and `<device_name>.prv`, as created by the
+group setup. The host periodically logs the CPU time, message counts and
+(with `--trace-memory`) the memory retained by each plugin.
+
+Plugins are given as `<device_name>=<module>:<class>`, for example:
+`python host.py cfg.json certs heartbeat_ggd=plugins:HeartbeatPlugin
+heartrate_ggd=plugins:HeartratePlugin`
+
+To learn more about the command line type: `python host.py --help`
+"""
+
+import os
+import json
+import time
+import socket
+import asyncio
+import argparse
+import importlib
+import logging
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import utils
+from topics import TopicTrie
+
+
+log = logging.getLogger('host')
+handler = logging.StreamHandler()
+formatter = logging.Formatter(
+    '%(asctime)s|%(name)-8s|%(levelname)s: %(message)s')
+handler.setFormatter(formatter)
+log.addHandler(handler)
+log.setLevel(logging.INFO)
+
+
+def load_plugin(spec, **kwargs):
+    """
+    Create a plugin from a `<device_name>=<module>:<class>` spec.
+    """
+    device_name, _, target = spec.partition('=')
+    module_name, _, class_name = target.partition(':')
+    if not (device_name and module_name and class_name):
+        raise ValueError(
+            "plugin spec must be <device_name>=<module>:<class>, got:{0}"
+            .format(spec))
+    cls = getattr(importlib.import_module(module_name), class_name)
+    return cls(device_name, **kwargs)
+
+
+class PluginMetrics(object):
+
+    def __init__(self, plugin):
+        self.plugin = plugin
+        self.ticks = 0
+        self.received = 0
+        self.published = 0
+        self.errors = 0
+        self.cpu_seconds = 0.0
+        self.max_lag = 0.0
+        self.memory_bytes = 0
+
+    def summary(self, elapsed, memory=None):
+        result = {
+            "ticks": self.ticks,
+            "received": self.received,
+            "published": self.published,
+            "errors": self.errors,
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "cpu_percent": round(100 * self.cpu_seconds / elapsed, 3)
+            if elapsed else 0.0,
+            "max_tick_lag_ms": round(self.max_lag * 1000, 3)
+        }
+        if memory is not None:
+            result['memory_bytes'] = memory
+        return result
+
+
+class DeviceConnection(object):
+    """One Greengrass Core connection shared by the plugins of a device"""
+
+    def __init__(self, device_name, mqttc, ggd_name, spool):
+        self.device_name = device_name
+        self.mqttc = mqttc
+        self.ggd_name = ggd_name
+        self.spool = spool
+        self.publisher = spool if spool is not None else mqttc
+        # topic filters of the plugins subscribed on this connection
+        self.topics = TopicTrie()
+        self.filters = set()
+
+    def close(self):
+        if self.spool is not None:
+            log.info("[host] {0} spool stats:{1}".format(
+                self.device_name, self.spool.stats()))
+            self.spool.close()
+        self.mqttc.disconnect()
+
+
+class ConnectionPool(object):
+    """
+    Connections to the Greengrass Core keyed by device_name, so plugins of
+    the same device reuse one TLS session.
+    """
+
+    def __init__(self, config_file, root_ca, cert_dir, group_ca_path=None,
+                 discovery_ttl=3600, spool_dir=None):
+        self.config_file = config_file
+        self.root_ca = root_ca
+        self.cert_dir = cert_dir
+        self.group_ca_path = group_ca_path or cert_dir
+        self.discovery_ttl = discovery_ttl
+        self.spool_dir = spool_dir
+        self.connections = dict()
+
+    def connect(self, device_name, on_message=None):
+        conn = self.connections.get(device_name)
+        if conn is not None:
+            return conn
+        mqttc, ggd_name, spool = utils.device_connect(
+            device_name=device_name, config_file=self.config_file,
+            root_ca=self.root_ca,
+            certificate=os.path.join(self.cert_dir, device_name + '.pem'),
+            private_key=os.path.join(self.cert_dir, device_name + '.prv'),
+            group_ca_dir=self.group_ca_path,
+            discovery_ttl=self.discovery_ttl, spool_dir=self.spool_dir,
+            on_message=on_message
+        )
+        conn = self.connections[device_name] = DeviceConnection(
+            device_name, mqttc, ggd_name, spool)
+        log.info("[host] connected {0} as {1}".format(device_name, ggd_name))
+        return conn
+
+    def close(self):
+        for conn in self.connections.values():
+            conn.close()
+        self.connections = dict()
+
+
+class GGDHost(object):
+    """
+    Runs device plugins on one asyncio loop over a `ConnectionPool`.
+
+    All plugin code runs on the loop thread: messages received on the SDK's
+    threads are handed to the loop with `call_soon_threadsafe`, which also
+    lets the host attribute CPU time to each plugin with `time.thread_time` and,
+    with `trace_memory`, the net memory its calls retain with `tracemalloc`.
+    """
+
+    def __init__(self, pool, plugins, trace_memory=False):
+        self.pool = pool
+        self.plugins = list(plugins)
+        self.metrics = dict((id(p), PluginMetrics(p)) for p in self.plugins)
+        self.trace_memory = trace_memory
+        self.loop = None
+        self.started = None
+        self.hostname = socket.gethostname()
+
+    async def connect(self):
+        # connect the devices concurrently, each discovery and connect blocks
+        device_names = sorted(set(p.device_name for p in self.plugins))
+        executor = ThreadPoolExecutor(max_workers=len(device_names))
+        try:
+            await asyncio.gather(*[
+                self.loop.run_in_executor(
+                    executor, self.pool.connect, name, self._receiver(name))
+                for name in device_names
+            ])
+        finally:
+            executor.shutdown(wait=False)
+
+        for plugin in self.plugins:
+            conn = self.pool.connections[plugin.device_name]
+            plugin.start(conn.ggd_name, self.hostname)
+            for topic in plugin.topics:
+                self.subscribe(conn, topic, plugin)
+
+    def _receiver(self, device_name):
+        def on_message(message):
+            # called on the SDK's dispatch thread
+            self.loop.call_soon_threadsafe(
+                self._dispatch, device_name, message.topic, message.payload)
+        return on_message
+
+    def subscribe(self, conn, topic, plugin):
+        conn.topics.add(topic, plugin)
+        if topic not in conn.filters:
+            conn.filters.add(topic)
+            # the SDK hands every message to the connection's receiver, which
+            # matches it against the trie. The SDK still scans each subscribed
+            # filter per message, so every filter is subscribed only once.
+            conn.mqttc.subscribe(topic, 0, None)
+            log.info("[host] {0} subscribed to:{1}".format(
+                conn.device_name, topic))
+
+    def _call(self, plugin, method, *args):
+        metrics = self.metrics[id(plugin)]
+        if self.trace_memory:
+            memory = tracemalloc.get_traced_memory()[0]
+        start = time.thread_time()
+        try:
+            messages = method(*args)
+        except Exception as e:
+            metrics.errors += 1
+            log.exception("[host] {0} failed:{1}".format(plugin.name, e))
+            messages = None
+        metrics.cpu_seconds += time.thread_time() - start
+        if messages:
+            publisher = self.pool.connections[plugin.device_name].publisher
+            for topic, payload in messages:
+                publisher.publish(topic, payload, 0)
+            metrics.published += len(messages)
+        if self.trace_memory:
+            # net bytes still allocated after the call and its publishes
+            metrics.memory_bytes += tracemalloc.get_traced_memory()[0] - memory
+
+    def _dispatch(self, device_name, topic, payload):
+        conn = self.pool.connections.get(device_name)
+        if conn is None:
+            return
+        for plugin in conn.topics.match(topic):
+            self.metrics[id(plugin)].received += 1
+            self._call(plugin, plugin.on_message, topic, payload)
+
+    async def _run_plugin(self, plugin):
+        if plugin.interval is None:
+            return
+        metrics = self.metrics[id(plugin)]
+        next_tick = self.loop.time()
+        while True:
+            now = self.loop.time()
+            metrics.max_lag = max(metrics.max_lag, now - next_tick)
+            metrics.ticks += 1
+            self._call(plugin, plugin.tick, now)
+            next_tick += plugin.interval
+            if next_tick < self.loop.time():
+                # the loop fell behind, skip the missed ticks
+                next_tick = self.loop.time()
+            await asyncio.sleep(next_tick - self.loop.time())
+
+    def report(self):
+        elapsed = self.loop.time() - self.started
+        plugins = dict()
+        for m in self.metrics.values():
+            plugins[m.plugin.name] = m.summary(
+                elapsed, m.memory_bytes if self.trace_memory else None)
+        return {
+            "uptime_s": round(elapsed, 3),
+            "connections": len(self.pool.connections),
+            "plugins": plugins
+        }
+
+    async def _report(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            log.info("[host] report:{0}".format(
+                json.dumps(self.report(), sort_keys=True)))
+
+    async def run(self, report_interval=60):
+        self.loop = asyncio.get_event_loop()
+        if self.trace_memory:
+            tracemalloc.start()
+        await self.connect()
+        self.started = self.loop.time()
+        tasks = [self._run_plugin(p) for p in self.plugins]
+        if report_interval:
+            tasks.append(self._report(report_interval))
+        await asyncio.gather(*tasks)
+
+    def stop(self):
+        for plugin in self.plugins:
+            plugin.stop()
+        if self.started is not None:
+            log.info("[host] final report:{0}".format(
+                json.dumps(self.report(), sort_keys=True)))
+        self.pool.close()
+
+
+def main(args):
+    plugin_kwargs = json.loads(args.plugin_args) if args.plugin_args else {}
+    plugins = [
+        load_plugin(spec, **plugin_kwargs.get(spec.partition('=')[0], {}))
+        for spec in args.plugins
+    ]
+    pool = ConnectionPool(
+        config_file=args.config_file,
+        root_ca=args.root_ca or os.path.join(args.cert_dir, 'root-ca.pem'),
+        cert_dir=args.cert_dir, group_ca_path=args.group_ca_path,
+        discovery_ttl=args.discovery_ttl, spool_dir=args.spool_dir
+    )
+    host = GGDHost(pool, plugins, trace_memory=args.trace_memory)
+    loop = asyncio.get_event_loop()
+    try:
+        loop.run_until_complete(host.run(report_interval=args.report_interval))
+    except KeyboardInterrupt:
+        log.info("[host] KeyboardInterrupt ... exiting host")
+    finally:
+        host.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run many Greengrass device plugins in one process',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('config_file',
+                        help="The config file.")
+    parser.add_argument('cert_dir',
+                        help="Directory with the <device_name>.pem and "
+                             "<device_name>.prv files of every device.")
+    parser.add_argument('plugins', nargs='+',
+                        help="Plugins as <device_name>=<module>:<class>.")
+    parser.add_argument('--root-ca', dest='root_ca',
+                        help="Root CA File Path of Cloud Server Certificate. "
+                             "Defaults to <cert_dir>/root-ca.pem.")
+    parser.add_argument('--group-ca-path', dest='group_ca_path',
+                        help="The directory where the discovered Group CA "
+                             "will be saved. Defaults to cert_dir.")
+    parser.add_argument('--plugin-args', dest='plugin_args',
+                        help="JSON object of keyword arguments per "
+                             "device_name, e.g. "
+                             "'{\"heartrate_ggd\": {\"interval\": 1}}'.")
+    parser.add_argument('--discovery-ttl', dest='discovery_ttl', default=3600,
+                        type=int,
+                        help="Seconds to reuse a cached discovery result. "
+                             "Use 0 to always discover from the cloud.")
+    parser.add_argument('--spool-dir', dest='spool_dir',
+                        help="Directory used to spool messages published "
+                             "while the Core is unreachable.")
+    parser.add_argument('--report-interval', dest='report_interval',
+                        default=60, type=float,
+                        help="Seconds between plugin resource reports.")
+    parser.add_argument('--trace-memory', dest='trace_memory',
+                        action='store_true',
+                        help="Track the memory retained by each plugin's "
+                             "calls with tracemalloc.")
+
+    main(parser.parse_args())
@@ -0,0 +1,124 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+"""
+Greengrass device plugins run by the GGD host, see `host.py`.
+
+A plugin is the logic of one Greengrass device without its connection: the host
+calls `tick` every `interval` seconds and `on_message` for every message on the
+plugin's `topics`, and publishes the `(topic, payload)` pairs they return on
+the connection of the plugin's device.
+"""
+
+import json
+import random
+import datetime
+
+
+class DevicePlugin(object):
+    """
+    Base class of the plugins hosted by `GGDHost`.
+
+    :param device_name: the GGD's device_name in the config file, plugins with
+        the same device_name share one connection
+    :param interval: seconds between `tick` calls, `None` to never tick
+    :param topics: topic filters to subscribe to on the device's connection
+    """
+    interval = 1.0
+    topics = ()
+
+    def __init__(self, device_name, interval=None, topics=None):
+        self.device_name = device_name
+        if interval is not None:
+            self.interval = interval
+        if topics is not None:
+            self.topics = tuple(topics)
+        self.ggd_name = None
+        self.hostname = None
+
+    @property
+    def name(self):
+        return "{0}/{1}".format(self.device_name, type(self).__name__)
+
+    def start(self, ggd_name, hostname):
+        """Called once the plugin's device is connected"""
+        self.ggd_name = ggd_name
+        self.hostname = hostname
+
+    def tick(self, now):
+        """
+        :return: a list of `(topic, payload)` messages to publish
+        """
+        return []
+
+    def on_message(self, topic, payload):
+        """
+        :return: a list of `(topic, payload)` messages to publish
+        """
+        return []
+
+    def stop(self):
+        pass
+
+    def message(self, data):
+        return json.dumps({
+            "version": "2017-07-05",  # YYYY-MM-DD
+            "ggd_id": self.ggd_name,
+            "hostname": self.hostname,
+            "data": data
+        })
+
+
+class HeartbeatPlugin(DevicePlugin):
+    """The heartbeat device of `heartbeat.py` as a plugin"""
+    interval = 3.0
+
+    def __init__(self, device_name, topic='/heart/beat', **kwargs):
+        super(HeartbeatPlugin, self).__init__(device_name, **kwargs)
+        self.topic = topic
+        self.started = None
+
+    def start(self, ggd_name, hostname):
+        super(HeartbeatPlugin, self).start(ggd_name, hostname)
+        self.started = datetime.datetime.now()
+
+    def tick(self, now):
+        now = datetime.datetime.now()
+        return [(self.topic, self.message([{
+            "sensor_id": "heartbeat",
+            "ts": now.isoformat(),
+            "duration": str(now - self.started)
+        }]))]
+
+
+class HeartratePlugin(DevicePlugin):
+    """
+    The heartrate device of `heartrate.py` as a plugin, with one simulated
+    reading per sensor in `sensor_ids` each tick.
+    """
+    interval = 5.0
+
+    def __init__(self, device_name, topic='heartrate', sensor_ids=('user1',),
+                 **kwargs):
+        super(HeartratePlugin, self).__init__(device_name, **kwargs)
+        self.topic = topic
+        self.sensor_ids = tuple(sensor_ids)
+
+    def tick(self, now):
+        ts = datetime.datetime.now().isoformat()
+        return [(self.topic, self.message([
+            {
+                "sensor_id": sensor_id,
+                "ts": ts,
+                "value": random.randint(60, 100)
+            } for sensor_id in self.sensor_ids
+        ]))]
@@ -0,0 +1,492 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+from itertools import islice
+
+DROP_OLDEST = 'drop_oldest'
+DROP_NEWEST = 'drop_newest'
+BLOCK = 'block'
+POLICIES = (DROP_OLDEST, DROP_NEWEST, BLOCK)
+
+SEGMENT_SUFFIX = '.seg'
+
+
+class PublishSpool(object):
+    """
+    Durable publish buffer for a GGD's MQTT client.
+
+    While the client is online, messages are published straight through. While
+    it is offline, messages are kept in a bounded in-memory queue; once that is
+    full, the queue and, until the backlog is replayed, every later message are
+    appended to size-rotated segment files in `spool_dir`. `close` also writes
+    the queue to a segment, so the whole backlog survives a restart. When the
+    client comes back online the backlog is replayed in order, in batches of
+    `replay_batch`, from a background thread. The replay position is
+    persisted, so a restarted device resumes replaying the segments left on
+    disk. A corrupt record in a segment is skipped and counted as `corrupt`.
+    A message buffered while its replay is in flight may be published twice.
+
+    When the disk budget `max_disk_bytes` (or, without a `spool_dir`, the
+    memory queue) is exhausted, `policy` decides what happens to new messages:
+    `drop_oldest` discards the oldest buffered messages, the oldest segment
+    first as it holds them, `drop_newest` rejects
+    the new message and `block` waits up to `block_timeout` seconds for the
+    replay to free space.
+
+    Only the client's offline callback takes the spool offline. A publish that
+    fails while the client is online, e.g. while the SDK is still resubscribing
+    after a reconnect, buffers the message and retries the backlog after
+    `retry_interval` seconds, doubling after every failed retry up to
+    `max_retry_interval`.
+
+    Use `attach` to hook the spool to an `AWSIoTMQTTClient`'s online and offline
+    callbacks, and disable the client's own offline queue.
+    """
+
+    def __init__(self, client, spool_dir=None, name='spool',
+                 memory_limit=1000, segment_bytes=4 * 1024 * 1024,
+                 max_disk_bytes=256 * 1024 * 1024, policy=DROP_OLDEST,
+                 replay_batch=100, block_timeout=10.0, retry_interval=1.0,
+                 max_retry_interval=30.0):
+        if policy not in POLICIES:
+            raise ValueError("policy must be one of {0}".format(POLICIES))
+        self.client = client
+        self.spool_dir = spool_dir
+        self.name = name
+        self.memory_limit = memory_limit
+        self.segment_bytes = segment_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.policy = policy
+        self.replay_batch = replay_batch
+        self.block_timeout = block_timeout
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+
+        self.online = True
+        self._lock = threading.Condition()
+        self._memory = deque()
+        self._seq = 0
+        self._replaying = False
+        self._retry_timer = None
+        self._retry_delay = retry_interval
+
+        # disk state: segment numbers in order, the writer's open segment and
+        # the reader's position within the oldest segment
+        self._segments = list()
+        self._writer = None
+        self._read_offset = 0
+        self._disk_records = 0
+        self._disk_bytes = 0
+
+        self.published = 0
+        self.spilled = 0
+        self.dropped = 0
+        self.replayed = 0
+        self.replay_seconds = 0.0
+        self.publish_errors = 0
+        self.corrupt = 0
+
+        if spool_dir is not None:
+            self._recover()
+
+    # -- public API --------------------------------------------------------
+
+    def attach(self, mqtt_client):
+        """Drive the spool from an `AWSIoTMQTTClient`'s connection events."""
+        mqtt_client.onOnline = self.on_online
+        mqtt_client.onOffline = self.on_offline
+
+    def publish(self, topic, payload, qos=0):
+        """
+        Publish now if possible, otherwise buffer the message.
+
+        :return: False only if the message was dropped by the policy
+        """
+        with self._lock:
+            if self.online and self._depth() == 0:
+                if self._try_publish(topic, payload, qos):
+                    self.published += 1
+                    return True
+                self.publish_errors += 1
+                queued = self._enqueue(topic, payload, qos)
+                self._schedule_retry()
+                return queued
+            return self._enqueue(topic, payload, qos)
+
+    def on_offline(self):
+        with self._lock:
+            self.online = False
+            self._cancel_retry()
+        logging.info("[spool] offline, buffering publishes")
+
+    def on_online(self):
+        with self._lock:
+            self.online = True
+            self._retry_delay = self.retry_interval
+            self._cancel_retry()
+        self._start_replay()
+
+    def wait(self, timeout=None):
+        """
+        Block until a running replay finishes.
+
+        :return: True if the backlog is empty
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        with self._lock:
+            while self._replaying:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                self._lock.wait(remaining)
+            return self._depth() == 0
+
+    def depth(self):
+        with self._lock:
+            return self._depth()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "depth": self._depth(),
+                "memory_depth": len(self._memory),
+                "disk_depth": self._disk_records,
+                "disk_bytes": self._disk_bytes,
+                "segments": len(self._segments),
+                "published": self.published,
+                "spilled": self.spilled,
+                "dropped": self.dropped,
+                "replayed": self.replayed,
+                "publish_errors": self.publish_errors,
+                "corrupt": self.corrupt,
+                "replay_msgs_per_s":
+                    self.replayed / self.replay_seconds
+                    if self.replay_seconds else 0.0
+            }
+
+    def close(self):
+        """Stop retrying, and write the memory queue to disk to keep it"""
+        with self._lock:
+            self._cancel_retry()
+            if self.spool_dir is not None:
+                self._spill_memory()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    # -- buffering ---------------------------------------------------------
+
+    def _depth(self):
+        return len(self._memory) + self._disk_records
+
+    def _try_publish(self, topic, payload, qos):
+        try:
+            result = self.client.publish(topic, payload, qos)
+            return result is not False
+        except Exception as e:
+            logging.debug("[spool] publish failed:{0}".format(e))
+            return False
+
+    def _enqueue(self, topic, payload, qos):
+        # the memory queue only takes messages while nothing older is on disk,
+        # which keeps the backlog in publish order
+        if self._disk_records == 0 and len(self._memory) < self.memory_limit:
+            self._seq += 1
+            self._memory.append((self._seq, topic, payload, qos))
+            return True
+
+        if self.spool_dir is None:
+            if not self._make_room(lambda: len(self._memory) <
+                                   self.memory_limit):
+                return False
+            self._seq += 1
+            self._memory.append((self._seq, topic, payload, qos))
+            return True
+
+        # the queue holds the oldest messages, so it goes to disk ahead of
+        # this one, where `drop_oldest` finds the oldest messages first
+        self._spill_memory()
+        if not self._make_room(lambda: self._disk_bytes <
+                               self.max_disk_bytes):
+            return False
+        self._append_disk(topic, payload, qos)
+        return True
+
+    def _spill_memory(self):
+        # the queue only has messages while the disk has none, so appending
+        # it keeps the backlog in publish order
+        while self._memory:
+            _, topic, payload, qos = self._memory.popleft()
+            self._append_disk(topic, payload, qos)
+
+    def _make_room(self, has_room):
+        if has_room():
+            return True
+        if self.policy == DROP_NEWEST:
+            self.dropped += 1
+            return False
+        if self.policy == BLOCK:
+            deadline = time.time() + self.block_timeout
+            while not has_room():
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self.dropped += 1
+                    return False
+                self._lock.wait(remaining)
+            return True
+
+        # DROP_OLDEST
+        while not has_room():
+            if self.spool_dir is None:
+                self._memory.popleft()
+                self.dropped += 1
+            else:
+                self._drop_oldest_segment()
+        return True
+
+    # -- disk segments -----------------------------------------------------
+
+    def _segment_path(self, number):
+        return os.path.join(self.spool_dir, "{0}.{1:010d}{2}".format(
+            self.name, number, SEGMENT_SUFFIX))
+
+    def _cursor_path(self):
+        return os.path.join(self.spool_dir, self.name + '.cursor')
+
+    def _recover(self):
+        if not os.path.exists(self.spool_dir):
+            os.makedirs(self.spool_dir)
+        prefix = self.name + '.'
+        for f in os.listdir(self.spool_dir):
+            if f.startswith(prefix) and f.endswith(SEGMENT_SUFFIX):
+                self._segments.append(
+                    int(f[len(prefix):-len(SEGMENT_SUFFIX)]))
+        self._segments.sort()
+
+        try:
+            with open(self._cursor_path(), 'r') as f:
+                number, offset = [int(v) for v in f.read().split()]
+            if self._segments and self._segments[0] == number:
+                self._read_offset = offset
+        except (IOError, OSError, ValueError):
+            pass
+
+        for number in self._segments:
+            with open(self._segment_path(number), 'rb') as f:
+                if number == self._segments[0]:
+                    f.seek(self._read_offset)
+                data = f.read()
+            self._disk_bytes += len(data)
+            self._disk_records += data.count(b'\n')
+        if self._disk_records:
+            logging.info("[spool] recovered {0} messages in {1} segments".format(
+                self._disk_records, len(self._segments)))
+
+    def _append_disk(self, topic, payload, qos):
+        if isinstance(payload, bytes):
+            payload = payload.decode('utf-8')
+        line = (json.dumps([topic, payload, qos]) + '\n').encode('utf-8')
+
+        if self._writer is None or self._writer.tell() >= self.segment_bytes:
+            self._rotate()
+        self._writer.write(line)
+        self._writer.flush()
+        self._disk_records += 1
+        self._disk_bytes += len(line)
+        self.spilled += 1
+
+    def _rotate(self):
+        if self._writer is not None:
+            self._writer.close()
+        number = self._segments[-1] + 1 if self._segments else 0
+        self._segments.append(number)
+        self._writer = open(self._segment_path(number), 'ab')
+
+    def _drop_oldest_segment(self):
+        number = self._segments[0]
+        if len(self._segments) == 1:
+            # never drop the segment being written; start a new one first
+            self._rotate()
+        path = self._segment_path(number)
+        with open(path, 'rb') as f:
+            f.seek(self._read_offset)
+            data = f.read()
+        os.remove(path)
+        self._segments.pop(0)
+        self._read_offset = 0
+        count = data.count(b'\n')
+        self._disk_records -= count
+        self._disk_bytes -= len(data)
+        self.dropped += count
+        self._save_cursor()
+
+    def _read_disk_batch(self):
+        """
+        Return `[(record, segment, end_offset)]` from the oldest segment,
+        where `record` is `None` for a corrupt record
+        """
+        while self._segments:
+            number = self._segments[0]
+            if self._writer is not None:
+                self._writer.flush()
+            batch = list()
+            offset = self._read_offset
+            with open(self._segment_path(number), 'rb') as f:
+                f.seek(offset)
+                for line in islice(f, self.replay_batch):
+                    if not line.endswith(b'\n'):
+                        break  # partially written record
+                    offset += len(line)
+                    try:
+                        topic, payload, qos = json.loads(line.decode('utf-8'))
+                        record = (topic, payload, qos)
+                    except (ValueError, TypeError):
+                        record = None
+                    batch.append((record, number, offset))
+            if batch or number == self._segments[-1]:
+                return batch
+            # fully replayed segment
+            os.remove(self._segment_path(number))
+            self._segments.pop(0)
+            self._read_offset = 0
+            self._save_cursor()
+        return []
+
+    def _ack_disk(self, number, offset, count, size):
+        if not self._segments or self._segments[0] != number:
+            return  # the segment was dropped while replaying
+        self._read_offset = offset
+        self._disk_records -= count
+        self._disk_bytes -= size
+        self._save_cursor()
+
+    def _save_cursor(self):
+        if not self._segments:
+            return
+        tmp_path = self._cursor_path() + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write("{0} {1}".format(self._segments[0], self._read_offset))
+        os.rename(tmp_path, self._cursor_path())
+
+    # -- replay ------------------------------------------------------------
+
+    def _start_replay(self):
+        with self._lock:
+            self._retry_timer = None
+            if not self.online or self._replaying or self._depth() == 0:
+                return
+            self._replaying = True
+        logging.info("[spool] online, replaying {0} messages".format(
+            self.depth()))
+        t = threading.Thread(target=self._replay, name='spool-replay')
+        t.daemon = True
+        t.start()
+
+    def _schedule_retry(self):
+        """Retry the backlog later, unless a replay or retry is under way"""
+        if self._retry_timer is not None or self._replaying:
+            return
+        logging.info("[spool] publish failed while online, retry in {0}s".format(
+            self._retry_delay))
+        self._retry_timer = threading.Timer(self._retry_delay,
+                                            self._start_replay)
+        self._retry_timer.daemon = True
+        self._retry_timer.start()
+        self._retry_delay = min(self._retry_delay * 2, self.max_retry_interval)
+
+    def _cancel_retry(self):
+        if self._retry_timer is not None:
+            self._retry_timer.cancel()
+            self._retry_timer = None
+
+    def _replay(self):
+        start = time.time()
+        replayed = 0
+        try:
+            while True:
+                with self._lock:
+                    if not self.online:
+                        break
+                    if self._memory:
+                        source = 'memory'
+                        batch = list(islice(self._memory, self.replay_batch))
+                        records = [(topic, payload, qos)
+                                   for _, topic, payload, qos in batch]
+                    elif self._disk_records:
+                        source = 'disk'
+                        batch = self._read_disk_batch()
+                        records = [r for r, _, _ in batch]
+                    else:
+                        break
+                    start_offset = self._read_offset
+
+                sent = corrupt = 0
+                for record in records:
+                    if record is None:
+                        # acknowledged with the batch, never published
+                        corrupt += 1
+                    elif not self._try_publish(*record):
+                        break
+                    sent += 1
+
+                with self._lock:
+                    if source == 'memory':
+                        last_seq = batch[sent - 1][0] if sent else 0
+                        while self._memory and self._memory[0][0] <= last_seq:
+                            self._memory.popleft()
+                    elif sent:
+                        _, number, offset = batch[sent - 1]
+                        self._ack_disk(number, offset, sent,
+                                       offset - start_offset)
+                    if corrupt:
+                        self.corrupt += corrupt
+                        logging.warning(
+                            "[spool] skipped {0} corrupt records".format(
+                                corrupt))
+                    replayed += sent - corrupt
+                    self.replayed += sent - corrupt
+                    self._lock.notify_all()
+                    if sent < len(records):
+                        self.publish_errors += 1
+                        break
+        finally:
+            with self._lock:
+                self._replaying = False
+                self.replay_seconds += time.time() - start
+                if self._depth() and self.online:
+                    # a publish failed without the client going offline
+                    self._schedule_retry()
+                elif self._depth() == 0:
+                    self._retry_delay = self.retry_interval
+                if self._depth() == 0 and self._segments:
+                    # everything was replayed, start a fresh segment next time
+                    if self._writer is not None:
+                        self._writer.close()
+                        self._writer = None
+                    for number in self._segments:
+                        os.remove(self._segment_path(number))
+                    self._segments = list()
+                    self._read_offset = 0
+                    self._disk_bytes = 0
+                    if os.path.exists(self._cursor_path()):
+                        os.remove(self._cursor_path())
+                self._lock.notify_all()
+        logging.info("[spool] replayed {0} messages stats:{1}".format(
+            replayed, self.stats()))
@@ -0,0 +1,183 @@
+# Copyright 2017 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License"). You may not
+# use this file except in compliance with the License. A copy of the License is
+# located at
+#     http://aws.amazon.com/apache2.0/
+#
+# or in the "license" file accompanying this file. This file is distributed on
+# an "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either
+# express or implied. See the License for the specific language governing
+# permissions and limitations under the License.
+
+SINGLE_LEVEL = '+'
+MULTI_LEVEL = '#'
+
+
+class ConnectivityIndex(object):
+    """
+    Hash index of Greengrass Core connectivity info objects.
+
+    Every connectivity info object is indexed by its `id`, `host`, `port` and
+    `metadata` values, so finding the objects matching a value is a single
+    dict lookup instead of a scan of every Core's connectivity list.
+    """
+    FIELDS = ('id', 'host', 'port', 'metadata')
+
+    def __init__(self, core_connectivity_info_list):
+        self._index = dict()
+        for cil in core_connectivity_info_list:
+            for ci in cil.connectivityInfoList:
+                self.add(ci)
+
+    def add(self, connectivity_info):
+        for field in self.FIELDS:
+            value = getattr(connectivity_info, field, None)
+            try:
+                matches = self._index.setdefault(value, list())
+            except TypeError:
+                continue  # unhashable metadata can't be matched by value
+            # a value shared by two fields still matches the object once
+            if not matches or matches[-1] is not connectivity_info:
+                matches.append(connectivity_info)
+
+    def get(self, match):
+        """
+        :return: the list of zero or more connectivity info objects with an
+            `id`, `host`, `port` or `metadata` value equal to `match`
+        """
+        if not match:
+            return list()
+        try:
+            return list(self._index.get(match, ()))
+        except TypeError:
+            return list()
+
+
+class _Node(object):
+    __slots__ = ('children', 'values')
+
+    def __init__(self):
+        self.children = dict()
+        self.values = list()
+
+
+def _split_filter(topic_filter):
+    levels = topic_filter.split('/')
+    for i, level in enumerate(levels):
+        if MULTI_LEVEL in level and \
+                (level != MULTI_LEVEL or i != len(levels) - 1):
+            raise ValueError(
+                "'#' must be the last level of topic filter:{0}".format(
+                    topic_filter))
+        if SINGLE_LEVEL in level and level != SINGLE_LEVEL:
+            raise ValueError(
+                "'+' must occupy a whole level of topic filter:{0}".format(
+                    topic_filter))
+    return levels
+
+
+class TopicTrie(object):
+    """
+    MQTT topic filter matcher.
+
+    Topic filters are stored in a trie with one node per topic level, so
+    matching a topic walks the trie level by level, following only the exact
+    level and the `+` and `#` wildcard children. A match costs O(topic depth)
+    no matter how many filters are stored, where checking every filter with
+    `topic_matches_sub` costs O(filters).
+
+    Matching follows the MQTT 3.1.1 rules: `+` matches exactly one level, `#`
+    matches the parent level and any number of child levels, and wildcards in
+    the first level don't match topics starting with `$`.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def add(self, topic_filter, value):
+        node = self._root
+        for level in _split_filter(topic_filter):
+            child = node.children.get(level)
+            if child is None:
+                child = node.children[level] = _Node()
+            node = child
+        node.values.append(value)
+        self._count += 1
+
+    def remove(self, topic_filter, value):
+        """
+        Remove one registration of `value` for `topic_filter`.
+
+        :return: True if the value was registered for the filter
+        """
+        path = [(None, self._root)]
+        for level in _split_filter(topic_filter):
+            child = path[-1][1].children.get(level)
+            if child is None:
+                return False
+            path.append((level, child))
+
+        node = path[-1][1]
+        for i, v in enumerate(node.values):
+            if v is value or v == value:
+                del node.values[i]
+                break
+        else:
+            return False
+        self._count -= 1
+
+        # prune the branch nodes left without values or children
+        for i in range(len(path) - 1, 0, -1):
+            level, node = path[i]
+            if node.values or node.children:
+                break
+            del path[i - 1][1].children[level]
+        return True
+
+    def match(self, topic):
+        """
+        :return: the values of every filter matching `topic`, each value once
+            even when several of its filters match
+        """
+        levels = topic.split('/')
+        system = topic.startswith('$')
+        result = list()
+        seen = set()
+
+        def collect(values):
+            for v in values:
+                if id(v) not in seen:
+                    seen.add(id(v))
+                    result.append(v)
+
+        nodes = [self._root]
+        for depth, level in enumerate(levels):
+            next_nodes = list()
+            for node in nodes:
+                children = node.children
+                if not (system and depth == 0):
+                    multi = children.get(MULTI_LEVEL)
+                    if multi is not None:
+                        collect(multi.values)
+                    single = children.get(SINGLE_LEVEL)
+                    if single is not None:
+                        next_nodes.append(single)
+                exact = children.get(level)
+                if exact is not None:
+                    next_nodes.append(exact)
+            if not next_nodes:
+                return result
+            nodes = next_nodes
+
+        for node in nodes:
+            collect(node.values)
+            # 'a/#' also matches 'a'
+            multi = node.children.get(MULTI_LEVEL)
+            if multi is not None:
+                collect(multi.values)
+        return result
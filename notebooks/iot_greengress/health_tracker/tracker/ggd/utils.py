@@ -23,8 +23,11 @@ from AWSIoTPythonSDK.exception.AWSIoTExceptions import \
 from AWSIoTPythonSDK.exception import operationTimeoutException
 from AWSIoTPythonSDK.core.greengrass.discovery.providers import \
     DiscoveryInfoProvider
-from AWSIoTPythonSDK.MQTTLib import DROP_OLDEST, AWSIoTMQTTShadowClient
+from AWSIoTPythonSDK.MQTTLib import DROP_OLDEST, AWSIoTMQTTClient, \
+    AWSIoTMQTTShadowClient
 from gg_group_setup import GroupConfigFile
+from discovery import DiscoveryCache, race_endpoints
+from spool import PublishSpool
 
 
 def get_aws_session(region, profile_name=None):
@@ -43,8 +46,9 @@ def get_aws_session(region, profile_name=None):
 def mqtt_connect(mqtt_client, core_info):
     connected = False
 
-    # try connecting to all connectivity info objects in the list
-    for connectivity_info in core_info.connectivityInfoList:
+    # try connecting to all connectivity info objects in the list, starting
+    # with the endpoint that won a parallel TCP connect race
+    for connectivity_info in race_endpoints(core_info.connectivityInfoList):
         core_host = connectivity_info.host
         core_port = connectivity_info.port
         logging.info("Connecting to Core at {0}:{1}".format(
@@ -65,12 +69,35 @@ def mqtt_connect(mqtt_client, core_info):
     return connected
 
 
-def local_shadow_connect(device_name, config_file, root_ca, certificate,
-                         private_key, group_ca_dir):
-    cfg = GroupConfigFile(config_file)
-    ggd_name = cfg['devices'][device_name]['thing_name']
-    iot_endpoint = cfg['misc']['iot_endpoint']
+def configure_publish_spool(mqtt_client, spool_dir, name, **kwargs):
+    """
+    Replace the client's 10 message offline publish queue with a
+    `PublishSpool` that spills to `spool_dir`. Must be called before the
+    client connects.
+
+    :return: the `PublishSpool` to publish through
+    """
+    # disable the SDK's own queue so offline publishes fail into the spool
+    mqtt_client.configureOfflinePublishQueueing(0)
+    spool = PublishSpool(mqtt_client, spool_dir=spool_dir, name=name, **kwargs)
+    spool.attach(mqtt_client)
+    logging.info("[configure_publish_spool] spooling to:{0} stats:{1}".format(
+        spool_dir, spool.stats()))
+    return spool
 
+
+def discovery_attempts(cache, refresh=False):
+    """
+    :return: the `refresh` argument of each discovery to try: the cached
+        discovery first, then, as the cached core endpoints may be stale, a
+        fresh one
+    """
+    if cache is None or refresh:
+        return [True] if refresh else [False]
+    return [False, True]
+
+
+def _discovery_provider(iot_endpoint, root_ca, certificate, private_key):
     dip = DiscoveryInfoProvider()
     dip.configureEndpoint(iot_endpoint)
     dip.configureCredentials(
@@ -78,36 +105,66 @@ def local_shadow_connect(device_name, config_file, root_ca, certificate,
     )
     dip.configureTimeout(10)  # 10 sec
     logging.info(
-        "[shadow_connect] Discovery using CA:{0} cert:{1} prv_key:{2}".format(
+        "[discovery] Discovery using CA:{0} cert:{1} prv_key:{2}".format(
             root_ca, certificate, private_key
     ))
-    gg_core, discovery_info = discover_configured_core(
-        config_file=config_file, dip=dip, device_name=ggd_name,
-    )
-    if not gg_core:
-        raise EnvironmentError("[core_connect] Couldn't find the Core")
-
-    ca_list = discovery_info.getAllCas()
-    core_list = discovery_info.getAllCores()
-    group_id, ca = ca_list[0]
-    core_info = core_list[0]
-    logging.info("Discovered Greengrass Core:{0} from Group:{1}".format(
-        core_info.coreThingArn, group_id)
-    )
-    group_ca_file = save_group_ca(ca, group_ca_dir, group_id)
+    return dip
+
+
+def connect_configured_core(mqtt_client, ggd_name, config_file, dip,
+                            certificate, private_key, group_ca_dir,
+                            cache=None, refresh=False):
+    """
+    Discover the configured Core of `ggd_name` and connect `mqtt_client` to
+    it, trying each `discovery_attempts`, and the endpoints of each discovery
+    with `mqtt_connect`.
+
+    :return: True once connected
+    :raise EnvironmentError: when the Core can't be discovered
+    """
+    for attempt_refresh in discovery_attempts(cache, refresh):
+        gg_core, discovery_info = discover_configured_core(
+            config_file=config_file, dip=dip, device_name=ggd_name,
+            cache=cache, refresh=attempt_refresh
+        )
+        if not gg_core:
+            raise EnvironmentError(
+                "[connect_configured_core] Couldn't find the Core")
+
+        group_id, ca = discovery_info.getAllCas()[0]
+        group_ca_file = save_group_ca(ca, group_ca_dir, group_id)
+
+        # local Greengrass Core discovered, now connect to Core from this
+        # Device
+        logging.info("[connect_configured_core] gca_file:{0} cert:{1}".format(
+            group_ca_file, certificate))
+        mqtt_client.configureCredentials(
+            group_ca_file, private_key, certificate)
+        if mqtt_connect(mqtt_client, gg_core):
+            return True
+        if cache is not None:
+            cache.invalidate(ggd_name)
+    return False
 
-    # local Greengrass Core discovered
-    # get a shadow client to receive commands
-    mqttsc = AWSIoTMQTTShadowClient(ggd_name)
 
-    # now connect to Core from this Device
-    logging.info("[core_connect] gca_file:{0} cert:{1}".format(
-        group_ca_file, certificate))
-    mqttsc.configureCredentials(group_ca_file, private_key, certificate)
+def local_shadow_connect(device_name, config_file, root_ca, certificate,
+                         private_key, group_ca_dir, discovery_ttl=3600,
+                         refresh=False):
+    cfg = GroupConfigFile(config_file)
+    ggd_name = cfg['devices'][device_name]['thing_name']
+    dip = _discovery_provider(
+        cfg['misc']['iot_endpoint'], root_ca, certificate, private_key)
+    cache = DiscoveryCache(group_ca_dir, ttl=discovery_ttl) \
+        if discovery_ttl > 0 else None
 
+    # get a shadow client to receive commands
+    mqttsc = AWSIoTMQTTShadowClient(ggd_name)
     mqttc = mqttsc.getMQTTConnection()
     mqttc.configureOfflinePublishQueueing(10, DROP_OLDEST)
-    if not mqtt_connect(mqttsc, gg_core):
+
+    if not connect_configured_core(
+            mqttsc, ggd_name, config_file, dip, certificate, private_key,
+            group_ca_dir, cache=cache, refresh=refresh):
         raise EnvironmentError("connection to Tracker Shadow failed.")
 
     # create and register the shadow handler on delta topics for commands
@@ -118,14 +175,65 @@ def local_shadow_connect(device_name, config_file, root_ca, certificate,
     return mqttc, mqttsc, tracker_shadow, ggd_name
 
 
-def discover_configured_core(device_name, dip, config_file):
+def device_connect(device_name, config_file, root_ca, certificate,
+                   private_key, group_ca_dir, discovery_ttl=3600,
+                   spool_dir=None, on_message=None, refresh=False):
+    """
+    Discover the configured Core of `device_name` and connect an MQTT client
+    to it, using the discovery cache and an optional publish spool.
+
+    :param on_message: optional callback given every received message, for
+        subscriptions made without a per-topic callback
+
+    :return: a `(mqttc, ggd_name, spool)` tuple where `spool` is `None` unless
+        a `spool_dir` is given
+    """
+    cfg = GroupConfigFile(config_file)
+    ggd_name = cfg['devices'][device_name]['thing_name']
+    dip = _discovery_provider(
+        cfg['misc']['iot_endpoint'], root_ca, certificate, private_key)
+    cache = DiscoveryCache(group_ca_dir, ttl=discovery_ttl) \
+        if discovery_ttl > 0 else None
+
+    mqttc = AWSIoTMQTTClient(ggd_name)
+    spool = None
+    if spool_dir:
+        spool = configure_publish_spool(mqttc, spool_dir, ggd_name)
+    else:
+        mqttc.configureOfflinePublishQueueing(10, DROP_OLDEST)
+    if on_message is not None:
+        # the client reads its callbacks when connecting
+        mqttc.onMessage = on_message
+
+    connected = False
+    try:
+        connected = connect_configured_core(
+            mqttc, ggd_name, config_file, dip, certificate, private_key,
+            group_ca_dir, cache=cache, refresh=refresh)
+    finally:
+        if not connected and spool is not None:
+            # release the open segment, the caller gets no spool to close
+            spool.close()
+    if not connected:
+        raise EnvironmentError(
+            "[device_connect] connection to GG Core MQTT failed.")
+
+    return mqttc, ggd_name, spool
+
+
+def discover_configured_core(device_name, dip, config_file, cache=None,
+                             refresh=False):
     cfg = GroupConfigFile(config_file)
     gg_core = None
     # Discover Greengrass Core
 
     discovered, discovery_info = ggc_discovery(
-        device_name, dip, retry_count=10
+        device_name, dip, retry_count=10, cache=cache, refresh=refresh
     )
+    if not discovered:
+        logging.error("[discover_cores] Device: {0} discovery failed".format(
+            device_name))
+        return gg_core, discovery_info
     logging.info("[discover_cores] Device: {0} discovery success".format(
         device_name)
     )
@@ -143,7 +251,20 @@ def discover_configured_core(device_name, dip, config_file):
 
 
 def ggc_discovery(thing_name, discovery_info_provider, retry_count=10,
-                  max_groups=1):
+                  max_groups=1, cache=None, refresh=False):
+    """
+    Discover the Greengrass groups of `thing_name`.
+
+    :param cache: optional `DiscoveryCache`. A fresh cache entry is returned
+        without calling the cloud, and successful cloud discoveries are saved.
+    :param refresh: ignore any cache entry and always call the cloud
+    :return: a `(discovered, discovery_info)` tuple
+    """
+    if cache is not None and not refresh:
+        discovery_info = cache.get(thing_name)
+        if discovery_info is not None:
+            return True, discovery_info
+
     back_off_core = ProgressiveBackOffCore()
     discovered = False
     discovery_info = None
@@ -157,6 +278,8 @@ def ggc_discovery(thing_name, discovery_info_provider, retry_count=10,
                 raise DiscoveryFailure("Discovered more groups than expected")
 
             discovered = True
+            if cache is not None:
+                cache.put(thing_name, discovery_info)
             break
         except DiscoveryFailure as df:
             logging.error(
@@ -191,6 +314,12 @@ def save_group_ca(group_ca, group_ca_path, group_id):
     group_ca_file = group_ca_path + '/' + group_id + "_CA.crt"
     if not os.path.exists(group_ca_path):
         os.makedirs(group_ca_path)
+    if os.path.exists(group_ca_file):
+        with open(group_ca_file, "r") as crt:
+            if crt.read() == group_ca:
+                logging.info('[save_group_ca] CA file unchanged:{0}'.format(
+                    group_ca_file))
+                return group_ca_file
     with open(group_ca_file, "w") as crt:
         crt.write(group_ca)
     logging.info('[save_group_ca] Saved CA file:{0}'.format(group_ca_file))
@@ -206,26 +335,3 @@ def dump_core_info_list(core_connectivity_info_list):
             print("    Connection info: {0} {1} {2} {3}".format(
                 ci.id, ci.host, ci.port, ci.metadata))
 
-
-def get_conn_info(core_connectivity_info_list, match):
-    """
-    Get core connectivity info objects from the list. Matching any the `match`
-    argument.
-
-    :param core_connectivity_info_list: the connectivity info object list
-    :param match: the value to match against either the Core Connectivity Info
-        `id`, `host`, `port`, or `metadata` values
-    :return: the list of zero or more matching connectivity info objects
-    """
-    conn_info = list()
-
-    if not match:
-        return conn_info
-
-    for cil in core_connectivity_info_list:
-        for ci in cil.connectivityInfoList:
-            if match == ci.id or match == ci.host or match == ci.port or \
-                            match == ci.metadata:
-                conn_info.append(ci)
-
-    return conn_info
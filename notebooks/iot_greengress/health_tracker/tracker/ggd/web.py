@@ -267,6 +267,10 @@ if __name__ == "__main__":
                         help="File Path of Web GGD Private Key.")
     parser.add_argument('group_ca_dir',
                         help="The directory where the discovered Group CA will be saved.")
+    parser.add_argument('--discovery-ttl', dest='discovery_ttl', default=3600,
+                        type=int,
+                        help="Seconds to reuse a cached discovery result. "
+                             "Use 0 to always discover from the cloud.")
     parser.add_argument('--debug', default=False, action='store_true',
                         help="Activate debug output.")
     pa = parser.parse_args()
@@ -280,7 +284,8 @@ if __name__ == "__main__":
                 device_name=pa.device_name,
                 config_file=pa.config_file,
                 root_ca=pa.root_ca, certificate=pa.certificate,
-                private_key=pa.private_key, group_ca_dir=pa.group_ca_dir
+                private_key=pa.private_key, group_ca_dir=pa.group_ca_dir,
+                discovery_ttl=pa.discovery_ttl
         )
 
         token = mshadow.shadowGet(shadow_mgr, 5)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Benchmark of `lib.tf_scripts.convert_to`, in examples per second.
+
+Converts `--examples` random MNIST sized images with the single threaded
+loop `convert_to` used to run, then with `convert_to` for each number of
+`--shards` and each `--compression`, and reads every output back to check
+the number of examples and the first image.
+
+To learn more about the command line type: `python bench_convert.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+import tensorflow as tf
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..', '..', '..'))
+
+from lib import tf_scripts
+
+DataSet = namedtuple('DataSet', 'images labels num_examples')
+
+
+def legacy_convert_to(data_set, name, directory):
+    """`convert_to` before sharding, for comparison"""
+    images = data_set.images
+    labels = data_set.labels
+    rows, cols, depth = images.shape[1:4]
+    filename = os.path.join(directory, name + '.tfrecords')
+    writer = tf.python_io.TFRecordWriter(filename)
+    for index in range(data_set.num_examples):
+        image_raw = images[index].tostring()
+        example = tf.train.Example(features=tf.train.Features(feature={
+            'height': tf_scripts._int64_feature(rows),
+            'width': tf_scripts._int64_feature(cols),
+            'depth': tf_scripts._int64_feature(depth),
+            'label': tf_scripts._int64_feature(int(labels[index])),
+            'image_raw': tf_scripts._bytes_feature(image_raw)}))
+        writer.write(example.SerializeToString())
+    writer.close()
+    return [filename]
+
+
+def read_back(filenames, compression):
+    options = tf.python_io.TFRecordOptions(
+        tf_scripts.COMPRESSION_TYPES[compression])
+    count, first = 0, None
+    for filename in filenames:
+        for record in tf.python_io.tf_record_iterator(filename, options):
+            if first is None:
+                first = tf.train.Example.FromString(record)
+            count += 1
+    return count, first
+
+
+def measure(convert, data_set, directory, compression=None):
+    start = time.time()
+    filenames = convert(data_set, directory)
+    elapsed = time.time() - start
+    count, first = read_back(filenames, compression)
+    feature = first.features.feature
+    return {
+        "files": len(filenames),
+        "bytes": sum(os.path.getsize(f) for f in filenames),
+        "elapsed_s": elapsed,
+        "examples_per_s": data_set.num_examples / elapsed,
+        "examples_read": count,
+        "first_image_ok": feature['image_raw'].bytes_list.value[0] ==
+        data_set.images[0].tobytes() and
+        feature['height'].int64_list.value[0] == data_set.images.shape[1]
+    }
+
+
+def main(args):
+    rng = np.random.RandomState(args.seed)
+    data_set = DataSet(
+        images=rng.randint(0, 256, (args.examples, 28, 28, 1)).astype(
+            np.uint8),
+        labels=rng.randint(0, 10, args.examples),
+        num_examples=args.examples)
+
+    directory = tempfile.mkdtemp()
+    try:
+        result = {"examples": args.examples}
+        result['legacy'] = measure(
+            lambda d, out: legacy_convert_to(d, 'legacy', out),
+            data_set, directory)
+        for compression in args.compression:
+            compression = None if compression == 'NONE' else compression
+            for shards in args.shards:
+                name = '%s-%d' % (compression or 'none', shards)
+                result[name] = measure(
+                    lambda d, out: tf_scripts.convert_to(
+                        d, name, out, num_shards=shards,
+                        num_workers=args.workers, compression=compression),
+                    data_set, directory, compression)
+                result[name]['speedup'] = \
+                    result['legacy']['elapsed_s'] / result[name]['elapsed_s']
+    finally:
+        shutil.rmtree(directory)
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the tfrecords conversion of a dataset',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--examples', default=60000, type=int,
+                        help="Number of examples to convert.")
+    parser.add_argument('--shards', default=[1, 4, 8], type=int, nargs='+',
+                        help="Shard counts.")
+    parser.add_argument('--workers', default=None, type=int,
+                        help="Processes, by default one per shard up to the "
+                             "number of CPUs.")
+    parser.add_argument('--compression', default=['NONE', 'GZIP'], nargs='+',
+                        choices=['NONE', 'GZIP', 'ZLIB'],
+                        help="Compression types.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+
+    main(parser.parse_args())
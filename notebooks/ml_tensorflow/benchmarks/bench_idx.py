@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Peak memory benchmark of the dataset input paths.
+
+Writes gzipped IDX images and labels of `--examples` random 28x28 images,
+then, each in a fresh process so that its peak memory is its own, reads
+every example as float32 scaled to [0, 1], in batches of `--batch-size`:
+
+- `legacy`: copies of the decompressed files, as `np.fromstring` made, then
+  a float32 copy of every image, what the escience `mnist.load_data` did
+- `frombuffer`: `np.frombuffer` views of the decompressed files, converted
+  one batch at a time, what the escience `mnist.load_data` and its
+  `ScaledIter` do now
+- `memmap`: `lib.idx.ArrayDataSet` memory maps, converted one chunk at a time
+- `convert`, with `--convert`: `lib.tf_scripts.convert_idx` to tfrecords,
+  which needs TensorFlow
+
+To learn more about the command line type: `python bench_idx.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import struct
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..', '..', '..'))
+
+from lib import idx
+
+
+def write_idx(path, array, type_code):
+    with gzip.open(path, 'wb', compresslevel=1) as f:
+        f.write(struct.pack('>HBB', 0, type_code, array.ndim))
+        f.write(struct.pack('>' + 'I' * array.ndim, *array.shape))
+        f.write(array.tobytes())
+
+
+def read_legacy(directory, batch_size):
+    with gzip.open(os.path.join(directory, 'labels.gz')) as flbl:
+        struct.unpack(">II", flbl.read(8))
+        # np.fromstring copied its input, newer numpy removed it
+        labels = np.frombuffer(flbl.read(), dtype=np.int8).copy()
+    with gzip.open(os.path.join(directory, 'images.gz')) as fimg:
+        _, _, rows, cols = struct.unpack(">IIII", fimg.read(16))
+        images = np.frombuffer(fimg.read(), dtype=np.uint8).copy().reshape(
+            len(labels), rows, cols)
+        images = images.reshape(images.shape[0], 1, 28, 28).astype(
+            np.float32) / 255
+    total = 0.0
+    for begin in range(0, len(images), batch_size):
+        total += float(images[begin:begin + batch_size].sum())
+    return total
+
+
+def read_frombuffer(directory, batch_size):
+    with gzip.open(os.path.join(directory, 'labels.gz')) as flbl:
+        struct.unpack(">II", flbl.read(8))
+        labels = np.frombuffer(flbl.read(), dtype=np.int8)
+    with gzip.open(os.path.join(directory, 'images.gz')) as fimg:
+        _, _, rows, cols = struct.unpack(">IIII", fimg.read(16))
+        images = np.frombuffer(fimg.read(), dtype=np.uint8).reshape(
+            len(labels), 1, rows, cols)
+    total = 0.0
+    for begin in range(0, len(images), batch_size):
+        batch = images[begin:begin + batch_size].astype(np.float32)
+        batch *= 1. / 255
+        total += float(batch.sum())
+    return total
+
+
+def read_memmap(directory, batch_size):
+    data_set = idx.ArrayDataSet.from_idx(
+        os.path.join(directory, 'images.gz'),
+        os.path.join(directory, 'labels.gz'),
+        cache_dir=os.path.join(directory, 'cache'))
+    total = 0.0
+    for images, labels in data_set.iter_chunks(
+            batch_size, dtype=np.float32, scale=1. / 255):
+        total += float(images.sum())
+    return total
+
+
+def convert(directory, batch_size):
+    from lib import tf_scripts
+    filenames = tf_scripts.convert_idx(
+        os.path.join(directory, 'images.gz'),
+        os.path.join(directory, 'labels.gz'),
+        'train', directory, cache_dir=os.path.join(directory, 'cache'),
+        num_shards=4)
+    return len(filenames)
+
+
+MODES = {
+    'legacy': read_legacy,
+    'frombuffer': read_frombuffer,
+    'memmap': read_memmap,
+    'convert': convert
+}
+
+
+def run_child(args):
+    start = time.time()
+    checksum = MODES[args.child](args.directory, args.batch_size)
+    return {
+        "elapsed_s": time.time() - start,
+        "peak_memory_mb": idx.peak_memory_mb(),
+        "checksum": checksum
+    }
+
+
+def main(args):
+    directory = tempfile.mkdtemp()
+    try:
+        rng = np.random.RandomState(args.seed)
+        images = rng.randint(0, 256, (args.examples, 28, 28)).astype(np.uint8)
+        write_idx(os.path.join(directory, 'images.gz'), images, 0x08)
+        write_idx(os.path.join(directory, 'labels.gz'),
+                  rng.randint(0, 10, args.examples).astype(np.int8), 0x08)
+        raw_mb = images.nbytes / (1024. * 1024.)
+        del images
+
+        result = {"examples": args.examples, "raw_images_mb": raw_mb}
+        modes = ['legacy', 'frombuffer', 'memmap']
+        if args.convert:
+            modes.append('convert')
+        for mode in modes:
+            output = subprocess.check_output([
+                sys.executable, os.path.realpath(__file__), '--child', mode,
+                '--directory', directory,
+                '--batch-size', str(args.batch_size)])
+            result[mode] = json.loads(output.decode('utf-8').splitlines()[-1])
+    finally:
+        shutil.rmtree(directory)
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the peak memory of the dataset input paths',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--examples', default=200000, type=int,
+                        help="Number of examples.")
+    parser.add_argument('--batch-size', dest='batch_size', default=1000,
+                        type=int, help="Examples converted at once.")
+    parser.add_argument('--convert', action='store_true',
+                        help="Also convert to tfrecords, needs TensorFlow.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(run_child(args), sort_keys=True))
+    else:
+        main(args)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Input only benchmark of `mnist._input_fn`, in examples per second.
+
+Writes `--examples` random MNIST sized images with `tf_scripts.convert_to`
+for each number of `--shards`, then reads `--batches` batches, after
+`--warmup` batches, with the queue runners `mnist.py` used to have and with
+the `tf.data` pipeline, with and without `cache`. No model runs, so this is
+the most examples per second the input can feed a model on this CPU.
+
+To learn more about the command line type: `python bench_input.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+from collections import namedtuple
+
+import numpy as np
+import tensorflow as tf
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..', '..', '..'))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+from lib import tf_scripts
+import mnist
+
+DataSet = namedtuple('DataSet', 'images labels num_examples')
+
+
+def run(directory, params, batches, warmup):
+    with tf.Graph().as_default():
+        input_fn = mnist._input_fn(directory, 'train', params)
+        if isinstance(input_fn, tf.data.Dataset):
+            features, labels = input_fn.make_one_shot_iterator().get_next()
+        else:
+            features, labels = input_fn
+        images = features[mnist.INPUT_TENSOR_NAME]
+
+        with tf.train.MonitoredSession() as session:
+            for _ in range(warmup):
+                session.run(labels)
+            examples = 0
+            start = time.time()
+            for _ in range(batches):
+                examples += len(session.run([images, labels])[1])
+            elapsed = time.time() - start
+    return {
+        "examples_per_s": examples / elapsed,
+        "elapsed_s": elapsed
+    }
+
+
+def main(args):
+    rng = np.random.RandomState(args.seed)
+    data_set = DataSet(
+        rng.randint(0, 256, (args.examples, 28, 28, 1)).astype(np.uint8),
+        rng.randint(0, 10, args.examples).astype(np.int64),
+        args.examples)
+
+    pipelines = [
+        ('queue', {'input_pipeline': 'queue'}),
+        ('dataset', {}),
+        ('dataset_cache', {'cache': True})
+    ]
+    result = {"examples": args.examples, "batch_size": args.batch_size}
+    for num_shards in args.shards:
+        directory = tempfile.mkdtemp()
+        try:
+            tf_scripts.convert_to(data_set, 'train', directory,
+                                  num_shards=num_shards)
+            for pipeline, params in pipelines:
+                params = dict(params, batch_size=args.batch_size)
+                key = '%s_%d_shards' % (pipeline, num_shards)
+                result[key] = run(directory, params, args.batches,
+                                  args.warmup)
+        finally:
+            shutil.rmtree(directory)
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the input pipelines of mnist.py',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--examples', default=20000, type=int,
+                        help="Number of examples written.")
+    parser.add_argument('--shards', default=[1, 4], type=int, nargs='+',
+                        help="Numbers of shards to compare.")
+    parser.add_argument('--batch-size', dest='batch_size', default=100,
+                        type=int, help="Examples per batch.")
+    parser.add_argument('--batches', default=500, type=int,
+                        help="Batches timed.")
+    parser.add_argument('--warmup', default=50, type=int,
+                        help="Batches read before timing.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+
+    main(parser.parse_args())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Benchmark of `microbatch`, in latency percentiles and requests per second.
+
+Serves a CPU only model with `microbatch.make_server` on a local port, once
+without batching, a `--max-batch-size` of 1, then for each of the
+`--max-batch-sizes`, and sends `--requests` requests of one image from each
+of `--clients` concurrent clients, over kept alive connections. First checks
+that the server answers the probabilities of the model on the image scaled
+as in training, and a request without images with a 400.
+
+The model is a NumPy stand-in of the size of `mnist.model_fn`, or
+the SavedModel of `--export-dir`, run with `microbatch.saved_model_predict_fn`.
+
+To learn more about the command line type: `python bench_microbatch.py --help`
+"""
+
+from __future__ import print_function
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+try:
+    from http.client import HTTPConnection
+except ImportError:
+    from httplib import HTTPConnection
+
+import numpy as np
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+import microbatch
+
+HEADERS = {'Content-Type': 'application/x-npy'}
+
+
+class LocalModel(object):
+    """
+    A dense network of random weights, 784-3136-1024-10, 3136 being the
+    size of the output of the convolutions of `mnist.model_fn`
+    """
+
+    def __init__(self, seed):
+        rng = np.random.RandomState(seed)
+        self.weights = [(rng.randn(m, n) * 0.01).astype(np.float32)
+                        for m, n in ((784, 7 * 7 * 64), (7 * 7 * 64, 1024),
+                                     (1024, 10))]
+
+    def __call__(self, images):
+        logits = images
+        for weights in self.weights[:-1]:
+            logits = np.maximum(logits.dot(weights), 0)
+        logits = logits.dot(self.weights[-1])
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return exp / exp.sum(axis=1, keepdims=True)
+
+
+def percentile(latencies, p):
+    return latencies[min(len(latencies) - 1, int(len(latencies) * p / 100.0))]
+
+
+def ndarray(images):
+    f = io.BytesIO()
+    np.save(f, images)
+    return f.getvalue()
+
+
+def start_server(batcher):
+    """:return: the server of `batcher`, serving on a free local port"""
+    server = microbatch.make_server(batcher, '127.0.0.1', 0)
+    serving = threading.Thread(target=server.serve_forever)
+    serving.daemon = True
+    serving.start()
+    return server
+
+
+def stop_server(server, batcher):
+    server.shutdown()
+    server.server_close()
+    batcher.close()
+
+
+def post(port, payload):
+    """:return: the status and the body of the response to `payload`"""
+    connection = HTTPConnection('127.0.0.1', port)
+    try:
+        connection.request('POST', '/invocations', payload, HEADERS)
+        response = connection.getresponse()
+        return response.status, response.read()
+    finally:
+        connection.close()
+
+
+def check(predict_fn, pixels):
+    """
+    Raises unless the server answers the probabilities `predict_fn` returns
+    for `pixels` scaled to [0, 1], and a request without images with a 400
+    """
+    batcher = microbatch.MicroBatcher(predict_fn, 1, 0)
+    server = start_server(batcher)
+    try:
+        port = server.server_address[1]
+        status, body = post(port, ndarray(pixels))
+        empty_status, _ = post(port, ndarray(pixels[:0]))
+    finally:
+        stop_server(server, batcher)
+    if status != 200:
+        raise RuntimeError('status %d: %s' % (status, body))
+    expected = predict_fn(pixels.reshape((-1, 784)).astype(np.float32) / 255)
+    served = json.loads(body.decode('utf-8'))
+    if not np.allclose(served, expected[0], rtol=1e-5, atol=1e-7):
+        raise RuntimeError('served %s, the model returns %s' % (
+            served, expected[0].tolist()))
+    if empty_status != 400:
+        raise RuntimeError('status %d for no images' % empty_status)
+
+
+def client(port, payload, requests, latencies):
+    connection = HTTPConnection('127.0.0.1', port)
+    try:
+        for _ in range(requests):
+            start = time.time()
+            connection.request('POST', '/invocations', payload, HEADERS)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                raise RuntimeError('status %d' % response.status)
+            latencies.append(time.time() - start)
+    finally:
+        connection.close()
+
+
+def run(predict_fn, payload, max_batch_size, max_wait, args):
+    batcher = microbatch.MicroBatcher(predict_fn, max_batch_size, max_wait)
+    server = start_server(batcher)
+    port = server.server_address[1]
+    try:
+        latencies = []
+        clients = [threading.Thread(target=client, args=(
+            port, payload, args.requests, latencies))
+            for _ in range(args.clients)]
+        start = time.time()
+        for thread in clients:
+            thread.start()
+        for thread in clients:
+            thread.join()
+        elapsed = time.time() - start
+    finally:
+        stop_server(server, batcher)
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "requests_per_s": len(latencies) / elapsed,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "mean_batch_size": batcher.mean_batch_size()
+    }
+
+
+def main(args):
+    if args.export_dir:
+        predict_fn = microbatch.saved_model_predict_fn(args.export_dir)
+    else:
+        predict_fn = LocalModel(args.seed)
+    rng = np.random.RandomState(args.seed)
+    pixels = rng.randint(0, 256, (1, 28, 28)).astype(np.uint8)
+    check(predict_fn, pixels)
+    payload = ndarray(pixels)
+
+    max_wait = args.max_wait_ms / 1000.
+    result = {
+        "clients": args.clients,
+        "unbatched": run(predict_fn, payload, 1, 0, args)
+    }
+    for max_batch_size in args.max_batch_sizes:
+        result['max_batch_size_%d' % max_batch_size] = run(
+            predict_fn, payload, max_batch_size, max_wait, args)
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the micro-batching of the MNIST serving path',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--clients', default=32, type=int,
+                        help="Concurrent clients.")
+    parser.add_argument('--requests', default=100, type=int,
+                        help="Requests per client.")
+    parser.add_argument('--max-batch-sizes', dest='max_batch_sizes',
+                        default=[8, 32, 64], type=int, nargs='+',
+                        help="Most images of a batch to compare.")
+    parser.add_argument('--max-wait-ms', dest='max_wait_ms', default=5.,
+                        type=float, help="Most milliseconds a batch waits.")
+    parser.add_argument('--export-dir', dest='export_dir',
+                        help="SavedModel to serve instead of a NumPy model.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+
+    main(parser.parse_args())
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Benchmark of `mnist.neo_preprocess` and `mnist.neo_postprocess`, in images
+per second.
+
+For each of the `--batch-sizes`, pre and post-processes `--images` random
+PNG images, without a model, random logits standing in for its output:
+
+- `single`: one request per image, the only way before batching
+- `multipart`: one multipart/form-data request per batch, decoded by the
+  decode threads
+- `ndarray`: one request per batch of already decoded images in the NumPy
+  format
+
+To learn more about the command line type: `python bench_neo.py --help`
+"""
+
+from __future__ import print_function
+import io
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import PIL.Image
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+import mnist
+
+BOUNDARY = 'neo-benchmark-boundary'
+
+
+def encode_png(pixels):
+    f = io.BytesIO()
+    PIL.Image.fromarray(pixels).save(f, 'PNG')
+    return f.getvalue()
+
+
+def multipart(images):
+    body = b''
+    for image in images:
+        body += (b'--' + BOUNDARY.encode('ascii') + b'\r\n'
+                 b'Content-Type: image/png\r\n\r\n' + image + b'\r\n')
+    return body + b'--' + BOUNDARY.encode('ascii') + b'--\r\n'
+
+
+def ndarray(pixels):
+    f = io.BytesIO()
+    np.save(f, pixels)
+    return f.getvalue()
+
+
+def requests(mode, images, pixels, batch_size):
+    """:return: the `(payload, content_type)` of every request"""
+    if mode == 'single':
+        return [(image, 'application/x-image') for image in images]
+    batches = range(0, len(images), batch_size)
+    if mode == 'multipart':
+        content_type = 'multipart/form-data; boundary=' + BOUNDARY
+        return [(multipart(images[b:b + batch_size]), content_type)
+                for b in batches]
+    return [(ndarray(pixels[b:b + batch_size]), 'application/x-npy')
+            for b in batches]
+
+
+def run(mode, images, pixels, batch_size, rng):
+    payloads = requests(mode, images, pixels, batch_size)
+    start = time.time()
+    for payload, content_type in payloads:
+        batch = mnist.neo_preprocess(payload, content_type)
+        mnist.neo_postprocess(rng.randn(len(batch), 10).astype(np.float32))
+    elapsed = time.time() - start
+    return {
+        "images_per_s": len(images) / elapsed,
+        "requests": len(payloads)
+    }
+
+
+def main(args):
+    rng = np.random.RandomState(args.seed)
+    pixels = rng.randint(0, 256, (args.images, 28, 28)).astype(np.uint8)
+    images = [encode_png(p) for p in pixels]
+
+    result = {
+        "images": args.images,
+        "single": run('single', images, pixels, 1, rng)
+    }
+    for batch_size in args.batch_sizes:
+        result[str(batch_size)] = dict(
+            (mode, run(mode, images, pixels, batch_size, rng))
+            for mode in ('multipart', 'ndarray'))
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Neo pre and post-processing of mnist.py',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--images', default=4096, type=int,
+                        help="Number of images processed per run.")
+    parser.add_argument('--batch-sizes', dest='batch_sizes',
+                        default=[1, 2, 4, 8, 16, 32, 64, 128, 256], type=int,
+                        nargs='+', help="Batch sizes to compare.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+
+    main(parser.parse_args())
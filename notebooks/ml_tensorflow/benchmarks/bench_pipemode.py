@@ -0,0 +1,166 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2019 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Benchmark of the input pipeline of `pipemode.py`, in records per second.
+
+SageMaker's Pipe mode streams a channel through a FIFO. This writes
+`--records` random records of `--dimension` float64 values, then, for each
+pipeline, feeds them through a local FIFO from a writer thread and reads
+every batch with `pipemode._input_fn` and its `pipe_dir` hyperparameter.
+No model runs. The pipelines are the hard-coded one `pipemode.py` used to
+have, with `map_and_batch` over `parse_single_example`, and the batch
+parsing one, autotuned, with float64 and float32 data.
+
+To learn more about the command line type: `python bench_pipemode.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+import tensorflow as tf
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+import pipemode
+
+
+def legacy_input_fn(channel, params):
+    """`pipemode._input_fn` before it was configurable, for comparison"""
+    from tensorflow.contrib.data import map_and_batch
+
+    features = {
+        'data': tf.FixedLenFeature([], tf.string),
+        'labels': tf.FixedLenFeature([], tf.int64),
+    }
+
+    def parse(record):
+        parsed = tf.parse_single_example(record, features)
+        return ({
+            'data': tf.decode_raw(parsed['data'], tf.float64)
+        }, parsed['labels'])
+
+    ds = tf.data.TFRecordDataset(os.path.join(params['pipe_dir'], channel))
+    ds = ds.prefetch(10)
+    ds = ds.apply(map_and_batch(parse, batch_size=64, num_parallel_batches=2))
+    return ds
+
+
+def write_records(filename, records, dimension, seed):
+    rng = np.random.RandomState(seed)
+    writer = tf.python_io.TFRecordWriter(filename)
+    try:
+        for index in range(records):
+            example = tf.train.Example(features=tf.train.Features(feature={
+                'data': tf.train.Feature(bytes_list=tf.train.BytesList(
+                    value=[rng.rand(dimension).tostring()])),
+                'labels': tf.train.Feature(int64_list=tf.train.Int64List(
+                    value=[index % 2]))
+            }))
+            writer.write(example.SerializeToString())
+    finally:
+        writer.close()
+
+
+def feed(filename, fifo):
+    # blocks until the pipeline opens the FIFO, as Pipe mode does
+    with open(filename, 'rb') as src, open(fifo, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1 << 20)
+
+
+def run(input_fn, filename, params):
+    pipe_dir = tempfile.mkdtemp()
+    fifo = os.path.join(pipe_dir, 'train')
+    os.mkfifo(fifo)
+    writer = threading.Thread(target=feed, args=(filename, fifo))
+    # doesn't block the exit if the pipeline fails before opening the FIFO
+    writer.daemon = True
+    writer.start()
+    try:
+        with tf.Graph().as_default():
+            dataset = input_fn('train', dict(params, pipe_dir=pipe_dir))
+            features, labels = dataset.make_one_shot_iterator().get_next()
+            with tf.Session() as session:
+                records = 0
+                start = time.time()
+                try:
+                    while True:
+                        records += len(session.run([features['data'],
+                                                    labels])[1])
+                except tf.errors.OutOfRangeError:
+                    pass
+                elapsed = time.time() - start
+                dtype = features['data'].dtype.name
+        writer.join()
+    finally:
+        shutil.rmtree(pipe_dir)
+    return {
+        "records": records,
+        "records_per_s": records / elapsed,
+        "mb_per_s": records * params['dimension'] * 8 / elapsed / 1e6,
+        "dtype": dtype
+    }
+
+
+def main(args):
+    directory = tempfile.mkdtemp()
+    try:
+        filename = os.path.join(directory, 'train.tfrecords')
+        write_records(filename, args.records, args.dimension, args.seed)
+
+        params = {'dimension': args.dimension, 'batch_size': args.batch_size}
+        result = {
+            "records": args.records,
+            "dimension": args.dimension,
+            "legacy": run(legacy_input_fn, filename, params),
+            "float64": run(pipemode._input_fn, filename, params),
+            "float32": run(pipemode._input_fn, filename,
+                           dict(params, float32=True))
+        }
+    finally:
+        shutil.rmtree(directory)
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the Pipe mode input pipeline of pipemode.py',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--records', default=50000, type=int,
+                        help="Number of records.")
+    parser.add_argument('--dimension', default=pipemode.DIMENSION, type=int,
+                        help="float64 values per record.")
+    parser.add_argument('--batch-size', dest='batch_size',
+                        default=pipemode.BATCH_SIZE, type=int,
+                        help="Records per batch of the new pipeline.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+
+    main(parser.parse_args())
@@ -0,0 +1,270 @@
+"""
+Micro-batching of the inference requests of the MNIST model.
+
+Concurrent requests are queued by a `MicroBatcher` and run through the model
+together, in batches of at most `max_batch_size` images, waiting at most
+`max_wait` seconds for a batch to fill up. Each batch is one inference, and
+its rows are sent back to the requests they came from.
+
+`serve` puts a batcher behind an HTTP server with the `/ping` and
+`/invocations` routes of a SageMaker container. Requests are parsed by
+`mnist.neo_preprocess`, so a request can itself hold several images.
+
+    python microbatch.py --export-dir <SavedModel> --max-batch-size 64
+"""
+
+from __future__ import print_function
+import argparse
+import json
+import logging
+import threading
+import time
+
+try:
+    from queue import Queue, Empty
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:
+    from Queue import Queue, Empty
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+import numpy as np
+
+import mnist
+
+MAX_BATCH_SIZE = 64
+MAX_WAIT = 0.005
+
+
+class _Request(object):
+    def __init__(self, inputs):
+        self.inputs = inputs
+        self.outputs = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class MicroBatcher(object):
+    """
+    Runs `predict_fn` on batches of the inputs of concurrent `predict` calls.
+
+    :param predict_fn: a function of an array of inputs, the first axis being
+        the batch, to an array of as many outputs
+    :param max_batch_size: the most inputs of a batch. A single request with
+        more inputs is run alone.
+    :param max_wait: the most seconds the first request of a batch waits for
+        others
+    """
+
+    def __init__(self, predict_fn, max_batch_size=MAX_BATCH_SIZE,
+                 max_wait=MAX_WAIT):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.queue = Queue()
+        self.batches = 0
+        self.inputs = 0
+        # a request which didn't fit in the last batch, first of the next
+        self._pending = None
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def predict(self, inputs, timeout=None):
+        """:return: the outputs of `inputs`, once their batch ran"""
+        request = _Request(inputs)
+        self.queue.put(request)
+        if not request.done.wait(timeout):
+            raise RuntimeError('Inference timed out')
+        if request.error is not None:
+            raise request.error
+        return request.outputs
+
+    def close(self):
+        """Runs the queued requests and stops the batching thread"""
+        self.queue.put(None)
+        self._thread.join()
+
+    def mean_batch_size(self):
+        return self.inputs / float(self.batches) if self.batches else 0.
+
+    def _next_batch(self):
+        """:return: the requests of the next batch, empty once closed"""
+        first = self._pending
+        self._pending = None
+        if first is None:
+            first = self.queue.get()
+            if first is None:
+                return []
+        batch = [first]
+        size = len(first.inputs)
+        deadline = time.time() + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                request = self.queue.get(timeout=remaining)
+            except Empty:
+                break
+            if request is None:
+                # run what is queued, then stop
+                self.queue.put(None)
+                break
+            if size + len(request.inputs) > self.max_batch_size:
+                self._pending = request
+                break
+            batch.append(request)
+            size += len(request.inputs)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            self._run_batch(batch)
+
+    def _run_batch(self, batch):
+        try:
+            if len(batch) == 1:
+                inputs = batch[0].inputs
+            else:
+                inputs = np.concatenate([r.inputs for r in batch])
+            outputs = self.predict_fn(inputs)
+            if len(outputs) != len(inputs):
+                # slicing would silently hand requests the wrong rows
+                raise RuntimeError(
+                    'Inference returned {0} outputs for {1} inputs'.format(
+                        len(outputs), len(inputs)))
+            self.batches += 1
+            self.inputs += len(inputs)
+            begin = 0
+            for request in batch:
+                end = begin + len(request.inputs)
+                request.outputs = outputs[begin:end]
+                begin = end
+        except Exception as e:
+            logging.exception('Inference of a batch of %d requests failed',
+                              len(batch))
+            for request in batch:
+                request.error = e
+        for request in batch:
+            request.done.set()
+
+
+def postprocess(probabilities):
+    """
+    :return: the JSON response of the probabilities of a request, a list of
+        10 probabilities for a single image, as `mnist.neo_postprocess`
+    """
+    probabilities = np.asarray(probabilities)
+    if len(probabilities) == 1:
+        probabilities = probabilities[0]
+    return json.dumps(probabilities.tolist()), 'application/json'
+
+
+def saved_model_predict_fn(export_dir):
+    """
+    :return: a function of a batch of images of shape (batch, 784) to their
+        probabilities, running the model exported by the estimator
+    """
+    import tensorflow as tf
+
+    predictor = tf.contrib.predictor.from_saved_model(
+        export_dir, signature_def_key=mnist.SIGNATURE_NAME)
+
+    def predict(images):
+        return predictor({mnist.INPUT_TENSOR_NAME: images})['probabilities']
+    return predict
+
+
+class _ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # the connections of concurrent clients, 5 by default
+    request_queue_size = 128
+
+
+def make_server(batcher, host='', port=8080, preprocess=mnist.neo_preprocess,
+                postprocess=postprocess):
+    """
+    :return: an HTTP server of the batcher, each request being handled by its
+        own thread
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        # keeps the connections of the clients open
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            if self.path == '/ping':
+                self._respond(200, b'', 'text/plain')
+            else:
+                self._respond(404, b'', 'text/plain')
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            if self.path != '/invocations':
+                return self._respond(404, b'', 'text/plain')
+            try:
+                inputs = preprocess(body, self.headers.get('Content-Type', ''))
+            except Exception as e:
+                # e.g. an image PIL can't identify, or a malformed array
+                return self._respond(400, str(e).encode('utf-8'), 'text/plain')
+            if len(inputs) == 0:
+                # the model has no output to answer it with
+                return self._respond(400, b'The request has no images',
+                                     'text/plain')
+            try:
+                outputs = batcher.predict(inputs)
+            except Exception as e:
+                return self._respond(500, str(e).encode('utf-8'), 'text/plain')
+            response_body, content_type = postprocess(outputs)
+            self._respond(200, response_body.encode('utf-8'), content_type)
+
+        def _respond(self, status, body, content_type):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            logging.debug(format, *args)
+
+    return _ThreadingHTTPServer((host, port), Handler)
+
+
+def serve(predict_fn, host='', port=8080, max_batch_size=MAX_BATCH_SIZE,
+          max_wait=MAX_WAIT):
+    batcher = MicroBatcher(predict_fn, max_batch_size, max_wait)
+    server = make_server(batcher, host, port)
+    logging.info('Serving on %s:%d, batches of at most %d in %.1f ms',
+                 host, port, max_batch_size, max_wait * 1000)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        batcher.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve the MNIST model with micro-batching',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--export-dir', dest='export_dir', required=True,
+                        help="SavedModel exported by the estimator.")
+    parser.add_argument('--host', default='', help="Address to listen on.")
+    parser.add_argument('--port', default=8080, type=int,
+                        help="Port to listen on.")
+    parser.add_argument('--max-batch-size', dest='max_batch_size',
+                        default=MAX_BATCH_SIZE, type=int,
+                        help="Most images of a batch.")
+    parser.add_argument('--max-wait-ms', dest='max_wait_ms', default=5.,
+                        type=float, help="Most milliseconds a batch waits.")
+
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    serve(saved_model_predict_fn(args.export_dir), args.host, args.port,
+          args.max_batch_size, args.max_wait_ms / 1000.)
@@ -1,4 +1,5 @@
 import os
+import multiprocessing
 import tensorflow as tf
 from tensorflow.python.estimator.model_fn import ModeKeys as Modes
 
@@ -7,6 +8,16 @@ SIGNATURE_NAME = 'predictions'
 
 LEARNING_RATE = 0.001
 
+BATCH_SIZE = 100
+# batches prepared ahead of the model when tf.data can't autotune
+PREFETCH_BATCHES = 2
+READ_BUFFER_SIZE = 8 * 1024 * 1024
+
+FEATURES = {
+    'image_raw': tf.FixedLenFeature([], tf.string),
+    'label': tf.FixedLenFeature([], tf.int64),
+}
+
 
 def model_fn(features, labels, mode, params):
     # Input Layer
@@ -86,12 +97,7 @@ def read_and_decode(filename_queue):
     reader = tf.TFRecordReader()
     _, serialized_example = reader.read(filename_queue)
 
-    features = tf.parse_single_example(
-        serialized_example,
-        features={
-            'image_raw': tf.FixedLenFeature([], tf.string),
-            'label': tf.FixedLenFeature([], tf.int64),
-        })
+    features = tf.parse_single_example(serialized_example, features=FEATURES)
 
     image = tf.decode_raw(features['image_raw'], tf.uint8)
     image.set_shape([784])
@@ -101,17 +107,63 @@ def read_and_decode(filename_queue):
     return image, label
 
 
-def train_input_fn(training_dir, params):
-    return _input_fn(training_dir, 'train.tfrecords', batch_size=100)
+def decode_batch(serialized_examples):
+    """Parses and decodes a batch of serialized examples at once."""
+    features = tf.parse_example(serialized_examples, features=FEATURES)
 
+    images = tf.decode_raw(features['image_raw'], tf.uint8)
+    images = tf.reshape(images, [-1, 784])
+    images = tf.cast(images, tf.float32) * (1. / 255)
+    labels = tf.cast(features['label'], tf.int32)
 
-def eval_input_fn(training_dir, params):
-    return _input_fn(training_dir, 'test.tfrecords', batch_size=100)
+    return {INPUT_TENSOR_NAME: images}, labels
 
 
-def _input_fn(training_dir, training_filename, batch_size=100):
-    test_file = os.path.join(training_dir, training_filename)
-    filename_queue = tf.train.string_input_producer([test_file])
+def train_input_fn(training_dir, params):
+    return _input_fn(training_dir, 'train', params)
+
+
+def eval_input_fn(training_dir, params):
+    return _input_fn(training_dir, 'test', params)
+
+
+def tfrecord_filenames(training_dir, name):
+    """
+    :return: `<name>.tfrecords` in `training_dir`, or its shards written by
+        `tf_scripts.convert_to`, `<name>-*-of-*.tfrecords`
+    """
+    filenames = tf.gfile.Glob(os.path.join(training_dir, name + '.tfrecords'))
+    if not filenames:
+        filenames = sorted(tf.gfile.Glob(
+            os.path.join(training_dir, name + '-*-of-*.tfrecords')))
+    if not filenames:
+        raise ValueError('No %s.tfrecords in %s' % (name, training_dir))
+    return filenames
+
+
+def _input_fn(training_dir, name, params=None):
+    """
+    The input of the estimator, configured by the hyperparameters:
+
+    - `batch_size`: examples per batch, default 100
+    - `input_pipeline`: `dataset`, the default, or `queue` for the queue
+      runners of older versions of this script
+    - `cache`: caches the decoded batches of the first epoch in memory when
+      true, or in files of this prefix when a string
+    - `compression`: None, `GZIP` or `ZLIB`, as passed to `convert_to`
+    """
+    params = params or {}
+    batch_size = params.get('batch_size', BATCH_SIZE)
+    filenames = tfrecord_filenames(training_dir, name)
+    if params.get('input_pipeline', 'dataset') == 'queue':
+        return _queue_input_fn(filenames, batch_size)
+    return _dataset_input_fn(filenames, batch_size,
+                             cache=params.get('cache', False),
+                             compression=params.get('compression'))
+
+
+def _queue_input_fn(filenames, batch_size=BATCH_SIZE):
+    filename_queue = tf.train.string_input_producer(filenames)
 
     image, label = read_and_decode(filename_queue)
     images, labels = tf.train.batch(
@@ -120,40 +172,161 @@ def _input_fn(training_dir, training_filename, batch_size=100):
 
     return {INPUT_TENSOR_NAME: images}, labels
 
+
+def _data_module():
+    """`tf.data.experimental`, or `tf.contrib.data` before TensorFlow 1.12"""
+    experimental = getattr(tf.data, 'experimental', None)
+    return experimental if experimental is not None else tf.contrib.data
+
+
+def _dataset_input_fn(filenames, batch_size=BATCH_SIZE, cache=False,
+                      compression=None):
+    """
+    Reads the shards in parallel, batches the serialized examples and then
+    parses each batch with a single `parse_example`, repeating forever like
+    `tf.train.string_input_producer`.
+    """
+    data = _data_module()
+    autotune = getattr(data, 'AUTOTUNE', None)
+    cycle_length = min(len(filenames), multiprocessing.cpu_count())
+
+    def read(filename):
+        return tf.data.TFRecordDataset(filename,
+                                       compression_type=compression,
+                                       buffer_size=READ_BUFFER_SIZE)
+
+    dataset = tf.data.Dataset.from_tensor_slices(filenames)
+    dataset = dataset.apply(data.parallel_interleave(
+        read, cycle_length=cycle_length, sloppy=True))
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(
+        decode_batch,
+        num_parallel_calls=autotune or multiprocessing.cpu_count())
+    if cache:
+        dataset = dataset.cache('' if cache is True else cache)
+    dataset = dataset.repeat()
+    return dataset.prefetch(autotune or PREFETCH_BATCHES)
+
+
+# content types of a batch of images, or of an array of images
+MULTIPART_CONTENT_TYPE = 'multipart/form-data'
+NDARRAY_CONTENT_TYPES = ('application/vnd+python.numpy+binary',
+                         'application/x-npy')
+# the shape of an image as the model takes it
+INPUT_SHAPE = (784,)
+
+_decode_pool = None
+
+
+def _get_decode_pool():
+    """The threads decoding images, created on the first batch and reused"""
+    global _decode_pool
+    if _decode_pool is None:
+        from multiprocessing import cpu_count
+        from multiprocessing.pool import ThreadPool
+        _decode_pool = ThreadPool(int(os.environ.get('NEO_DECODE_THREADS',
+                                                     cpu_count())))
+    return _decode_pool
+
+
+def _split_multipart(payload, content_type):
+    """Returns the bodies of the parts of a multipart payload"""
+    import re
+
+    match = re.search(r'boundary="?([^";]+)"?', content_type)
+    if match is None:
+        raise RuntimeError('Multipart content type must have a boundary')
+    delimiter = b'--' + match.group(1).encode('ascii')
+
+    bodies = []
+    # skip the preamble, and stop at the closing delimiter
+    for part in payload.split(delimiter)[1:]:
+        if part.startswith(b'--'):
+            break
+        _, _, body = part.partition(b'\r\n\r\n')
+        if body.endswith(b'\r\n'):
+            body = body[:-2]
+        bodies.append(body)
+    return bodies
+
+
+def _decode_images(images):
+    """
+    Decodes encoded images in the decode threads, each one straight into
+    its slot of a single contiguous float32 array of shape
+    (batch,) + INPUT_SHAPE, scaled to [0, 1] as in training.
+    """
+    import io
+    import numpy as np
+    import PIL.Image   # Training container doesn't have this package
+
+    batch = np.empty((len(images),) + INPUT_SHAPE, dtype=np.float32)
+
+    def decode(index):
+        # Load image and convert to greyscale space, then resize
+        image = PIL.Image.open(io.BytesIO(images[index])).convert('L')
+        batch[index] = np.asarray(image.resize((28, 28))).reshape(INPUT_SHAPE)
+        batch[index] *= 1. / 255
+
+    if len(images) == 1:
+        decode(0)
+    else:
+        _get_decode_pool().map(decode, range(len(images)))
+    return batch
+
+
 def neo_preprocess(payload, content_type):
+    """
+    Returns a float32 array of shape (batch, 784) from an image
+    (application/x-image), a multipart/form-data payload of images, or an
+    array of images in the NumPy format, of shape (batch, 28, 28) or
+    (batch, 784). Every image is scaled from pixel values of 0 to 255 to
+    [0, 1], as in training.
+    """
     import logging
     import numpy as np
-    import PIL.Image   # Training container doesn't have this package
     import io
 
     logging.info('Invoking user-defined pre-processing function')
 
-    if content_type != 'application/x-image':
-        raise RuntimeError('Content type must be application/x-image')
-    
-    f = io.BytesIO(payload)
-    # Load image and convert to greyscale space
-    image = PIL.Image.open(f).convert('L')
-    # Resize
-    image = np.asarray(image.resize((28, 28)))
-    # Reshape
-    image = image.reshape((1,-1)).astype('float32')
-
-    return image
+    if content_type == 'application/x-image':
+        return _decode_images([payload])
+    if content_type.startswith(MULTIPART_CONTENT_TYPE):
+        return _decode_images(_split_multipart(payload, content_type))
+    if content_type in NDARRAY_CONTENT_TYPES:
+        try:
+            # a pickled payload would run code of the request when loaded
+            images = np.load(io.BytesIO(payload), allow_pickle=False)
+            batch = np.array(images.reshape((-1,) + INPUT_SHAPE),
+                             dtype=np.float32)
+            batch *= 1. / 255
+            return batch
+        except (ValueError, EOFError) as e:
+            raise RuntimeError('Invalid NumPy array: %s' % e)
+    raise RuntimeError('Content type must be application/x-image, %s or '
+                       'one of %s' % (MULTIPART_CONTENT_TYPE,
+                                      ', '.join(NDARRAY_CONTENT_TYPES)))
 
 ### NOTE: this function cannot use MXNet
 def neo_postprocess(result):
+    """
+    Returns the probabilities of a batch of logits: a list of 10
+    probabilities for a batch of one image, a list of them otherwise.
+    """
     import logging
     import numpy as np
     import json
 
     logging.info('Invoking user-defined post-processing function')
-    
-    # Softmax (assumes batch size 1)
-    result = np.squeeze(result)
-    result_exp = np.exp(result - np.max(result))
-    result = result_exp / np.sum(result_exp)
 
+    # Softmax over the classes of every image of the batch
+    result = np.asarray(result, dtype=np.float32)
+    result = result.reshape((-1, result.shape[-1]))
+    result_exp = np.exp(result - np.max(result, axis=1, keepdims=True))
+    result = result_exp / np.sum(result_exp, axis=1, keepdims=True)
+
+    if len(result) == 1:
+        result = result[0]
     response_body = json.dumps(result.tolist())
     content_type = 'application/json'
 
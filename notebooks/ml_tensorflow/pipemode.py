@@ -1,46 +1,87 @@
-import numpy as np
+import multiprocessing
 import os
 import tensorflow as tf
-from sagemaker_tensorflow import PipeModeDataset
 
-from tensorflow.contrib.data import map_and_batch
-
-PREFETCH_SIZE = 10
+# defaults of the hyperparameters of the same name, in lower case
 BATCH_SIZE = 64
-NUM_PARALLEL_BATCHES = 2
 DIMENSION = 1024
 EPOCHS = 1
+# batches prepared ahead of the model when tf.data can't autotune
+PREFETCH_BATCHES = 2
 
 def estimator_fn(run_config, params):
-    column = tf.feature_column.numeric_column('data', shape=(DIMENSION, ))
+    dimension = (params or {}).get('dimension', DIMENSION)
+    column = tf.feature_column.numeric_column('data', shape=(dimension, ))
     return tf.estimator.LinearClassifier(feature_columns=[column], config=run_config)
 
 def train_input_fn(training_dir, params):
     """Returns input function that would feed the model during training"""
-    return _input_fn('train')
+    return _input_fn('train', params)
 
 def eval_input_fn(training_dir, params):
     """Returns input function that would feed the model during evaluation"""
-    return _input_fn('eval')
+    return _input_fn('eval', params)
+
+def _data_module():
+    """`tf.data.experimental`, or `tf.contrib.data` before TensorFlow 1.12"""
+    experimental = getattr(tf.data, 'experimental', None)
+    return experimental if experimental is not None else tf.contrib.data
+
+def _records(channel, params):
+    """
+    Returns the serialized records of a channel: a `PipeModeDataset` on
+    SageMaker, or, when the `pipe_dir` hyperparameter is set, the TFRecord
+    file or FIFO `<pipe_dir>/<channel>`, to run locally without Pipe mode.
+    """
+    if params.get('pipe_dir'):
+        return tf.data.TFRecordDataset(
+            os.path.join(params['pipe_dir'], channel))
+    # only the SageMaker containers have this package
+    from sagemaker_tensorflow import PipeModeDataset
+    return PipeModeDataset(channel)
+
+def _input_fn(channel, params=None):
+    """Returns a Dataset for reading from a SageMaker PipeMode channel.
+
+    The records are batched first and each batch is parsed by a single
+    `parse_example`. The hyperparameters configure the pipeline:
+
+    - `batch_size`: records per batch, default 64
+    - `dimension`: values of the `data` feature, default 1024
+    - `epochs`: default 1
+    - `float32`: when true, the float64 `data` is cast to float32, halving
+      the bytes moved to the model
+    - `num_parallel_calls` and `prefetch`: the parallel parses and the
+      batches prefetched, autotuned by default
+    - `pipe_dir`: see `_records`
+    """
+    params = params or {}
+    batch_size = params.get('batch_size', BATCH_SIZE)
+    dimension = params.get('dimension', DIMENSION)
+    epochs = params.get('epochs', EPOCHS)
+    autotune = getattr(_data_module(), 'AUTOTUNE', None)
+    num_parallel_calls = params.get(
+        'num_parallel_calls', autotune or multiprocessing.cpu_count())
+    prefetch = params.get('prefetch', autotune or PREFETCH_BATCHES)
 
-def _input_fn(channel):
-    """Returns a Dataset for reading from a SageMaker PipeMode channel."""
     features = {
         'data': tf.FixedLenFeature([], tf.string),
         'labels': tf.FixedLenFeature([], tf.int64),
     }
 
-    def parse(record):
-        parsed = tf.parse_single_example(record, features)
-        return ({
-            'data': tf.decode_raw(parsed['data'], tf.float64)
-        }, parsed['labels'])
+    def parse(records):
+        parsed = tf.parse_example(records, features)
+        data = tf.reshape(tf.decode_raw(parsed['data'], tf.float64),
+                          [-1, dimension])
+        if params.get('float32'):
+            data = tf.cast(data, tf.float32)
+        return {'data': data}, parsed['labels']
 
-    ds = PipeModeDataset(channel)
-    if EPOCHS > 1:
-        ds = ds.repeat(EPOCHS)
-    ds = ds.prefetch(PREFETCH_SIZE)
-    ds = ds.apply(map_and_batch(parse, batch_size=BATCH_SIZE,
-                                num_parallel_batches=NUM_PARALLEL_BATCHES))
+    ds = _records(channel, params)
+    if epochs > 1:
+        ds = ds.repeat(epochs)
+    ds = ds.batch(batch_size)
+    ds = ds.map(parse, num_parallel_calls=num_parallel_calls)
+    ds = ds.prefetch(prefetch)
 
-    return ds
\ No newline at end of file
+    return ds
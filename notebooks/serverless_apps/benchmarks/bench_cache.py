@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Benchmark of the read-through cache of the todos `get` handler.
+
+Sends `--requests` requests for `--todos` todos, picked with a Zipf-like
+skew so that a few todos are hot, to `--containers` simulated Lambda
+containers in turn. Each container has its own in-process LRU. A
+`--writes` fraction of the requests are updates, which invalidate the
+todo in the container that handles them and in the shared tier.
+
+Three configurations are compared:
+
+- `no_cache`: every get reads DynamoDB
+- `local`: the per-container LRU only
+- `local_remote`: the LRU and a shared tier. By default the shared tier is
+  a dict standing in for Redis, with `--remote-latency-ms` of simulated
+  network latency. Pass `--redis-url` to use a real Redis.
+
+For each one the benchmark reports the hit rate, the p50/p99 latency of the
+get handler and the stale reads: gets that returned an older version of a
+todo than the last update. Stale reads come from the LRUs of the other
+containers, and their age is bounded by `--ttl`.
+
+Runs against DynamoDB Local when `--endpoint-url` is given, for example
+`--endpoint-url http://localhost:8000`, and otherwise against an in-process
+moto mock.
+
+To learn more about the command line type: `python bench_cache.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+from bench_list import setup_backend, create_table
+
+
+class DictRemote(object):
+    """A Redis stand-in, with simulated network latency"""
+
+    def __init__(self, ttl, latency):
+        self.ttl = ttl
+        self.latency = latency
+        self.entries = dict()
+        self.generations = dict()
+
+    def get(self, key):
+        time.sleep(self.latency)
+        value, expires = self.entries.get(key, (None, 0))
+        return value if expires > time.time() else None
+
+    def generation(self, key):
+        time.sleep(self.latency)
+        return self.generations.get(key, 0)
+
+    def set(self, key, value, generation=None):
+        time.sleep(self.latency)
+        if generation is None or self.generations.get(key, 0) == generation:
+            self.entries[key] = (value, time.time() + self.ttl)
+
+    def delete(self, key):
+        time.sleep(self.latency)
+        self.entries.pop(key, None)
+        self.generations[key] = self.generations.get(key, 0) + 1
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def make_requests(args):
+    rng = random.Random(args.seed)
+    # Zipf-like weights, the todo of rank r is requested about 1/r as often
+    weights = [1.0 / (rank + 1) for rank in range(args.todos)]
+    total = sum(weights)
+    cumulative, acc = [], 0.0
+    for w in weights:
+        acc += w / total
+        cumulative.append(acc)
+
+    def pick():
+        x = rng.random()
+        lo, hi = 0, len(cumulative) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if cumulative[mid] < x:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    return [(pick(), rng.random() < args.writes, rng.randrange(args.containers))
+            for _ in range(args.requests)]
+
+
+def run(args, todos, requests, containers):
+    from todos import cache, get, update
+
+    versions = dict((t['id'], t['version']) for t in todos)
+    latencies, stale = [], 0
+    start = time.time()
+    for index, write, container in requests:
+        todo_id = todos[index]['id']
+        # each container has its own cache, `None` disables it
+        cache._cache = containers[container] if containers else False
+        if write:
+            response = update.update({
+                'pathParameters': {'id': todo_id},
+                'queryStringParameters': {'returnValues': 'UPDATED_NEW'},
+                'body': json.dumps({'text': 'updated', 'checked': False})},
+                None)
+            versions[todo_id] = json.loads(response['body'])['version']
+            continue
+        t = time.time()
+        response = get.get({'pathParameters': {'id': todo_id}}, None)
+        latencies.append(time.time() - t)
+        if json.loads(response['body'])['version'] < versions[todo_id]:
+            stale += 1
+    elapsed = time.time() - start
+
+    result = {
+        "gets": len(latencies),
+        "requests_per_s": len(requests) / elapsed,
+        "latency_p50_ms": percentile(latencies, 50) * 1000,
+        "latency_p99_ms": percentile(latencies, 99) * 1000,
+        "stale_reads": stale
+    }
+    if containers:
+        hits = requests_seen = 0
+        for c in containers:
+            snapshot = c.metrics.snapshot()
+            hits += snapshot.get('local_hits', 0) + \
+                snapshot.get('remote_hits', 0)
+            requests_seen += snapshot['requests']
+        result['hit_rate'] = hits / float(requests_seen)
+    return result
+
+
+def main(args):
+    mock = setup_backend(args)
+    import boto3
+    from todos import cache, create
+
+    create_table(boto3.resource('dynamodb'), args.table)
+    todos = [json.loads(create.create(
+        {'body': json.dumps({'text': 'todo {0}'.format(i)})}, None)['body'])
+        for i in range(args.todos)]
+    requests = make_requests(args)
+
+    def containers(remote):
+        return [cache.ItemCache(cache.LRUCache(args.max_items, args.ttl),
+                                remote, metrics_interval=float('inf'))
+                for _ in range(args.containers)]
+
+    if args.redis_url:
+        remote = cache.RedisCache(args.redis_url, args.ttl)
+    else:
+        remote = DictRemote(args.ttl, args.remote_latency_ms / 1000.0)
+
+    result = {
+        "todos": args.todos,
+        "requests": args.requests,
+        "containers": args.containers,
+        "no_cache": run(args, todos, requests, None),
+        "local": run(args, todos, requests, containers(None)),
+        "local_remote": run(
+            args, todos, requests, containers(remote))
+    }
+    print(json.dumps(result, indent=2, sort_keys=True))
+    if mock is not None:
+        mock.stop()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the todos get cache',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--todos', default=1000, type=int,
+                        help="Number of todos.")
+    parser.add_argument('--requests', default=20000, type=int,
+                        help="Number of requests.")
+    parser.add_argument('--writes', default=0.02, type=float,
+                        help="Fraction of the requests that are updates.")
+    parser.add_argument('--containers', default=4, type=int,
+                        help="Number of simulated Lambda containers.")
+    parser.add_argument('--ttl', default=5.0, type=float,
+                        help="Seconds a cache entry lives.")
+    parser.add_argument('--max-items', dest='max_items', default=1024,
+                        type=int, help="Entries of each container's LRU.")
+    parser.add_argument('--remote-latency-ms', dest='remote_latency_ms',
+                        default=0.5, type=float,
+                        help="Simulated latency of the Redis stand-in.")
+    parser.add_argument('--redis-url', dest='redis_url',
+                        help="Redis of the shared tier, a stand-in is used "
+                             "if not given.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+    parser.add_argument('--table', default='serverless-todo-bench',
+                        help="Name of the benchmark table.")
+    parser.add_argument('--endpoint-url', dest='endpoint_url',
+                        help="DynamoDB Local endpoint, moto is used if not "
+                             "given.")
+
+    main(parser.parse_args())
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Contention load test of the todos `update` handler.
+
+`--writers` concurrent writers each make `--updates` read-modify-write
+updates of one of `--todos` shared todos: they append a token of their own to
+the todo's text. In `conditional` mode each update sends the `version` it
+read and, on a 409, retries with the current todo returned in the response.
+In `unconditional` mode the last writer wins, as the handler did before
+versioning. The test reports the update throughput, latency, conflicts and
+the lost updates: tokens of successful updates missing from the final texts.
+It also reports the response size of each `returnValues` option.
+
+Runs against DynamoDB Local when `--endpoint-url` is given, for example
+`--endpoint-url http://localhost:8000`, and otherwise against an in-process
+moto mock. moto doesn't evaluate conditions atomically, so only DynamoDB
+Local or DynamoDB itself guarantee no lost updates in conditional mode.
+
+To learn more about the command line type: `python bench_contention.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from multiprocessing.pool import ThreadPool
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+from bench_list import setup_backend, create_table
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def create_todos(create, count):
+    return [json.loads(create.create(
+        {'body': json.dumps({'text': ''})}, None)['body'])
+        for _ in range(count)]
+
+
+def run(args, mode, todos):
+    from todos import get, update
+
+    stats = {"latencies": [], "conflicts": 0, "failed": 0, "tokens": []}
+    lock = threading.Lock()
+
+    def writer(w):
+        rng = random.Random(w)
+        latencies, conflicts, failed, tokens = [], 0, 0, []
+        for u in range(args.updates):
+            todo_id = rng.choice(todos)['id']
+            token = 'w{0}u{1};'.format(w, u)
+            current = json.loads(get.get(
+                {'pathParameters': {'id': todo_id}}, None)['body'])
+            for attempt in range(args.max_retries + 1):
+                body = {'text': current['text'] + token, 'checked': False}
+                if mode == 'conditional':
+                    body['version'] = current['version']
+                start = time.time()
+                response = update.update({
+                    'pathParameters': {'id': todo_id},
+                    'queryStringParameters': {'returnValues': 'NONE'},
+                    'body': json.dumps(body)}, None)
+                latencies.append(time.time() - start)
+                if response['statusCode'] != 409:
+                    tokens.append((todo_id, token))
+                    break
+                conflicts += 1
+                current = json.loads(response['body'])['item']
+            else:
+                failed += 1
+        with lock:
+            stats['latencies'].extend(latencies)
+            stats['conflicts'] += conflicts
+            stats['failed'] += failed
+            stats['tokens'].extend(tokens)
+
+    start = time.time()
+    pool = ThreadPool(args.writers)
+    try:
+        pool.map(writer, range(args.writers))
+    finally:
+        pool.close()
+    elapsed = time.time() - start
+
+    texts = dict(
+        (t['id'], json.loads(get.get(
+            {'pathParameters': {'id': t['id']}}, None)['body'])['text'])
+        for t in todos)
+    lost = sum(1 for todo_id, token in stats['tokens']
+               if token not in texts[todo_id])
+    return {
+        "updates": len(stats['tokens']),
+        "calls": len(stats['latencies']),
+        "updates_per_s": len(stats['tokens']) / elapsed,
+        "conflicts": stats['conflicts'],
+        "gave_up": stats['failed'],
+        "lost_updates": lost,
+        "latency_p50_s": percentile(stats['latencies'], 50),
+        "latency_p99_s": percentile(stats['latencies'], 99)
+    }
+
+
+def response_sizes(todo):
+    from todos import update
+
+    sizes = dict()
+    for return_values in ('ALL_NEW', 'UPDATED_NEW', 'NONE'):
+        response = update.update({
+            'pathParameters': {'id': todo['id']},
+            'queryStringParameters': {'returnValues': return_values},
+            'body': json.dumps({'text': 'x' * 200, 'checked': False})},
+            None)
+        sizes[return_values] = len(response.get('body', ''))
+    return sizes
+
+
+def main(args):
+    mock = setup_backend(args)
+    import boto3
+    from todos import create
+
+    create_table(boto3.resource('dynamodb'), args.table)
+    result = {"writers": args.writers, "todos": args.todos}
+    for mode in args.modes:
+        result[mode] = run(args, mode, create_todos(create, args.todos))
+    result['response_bytes'] = response_sizes(create_todos(create, 1)[0])
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    if mock is not None:
+        mock.stop()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Contention load test of the todos update handler',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--writers', default=32, type=int,
+                        help="Number of concurrent writers.")
+    parser.add_argument('--todos', default=4, type=int,
+                        help="Number of todos the writers share.")
+    parser.add_argument('--updates', default=20, type=int,
+                        help="Number of updates per writer.")
+    parser.add_argument('--max-retries', dest='max_retries', default=50,
+                        type=int, help="Retries of a conflicting update.")
+    parser.add_argument('--modes', default=['conditional', 'unconditional'],
+                        nargs='+', choices=['conditional', 'unconditional'],
+                        help="Update modes to test.")
+    parser.add_argument('--table', default='serverless-todo-bench',
+                        help="Name of the benchmark table.")
+    parser.add_argument('--endpoint-url', dest='endpoint_url',
+                        help="DynamoDB Local endpoint, moto is used if not "
+                             "given.")
+
+    main(parser.parse_args())
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Benchmark of the todos `list` handler and the parallel scan export.
+
+Runs against DynamoDB Local when `--endpoint-url` is given, for example
+`--endpoint-url http://localhost:8000`, and otherwise against an in-process
+moto mock. The table is loaded with `--items` todos, then the benchmark
+compares a single `scan` call, paging through the `list` handler with its
+cursor, and parallel scans with an increasing number of segments.
+
+moto (`pip install "moto[dynamodb]"`) serves every request in this process, so
+parallel scans only speed up against DynamoDB Local or DynamoDB itself.
+
+To learn more about the command line type: `python bench_list.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+
+def setup_backend(args):
+    os.environ['DYNAMODB_TABLE'] = args.table
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+    if args.endpoint_url:
+        os.environ['AWS_ENDPOINT_URL_DYNAMODB'] = args.endpoint_url
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'local')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'local')
+        return None
+    from moto import mock_aws
+    mock = mock_aws()
+    mock.start()
+    return mock
+
+
+def create_table(dynamodb, name):
+    try:
+        dynamodb.Table(name).delete()
+        dynamodb.Table(name).wait_until_not_exists()
+    except Exception:
+        pass
+    table = dynamodb.create_table(
+        TableName=name,
+        AttributeDefinitions=[{'AttributeName': 'id', 'AttributeType': 'S'}],
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        BillingMode='PAY_PER_REQUEST')
+    table.wait_until_exists()
+    return table
+
+
+def load_items(table, count):
+    now = int(time.time() * 1000)
+    start = time.time()
+    with table.batch_writer() as batch:
+        for i in range(count):
+            batch.put_item(Item={
+                'id': str(uuid.uuid1()),
+                'text': 'todo number {0} with some descriptive text'.format(i),
+                'checked': i % 3 == 0,
+                'createdAt': now - i,
+                'updatedAt': now - i
+            })
+    return time.time() - start
+
+
+def page_through(list_handler, limit, fields=None):
+    params = {'limit': str(limit)}
+    if fields:
+        params['fields'] = fields
+    pages = items = size = 0
+    start = time.time()
+    while True:
+        response = list_handler({'queryStringParameters': params}, None)
+        body = json.loads(response['body'])
+        pages += 1
+        items += len(body['items'])
+        size += len(response['body'])
+        if not body['cursor']:
+            break
+        params['cursor'] = body['cursor']
+    elapsed = time.time() - start
+    return {
+        "pages": pages,
+        "items": items,
+        "body_bytes": size,
+        "elapsed_s": elapsed,
+        "items_per_s": items / elapsed
+    }
+
+
+def main(args):
+    mock = setup_backend(args)
+    import boto3
+    from todos import list as todos_list
+
+    table = create_table(boto3.resource('dynamodb'), args.table)
+    result = {"items": args.items, "load_s": load_items(table, args.items)}
+
+    start = time.time()
+    single = table.scan()
+    result['single_scan'] = {
+        "items": len(single['Items']),
+        "truncated": 'LastEvaluatedKey' in single,
+        "elapsed_s": time.time() - start
+    }
+    result['list_pages'] = page_through(todos_list.list, args.limit)
+    result['list_pages_projected'] = page_through(
+        todos_list.list, args.limit, fields='id,checked')
+
+    result['parallel_scan'] = dict()
+    for segments in args.segments:
+        start = time.time()
+        count = todos_list.parallel_scan(
+            args.table, total_segments=segments,
+            on_segment=lambda segment, pages: sum(len(p) for p in pages))
+        elapsed = time.time() - start
+        result['parallel_scan'][segments] = {
+            "items": count,
+            "elapsed_s": elapsed,
+            "items_per_s": count / elapsed
+        }
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    if mock is not None:
+        mock.stop()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the todos list handler and parallel scans',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--items', default=100000, type=int,
+                        help="Number of todos to load, e.g. 1000000.")
+    parser.add_argument('--limit', default=1000, type=int,
+                        help="Page size of the list handler.")
+    parser.add_argument('--segments', default=[1, 4, 8, 16], type=int,
+                        nargs='+', help="Parallel scan segment counts.")
+    parser.add_argument('--table', default='serverless-todo-bench',
+                        help="Name of the benchmark table.")
+    parser.add_argument('--endpoint-url', dest='endpoint_url',
+                        help="DynamoDB Local endpoint, moto is used if not "
+                             "given.")
+
+    main(parser.parse_args())
@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Benchmark of the todos index queries against the scans they replace.
+
+Runs against DynamoDB Local when `--endpoint-url` is given, for example
+`--endpoint-url http://localhost:8000`, and otherwise against an in-process
+moto mock. The table and its indexes are loaded with `--items` todos, of which
+`--unchecked` are unchecked and whose `updatedAt` spread over `--days` days.
+Then, on the same data, the benchmark reads:
+
+- the unchecked todos with a scan filtered on `checked` and sorted in memory,
+  and with a query of the sparse `unchecked-index`
+- the todos updated in the last `--since-days` days with a scan filtered on
+  `updatedAt`, and with the `updated` handler's queries of `updated-index`
+
+and reports the latency and consumed read capacity units of each. moto
+doesn't account capacity, so the RCUs are only meaningful with DynamoDB Local
+or DynamoDB itself.
+
+To learn more about the command line type: `python bench_query.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+from bench_list import setup_backend
+
+
+def create_table(dynamodb, name):
+    try:
+        dynamodb.Table(name).delete()
+        dynamodb.Table(name).wait_until_not_exists()
+    except Exception:
+        pass
+    table = dynamodb.create_table(
+        TableName=name,
+        AttributeDefinitions=[
+            {'AttributeName': 'id', 'AttributeType': 'S'},
+            {'AttributeName': 'unchecked', 'AttributeType': 'N'},
+            {'AttributeName': 'createdAt', 'AttributeType': 'N'},
+            {'AttributeName': 'updatedDay', 'AttributeType': 'S'},
+            {'AttributeName': 'updatedAt', 'AttributeType': 'N'}
+        ],
+        KeySchema=[{'AttributeName': 'id', 'KeyType': 'HASH'}],
+        GlobalSecondaryIndexes=[{
+            'IndexName': 'unchecked-index',
+            'KeySchema': [
+                {'AttributeName': 'unchecked', 'KeyType': 'HASH'},
+                {'AttributeName': 'createdAt', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }, {
+            'IndexName': 'updated-index',
+            'KeySchema': [
+                {'AttributeName': 'updatedDay', 'KeyType': 'HASH'},
+                {'AttributeName': 'updatedAt', 'KeyType': 'RANGE'}
+            ],
+            'Projection': {'ProjectionType': 'ALL'}
+        }],
+        BillingMode='PAY_PER_REQUEST')
+    table.wait_until_exists()
+    return table
+
+
+def load_items(table, args, now):
+    from todos import indexes
+
+    start = time.time()
+    with table.batch_writer() as batch:
+        for i in range(args.items):
+            updated_at = now - random.randrange(args.days * indexes.DAY_MS)
+            checked = random.random() >= args.unchecked
+            item = {
+                'id': str(uuid.uuid1()),
+                'text': 'todo number {0} with some descriptive text'.format(i),
+                'checked': checked,
+                'createdAt': updated_at - random.randrange(indexes.DAY_MS),
+                'updatedAt': updated_at
+            }
+            item.update(indexes.index_attributes(checked, updated_at))
+            batch.put_item(Item=item)
+    return time.time() - start
+
+
+def read_all(read, **kwargs):
+    """
+    Call `read` until the last page.
+
+    :return: the items and the consumed capacity units
+    """
+    items, units = [], 0.0
+    kwargs['ReturnConsumedCapacity'] = 'TOTAL'
+    while True:
+        result = read(**kwargs)
+        items.extend(result['Items'])
+        units += float(result.get('ConsumedCapacity', {}).get(
+            'CapacityUnits', 0))
+        if 'LastEvaluatedKey' not in result:
+            return items, units
+        kwargs['ExclusiveStartKey'] = result['LastEvaluatedKey']
+
+
+def timed(func, repeat):
+    """:return: the median elapsed seconds and the result of `func`"""
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2], result
+
+
+def compare(scan, query, repeat):
+    scan_s, (scan_items, scan_units) = timed(scan, repeat)
+    query_s, (query_items, query_units) = timed(query, repeat)
+    return {
+        "scan": {"items": len(scan_items), "elapsed_s": scan_s,
+                 "rcu": scan_units},
+        "query": {"items": len(query_items), "elapsed_s": query_s,
+                  "rcu": query_units},
+        "speedup": scan_s / query_s,
+        "same_items": set(i['id'] for i in scan_items) ==
+        set(i['id'] for i in query_items)
+    }
+
+
+def main(args):
+    random.seed(args.seed)
+    mock = setup_backend(args)
+    import boto3
+    from boto3.dynamodb.conditions import Attr, Key
+    from todos import indexes, runtime, query as todos_query
+
+    now = int(time.time() * 1000)
+    table = create_table(boto3.resource('dynamodb'), args.table)
+    result = {"items": args.items, "load_s": load_items(table, args, now)}
+
+    def scan_unchecked():
+        items, units = read_all(
+            table.scan, FilterExpression=Attr('checked').eq(False))
+        items.sort(key=lambda i: i['createdAt'])
+        return items, units
+
+    result['unchecked'] = compare(
+        scan_unchecked,
+        lambda: read_all(
+            table.query, IndexName=indexes.UNCHECKED_INDEX,
+            KeyConditionExpression=Key('unchecked').eq(indexes.UNCHECKED)),
+        args.repeat)
+
+    since = now - args.since_days * indexes.DAY_MS
+
+    def query_updated():
+        # count the consumed capacity of each of the handler's queries
+        client = runtime.client()
+        units = [0.0]
+
+        class CapacityClient(object):
+            def query(self, **kwargs):
+                r = client.query(ReturnConsumedCapacity='TOTAL', **kwargs)
+                units[0] += float(r.get('ConsumedCapacity', {}).get(
+                    'CapacityUnits', 0))
+                return r
+
+        runtime._clients['dynamodb'] = CapacityClient()
+        items = []
+        params = {'since': str(since), 'limit': str(args.limit)}
+        try:
+            while True:
+                body = json.loads(todos_query.updated(
+                    {'queryStringParameters': params}, None)['body'])
+                items.extend(body['items'])
+                if not body['cursor']:
+                    return items, units[0]
+                params['cursor'] = body['cursor']
+        finally:
+            runtime._clients['dynamodb'] = client
+
+    result['updated_since'] = compare(
+        lambda: read_all(
+            table.scan, FilterExpression=Attr('updatedAt').gte(since)),
+        query_updated, args.repeat)
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    if mock is not None:
+        mock.stop()
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the todos index queries against scans',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--items', default=100000, type=int,
+                        help="Number of todos to load.")
+    parser.add_argument('--unchecked', default=0.05, type=float,
+                        help="Fraction of unchecked todos.")
+    parser.add_argument('--days', default=90, type=int,
+                        help="Number of days the updatedAt spread over.")
+    parser.add_argument('--since-days', dest='since_days', default=2,
+                        type=int, help="Age of the updated since query.")
+    parser.add_argument('--limit', default=1000, type=int,
+                        help="Page size of the updated handler.")
+    parser.add_argument('--repeat', default=3, type=int,
+                        help="Runs of each read, the median is reported.")
+    parser.add_argument('--seed', default=7, type=int,
+                        help="Random seed.")
+    parser.add_argument('--table', default='serverless-todo-bench',
+                        help="Name of the benchmark table.")
+    parser.add_argument('--endpoint-url', dest='endpoint_url',
+                        help="DynamoDB Local endpoint, moto is used if not "
+                             "given.")
+
+    main(parser.parse_args())
@@ -0,0 +1,202 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Import-time and cold-start benchmark of the todos handlers.
+
+Each handler runs in a fresh Python process, like a new Lambda container,
+which reports:
+
+- `import_s`: importing the handler's module
+- `boto3_import_s`: importing boto3, done by the first invocation
+- `client_init_s`: building the shared low-level client, done by the first
+  invocation
+- `first_invoke_s`: the first invocation, with a client already built
+- `invoke_p50_s` and `invoke_p99_s`: the following `--invokes` invocations
+
+A `baseline` process measures the `boto3.resource('dynamodb')` and
+`Table(...)` the handlers used to build at import, and the cost of a
+`get_item` through them, for comparison with the low-level client.
+
+Runs against DynamoDB Local when `--endpoint-url` is given, for example
+`--endpoint-url http://localhost:8000`, and otherwise against an in-process
+moto mock.
+
+To learn more about the command line type: `python bench_runtime.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import argparse
+import importlib
+import subprocess
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+HANDLERS = (
+    'create.create', 'get.get', 'update.update', 'delete.delete',
+    'list.list', 'query.unchecked', 'query.updated', 'batch.create'
+)
+
+
+def make_event(handler, todo_id, now):
+    if handler == 'create.create':
+        return {'body': json.dumps({'text': 'a new todo'})}
+    if handler in ('get.get', 'delete.delete'):
+        return {'pathParameters': {'id': todo_id}}
+    if handler == 'update.update':
+        return {'pathParameters': {'id': todo_id},
+                'body': json.dumps({'text': 'updated', 'checked': False})}
+    if handler == 'query.updated':
+        return {'queryStringParameters': {
+            'since': str(now - 60 * 60 * 1000), 'limit': '100'}}
+    if handler == 'batch.create':
+        return {'body': json.dumps([{'text': 'todo {0}'.format(i)}
+                                    for i in range(25)])}
+    return {'queryStringParameters': {'limit': '100'}}
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def setup_child(args, now):
+    """Start the backend and load the table after the timed imports"""
+    from bench_list import setup_backend
+    from bench_query import create_table, load_items
+
+    setup_backend(args)
+    import boto3
+    # a session of its own, so the clients built later start from scratch
+    table = create_table(
+        boto3.session.Session().resource('dynamodb'), args.table)
+    load = argparse.Namespace(items=args.items, unchecked=0.05, days=2)
+    load_items(table, load, now)
+    table.put_item(Item={'id': 'bench-todo', 'text': 'bench', 'checked': False,
+                         'createdAt': now, 'updatedAt': now})
+    return table
+
+
+def run_baseline(args, now):
+    start = time.time()
+    import boto3
+    result = {"boto3_import_s": time.time() - start}
+    setup_child(args, now)
+    start = time.time()
+    table = boto3.session.Session().resource('dynamodb').Table(args.table)
+    result['resource_init_s'] = time.time() - start
+    start = time.time()
+    client = boto3.session.Session().client('dynamodb')
+    result['client_init_s'] = time.time() - start
+
+    def timed(func):
+        times = []
+        for _ in range(args.invokes):
+            start = time.time()
+            func()
+            times.append(time.time() - start)
+        return percentile(times, 50), percentile(times, 99)
+
+    from todos import runtime
+    result['resource_get_p50_s'], result['resource_get_p99_s'] = timed(
+        lambda: table.get_item(Key={'id': 'bench-todo'})['Item'])
+    result['client_get_p50_s'], result['client_get_p99_s'] = timed(
+        lambda: runtime.deserialize(client.get_item(
+            TableName=args.table,
+            Key={'id': {'S': 'bench-todo'}})['Item']))
+    return result
+
+
+def run_child(args):
+    now = int(time.time() * 1000)
+    if args.child == 'baseline':
+        return run_baseline(args, now)
+
+    module_name, func_name = args.child.split('.')
+    start = time.time()
+    module = importlib.import_module('todos.' + module_name)
+    result = {"import_s": time.time() - start}
+    start = time.time()
+    import boto3  # noqa, what the first invocation imports
+    result['boto3_import_s'] = time.time() - start
+
+    setup_child(args, now)
+    from todos import runtime
+    # a moto mock only applies to clients built after it started
+    runtime._clients.clear()
+    start = time.time()
+    runtime.client()
+    result['client_init_s'] = time.time() - start
+
+    handler = getattr(module, func_name)
+    event = make_event(args.child, 'bench-todo', now)
+    start = time.time()
+    response = handler(event, None)
+    result['first_invoke_s'] = time.time() - start
+    result['status'] = response['statusCode']
+    times = []
+    for _ in range(args.invokes):
+        start = time.time()
+        handler(event, None)
+        times.append(time.time() - start)
+    result['invoke_p50_s'] = percentile(times, 50)
+    result['invoke_p99_s'] = percentile(times, 99)
+    return result
+
+
+def main(args):
+    result = dict()
+    for child in ('baseline',) + HANDLERS:
+        command = [sys.executable, os.path.realpath(__file__),
+                   '--child', child, '--items', str(args.items),
+                   '--invokes', str(args.invokes), '--table', args.table]
+        if args.endpoint_url:
+            command += ['--endpoint-url', args.endpoint_url]
+        output = subprocess.check_output(command, cwd=dir_path)
+        result[child] = json.loads(output.decode('utf-8').splitlines()[-1])
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the cold start of the todos handlers',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--items', default=1000, type=int,
+                        help="Number of todos to load.")
+    parser.add_argument('--invokes', default=100, type=int,
+                        help="Number of warm invocations per handler.")
+    parser.add_argument('--table', default='serverless-todo-bench',
+                        help="Name of the benchmark table.")
+    parser.add_argument('--endpoint-url', dest='endpoint_url',
+                        help="DynamoDB Local endpoint, moto is used if not "
+                             "given.")
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(run_child(args), sort_keys=True))
+    else:
+        main(args)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+
+"""
+Throughput benchmark of the JSON serialization of `list` responses.
+
+Builds a low-level `scan` response of `--items` todos, each with integer and
+fractional numbers, and serializes it:
+
+- `type_deserializer`: boto3's `TypeDeserializer` then `DecimalEncoder`, what
+  the handlers did with `boto3.resource`
+- `truncating_encoder`: `runtime.deserialize` then the `int` truncating
+  `DecimalEncoder` the handlers used before
+- `decimal_encoder`: `runtime.deserialize` then the fixed `DecimalEncoder`
+- `serializer_json`: `serializer.plain_items` then the standard `json`
+- `serializer_orjson`: `serializer.plain_items` then orjson, if installed
+- `list_handler`: the whole `list` handler, with a client that returns the
+  canned response
+
+Speedups are relative to `type_deserializer`, and each result says whether
+fractional numbers survived. No DynamoDB is needed.
+
+To learn more about the command line type: `python bench_serializer.py --help`
+"""
+
+from __future__ import print_function
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+sys.path.insert(0, os.path.join(dir_path, '..'))
+
+from boto3.dynamodb.types import TypeDeserializer
+
+from todos import decimalencoder, runtime, serializer
+from todos import list as todos_list
+
+
+def make_items(count):
+    now = 1500000000000
+    return [{
+        'id': {'S': str(uuid.uuid1())},
+        'text': {'S': 'todo number {0} with some descriptive text'.format(i)},
+        'checked': {'BOOL': i % 3 == 0},
+        'createdAt': {'N': str(now - i)},
+        'updatedAt': {'N': str(now - i)},
+        'priority': {'N': '{0}.25'.format(i % 5)},
+        'tags': {'L': [{'S': 'home'}, {'N': str(i)}]}
+    } for i in range(count)]
+
+
+class CannedClient(object):
+    def __init__(self, items):
+        self.items = items
+
+    def scan(self, **kwargs):
+        return {'Items': self.items}
+
+
+def timed(func, repeat):
+    """:return: the median elapsed seconds and the result of `func`"""
+    times = []
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        times.append(time.time() - start)
+    return sorted(times)[len(times) // 2], result
+
+
+def main(args):
+    items = make_items(args.items)
+    deserializer = TypeDeserializer()
+
+    def type_deserializer():
+        return json.dumps(
+            [dict((k, deserializer.deserialize(v)) for k, v in i.items())
+             for i in items], cls=decimalencoder.DecimalEncoder)
+
+    def truncating_encoder():
+        # DecimalEncoder before it converted fractions to floats
+        class Truncating(json.JSONEncoder):
+            def default(self, obj):
+                return int(obj)
+        return json.dumps([runtime.deserialize(i) for i in items],
+                          cls=Truncating)
+
+    candidates = {
+        "type_deserializer": type_deserializer,
+        "truncating_encoder": truncating_encoder,
+        "decimal_encoder": lambda: json.dumps(
+            [runtime.deserialize(i) for i in items],
+            cls=decimalencoder.DecimalEncoder),
+        "serializer_json": lambda: json.dumps(
+            serializer.plain_items(items))
+    }
+    if serializer.orjson is not None:
+        candidates['serializer_orjson'] = lambda: serializer.orjson.dumps(
+            serializer.plain_items(items)).decode('utf-8')
+
+    runtime._clients['dynamodb'] = CannedClient(items)
+    os.environ.setdefault('DYNAMODB_TABLE', 'serverless-todo-bench')
+    candidates['list_handler'] = lambda: json.loads(todos_list.list(
+        {'queryStringParameters': {'limit': str(args.items)}},
+        None)['body'])['items']
+
+    result = {"items": args.items, "backend": serializer.BACKEND}
+    for name in sorted(candidates):
+        elapsed, output = timed(candidates[name], args.repeat)
+        if not isinstance(output, list):
+            output = json.loads(output)
+        result[name] = {
+            "elapsed_s": elapsed,
+            "items_per_s": args.items / elapsed,
+            "fractions_kept": output[1]['priority'] == 1.25
+        }
+    for name in candidates:
+        result[name]['speedup'] = \
+            result['type_deserializer']['elapsed_s'] / \
+            result[name]['elapsed_s']
+
+    print(json.dumps(result, indent=2, sort_keys=True))
+    return result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the JSON serialization of list responses',
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument('--items', default=10000, type=int,
+                        help="Number of todos per response.")
+    parser.add_argument('--repeat', default=5, type=int,
+                        help="Runs of each serializer, the median is "
+                             "reported.")
+
+    main(parser.parse_args())
@@ -0,0 +1,353 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Batch versions of the create, update and delete todo endpoints.
+
+Each endpoint takes a JSON array of todos, or `{"items": [...]}`, and answers
+with one result per item, in request order. Creates and deletes are written
+with `BatchWriteItem` in chunks of 25, retrying `UnprocessedItems` with
+exponential backoff. Updates, which `BatchWriteItem` can't express, are
+conditional `UpdateItem` calls made a few at a time, so an update never creates
+a missing todo. With `?atomic=true` the whole batch (up to 100 todos) is one
+conditional `TransactWriteItems` call instead: either every item is written, or
+none is and the response is a 409 with the reason of each failed item.
+"""
+
+import json
+import time
+import uuid
+import random
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+
+from todos import cache, indexes, runtime
+
+BATCH_WRITE_LIMIT = 25
+TRANSACT_LIMIT = 100
+MAX_ITEMS = 1000
+MAX_ATTEMPTS = 8
+BASE_DELAY = 0.05
+MAX_DELAY = 2.0
+UPDATE_CONCURRENCY = 8
+
+
+def _backoff(attempt):
+    # full jitter, so concurrent writers don't retry in lockstep
+    time.sleep(random.uniform(0, min(MAX_DELAY, BASE_DELAY * 2 ** attempt)))
+
+
+def _parse(event):
+    """
+    :return: the list of items of a batch request and whether it is atomic
+    :raise ValueError: when the request is not a valid batch
+    """
+    try:
+        data = json.loads(event['body'])
+    except (TypeError, ValueError):
+        raise ValueError("body must be a JSON array of todos")
+    if isinstance(data, dict):
+        data = data.get('items')
+    if not isinstance(data, list) or not data:
+        raise ValueError("body must be a non-empty JSON array of todos")
+    if len(data) > MAX_ITEMS:
+        raise ValueError("at most {0} todos per request".format(MAX_ITEMS))
+    params = event.get('queryStringParameters') or {}
+    atomic = str(params.get('atomic', 'false')).lower() == 'true'
+    if atomic and len(data) > TRANSACT_LIMIT:
+        raise ValueError("at most {0} todos per atomic request".format(
+            TRANSACT_LIMIT))
+    return data, atomic
+
+
+def _response(status, results):
+    failed = sum(1 for r in results if r['status'] != 'ok')
+    return {
+        "statusCode": status,
+        "body": json.dumps({
+            "succeeded": len(results) - failed,
+            "failed": failed,
+            "results": results
+        })
+    }
+
+
+def _invalidate(results):
+    for r in results:
+        if 'id' in r:
+            cache.invalidate(r['id'])
+
+
+def _bad_request(message):
+    return {
+        "statusCode": 400,
+        "body": json.dumps({"message": message})
+    }
+
+
+def _request_id(request):
+    r = request.get('PutRequest') or request.get('DeleteRequest')
+    return (r.get('Item') or r.get('Key'))['id']['S']
+
+
+def batch_write(table_name, requests):
+    """
+    Write `(index, key, request)` write requests with `BatchWriteItem`.
+
+    :return: a dict of `index -> error` for the requests that failed
+    """
+    errors = dict()
+    for start in range(0, len(requests), BATCH_WRITE_LIMIT):
+        chunk = requests[start:start + BATCH_WRITE_LIMIT]
+        by_key = dict((key, index) for index, key, _ in chunk)
+        pending = [request for _, _, request in chunk]
+        attempt = 0
+        while pending:
+            try:
+                result = runtime.client().batch_write_item(
+                    RequestItems={table_name: pending})
+            except ClientError as ce:
+                code = ce.response['Error']['Code']
+                if code in ('ProvisionedThroughputExceededException',
+                            'ThrottlingException') and \
+                        attempt < MAX_ATTEMPTS:
+                    attempt += 1
+                    _backoff(attempt)
+                    continue
+                # the requests written by the earlier attempts succeeded
+                for request in pending:
+                    errors[by_key[_request_id(request)]] = code
+                break
+            pending = result.get('UnprocessedItems', {}).get(table_name, [])
+            if pending:
+                attempt += 1
+                if attempt > MAX_ATTEMPTS:
+                    for request in pending:
+                        errors[by_key[_request_id(request)]] = 'unprocessed'
+                    break
+                _backoff(attempt)
+    return errors
+
+
+def transact_write(actions):
+    """
+    Write `TransactWriteItems` actions as one all-or-nothing transaction.
+
+    :return: `None` on success, otherwise the list of per-action errors
+    """
+    attempt = 0
+    while True:
+        try:
+            runtime.client().transact_write_items(TransactItems=actions)
+            return None
+        except ClientError as ce:
+            code = ce.response['Error']['Code']
+            if code != 'TransactionCanceledException':
+                if code in ('ProvisionedThroughputExceededException',
+                            'ThrottlingException') and \
+                        attempt < MAX_ATTEMPTS:
+                    attempt += 1
+                    _backoff(attempt)
+                    continue
+                return [code] * len(actions)
+            reasons = [r.get('Code', 'None')
+                       for r in ce.response.get('CancellationReasons', [])]
+            if 'TransactionConflict' in reasons and attempt < MAX_ATTEMPTS:
+                attempt += 1
+                _backoff(attempt)
+                continue
+            if len(reasons) != len(actions):
+                return [code] * len(actions)
+            # the actions that didn't fail were cancelled by the others
+            return [reason if reason != 'None' else 'cancelled'
+                    for reason in reasons]
+
+
+def _write(table_name, results, actions, requests, atomic):
+    """
+    Write the valid items and record the outcome in `results`.
+
+    :return: the response status code
+    """
+    if atomic:
+        if any(r['status'] != 'ok' for r in results):
+            # nothing is written when one item of an atomic batch is invalid
+            for r in results:
+                if r['status'] == 'ok':
+                    r['status'] = 'cancelled'
+            return 400
+        errors = transact_write([action for _, action in actions])
+        if errors is None:
+            return 200
+        for (index, _), error in zip(actions, errors):
+            results[index]['status'] = 'cancelled' \
+                if error == 'cancelled' else 'error'
+            if error != 'cancelled':
+                results[index]['error'] = error
+        return 409
+
+    errors = batch_write(table_name, requests)
+    for index, error in errors.items():
+        results[index]['status'] = 'error'
+        results[index]['error'] = error
+    return 200
+
+
+def create(event, context):
+    try:
+        data, atomic = _parse(event)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    table_name = runtime.table_name()
+    timestamp = int(time.time() * 1000)
+    results, actions, requests = [], [], []
+    for index, todo in enumerate(data):
+        if not isinstance(todo, dict) or 'text' not in todo:
+            results.append({"index": index, "status": "error",
+                            "error": "text is required"})
+            continue
+        item = {
+            'id': str(uuid.uuid1()),
+            'text': todo['text'],
+            'checked': False,
+            'createdAt': timestamp,
+            'updatedAt': timestamp,
+            'version': 1,
+        }
+        item.update(indexes.index_attributes(item['checked'], timestamp))
+        results.append({"index": index, "id": item['id'], "status": "ok"})
+        serialized = runtime.serialize(item)
+        requests.append(
+            (index, item['id'], {'PutRequest': {'Item': serialized}}))
+        actions.append((index, {'Put': {
+            'TableName': table_name,
+            'Item': serialized,
+            'ConditionExpression': 'attribute_not_exists(id)'
+        }}))
+
+    status = _write(table_name, results, actions, requests, atomic)
+    return _response(status, results)
+
+
+def update(event, context):
+    try:
+        data, atomic = _parse(event)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    table_name = runtime.table_name()
+    timestamp = int(time.time() * 1000)
+    results, actions = [], []
+    seen = set()
+    for index, todo in enumerate(data):
+        if not isinstance(todo, dict) or \
+                not isinstance(todo.get('id'), runtime.STRING_TYPES) or \
+                'text' not in todo or 'checked' not in todo:
+            results.append({"index": index, "status": "error",
+                            "error": "id, text and checked are required"})
+            continue
+        if todo['id'] in seen:
+            # a transaction can't touch the same key twice
+            results.append({"index": index, "id": todo['id'],
+                            "status": "error", "error": "duplicate id"})
+            continue
+        seen.add(todo['id'])
+        results.append({"index": index, "id": todo['id'], "status": "ok"})
+        set_clause, remove_clause, index_values = indexes.index_update(
+            todo['checked'], timestamp)
+        values = {
+            ':text': todo['text'],
+            ':checked': todo['checked'],
+            ':updatedAt': timestamp,
+            ':zero': 0,
+            ':one': 1
+        }
+        values.update(index_values)
+        actions.append((index, {'Update': {
+            'TableName': table_name,
+            'Key': {'id': runtime.serialize_value(todo['id'])},
+            'ConditionExpression': 'attribute_exists(id)',
+            'ExpressionAttributeNames': {'#todo_text': 'text'},
+            'ExpressionAttributeValues': runtime.serialize(values),
+            'UpdateExpression': 'SET #todo_text = :text, '
+                                'checked = :checked, '
+                                'updatedAt = :updatedAt, '
+                                'version = if_not_exists(version, :zero) '
+                                '+ :one, ' +
+                                set_clause + ' ' + remove_clause
+        }}))
+
+    if atomic:
+        status = _write(table_name, results, actions, None, atomic)
+        _invalidate(results)
+        return _response(status, results)
+
+    # BatchWriteItem can't update, so each update is its own conditional
+    # write, a few at a time
+    def update_one(indexed_action):
+        index, action = indexed_action
+        try:
+            runtime.client().update_item(**action['Update'])
+        except ClientError as ce:
+            code = ce.response['Error']['Code']
+            results[index]['status'] = 'error'
+            results[index]['error'] = 'not_found' \
+                if code == 'ConditionalCheckFailedException' else code
+
+    with ThreadPoolExecutor(UPDATE_CONCURRENCY) as pool:
+        list(pool.map(update_one, actions))
+    _invalidate(results)
+    return _response(200, results)
+
+
+def delete(event, context):
+    try:
+        data, atomic = _parse(event)
+    except ValueError as e:
+        return _bad_request(str(e))
+
+    table_name = runtime.table_name()
+    results, actions, requests = [], [], []
+    seen = set()
+    for index, todo_id in enumerate(data):
+        if isinstance(todo_id, dict):
+            todo_id = todo_id.get('id')
+        if not todo_id or not isinstance(todo_id, runtime.STRING_TYPES):
+            results.append({"index": index, "status": "error",
+                            "error": "id is required"})
+            continue
+        if todo_id in seen:
+            # a BatchWriteItem request can't touch the same key twice
+            results.append({"index": index, "id": todo_id, "status": "error",
+                            "error": "duplicate id"})
+            continue
+        seen.add(todo_id)
+        results.append({"index": index, "id": todo_id, "status": "ok"})
+        key = {'id': runtime.serialize_value(todo_id)}
+        requests.append((index, todo_id, {'DeleteRequest': {'Key': key}}))
+        actions.append((index, {'Delete': {
+            'TableName': table_name,
+            'Key': key,
+            'ConditionExpression': 'attribute_exists(id)'
+        }}))
+
+    status = _write(table_name, results, actions, requests, atomic)
+    _invalidate(results)
+    return _response(status, results)
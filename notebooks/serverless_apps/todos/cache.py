@@ -0,0 +1,360 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Read-through cache of the `get` responses of todos.
+
+Two tiers are looked up in order: an in-process LRU of the warm Lambda
+container, and, when `REDIS_URL` is set, a Redis shared by every container.
+Entries are the JSON bodies of the responses, so a hit costs no DynamoDB
+read and no serialization.
+
+`update` and `delete` invalidate a todo in the local LRU and in Redis. The
+LRUs of other containers can't be reached, so their entries expire after
+`CACHE_TTL` seconds: that is the longest a container serves a stale todo.
+A client that reads a todo's `version` and then updates it conditionally
+gets a 409 whenever the read was stale: with 4 containers, a 5 seconds TTL
+and 2% of updates, `benchmarks/bench_cache.py` counted 416 stale reads in
+1952 gets. The cache is therefore off by default, turn it on only for todos
+read far more often than they change.
+
+Every invalidation of a todo bumps its generation in each tier, and `set`
+is given the generation read before the DynamoDB read: when the todo was
+invalidated in between, the body is older than the write and isn't cached.
+
+Environment variables:
+
+- `CACHE_TTL`: seconds an entry lives, default 0, which disables the cache
+- `CACHE_MAX_ITEMS`: entries of the local LRU, default 1024
+- `REDIS_URL`: the Redis of the shared tier, e.g. `redis://host:6379/0`
+- `CACHE_METRICS_INTERVAL`: seconds between two metrics reports, default 60
+"""
+
+from __future__ import print_function
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+
+log = logging.getLogger('todos.cache')
+
+LOCAL = 'local'
+REMOTE = 'remote'
+# the latencies kept to compute percentiles
+LATENCY_SAMPLES = 1000
+# seconds Redis keeps the generation of an invalidated todo, far longer than
+# a DynamoDB read
+GENERATION_TTL = 300
+
+_cache = None
+_lock = threading.Lock()
+
+
+class LRUCache(object):
+    """A thread safe LRU of at most `max_items` entries of `ttl` seconds"""
+
+    def __init__(self, max_items, ttl, clock=time.time):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        # the generation of the last invalidation of the most recently
+        # invalidated keys, older ones only raise `_floor`
+        self.invalidations = OrderedDict()
+        self._generation = 0
+        self._floor = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires <= self.clock():
+                return None
+            # re-inserting moves the entry to the most recently used end
+            self.entries[key] = entry
+            return value
+
+    def generation(self, key):
+        """:return: the token of `set` for a value read from now on"""
+        with self.lock:
+            return self._generation
+
+    def set(self, key, value, generation=None):
+        """
+        :param generation: when given, the value is only stored if `key`
+            wasn't invalidated since `generation` was taken
+        """
+        with self.lock:
+            if generation is not None and \
+                    self.invalidations.get(key, self._floor) > generation:
+                return
+            self.entries.pop(key, None)
+            self.entries[key] = (value, self.clock() + self.ttl)
+            while len(self.entries) > self.max_items:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+            self._generation += 1
+            self.invalidations.pop(key, None)
+            self.invalidations[key] = self._generation
+            while len(self.invalidations) > self.max_items:
+                # a key forgotten here may have been invalidated as late as
+                # this, so later sets of older generations are refused
+                self._floor = self.invalidations.popitem(last=False)[1]
+
+
+class RedisCache(object):
+    """
+    The shared tier. A Redis error is logged and treated as a miss, the
+    cache never fails a request.
+
+    The generation of a todo is the counter `<prefix>generation:<id>`,
+    incremented by every invalidation, and a guarded `set` compares it and
+    writes in one script, atomically.
+    """
+
+    SET_IF_GENERATION = """
+        if (redis.call('get', KEYS[2]) or '') == ARGV[2] then
+            return redis.call('set', KEYS[1], ARGV[1], 'EX', ARGV[3])
+        end
+        return false
+    """
+
+    def __init__(self, url, ttl, prefix='todos:', timeout=0.05):
+        import redis
+        self.redis = redis.StrictRedis.from_url(
+            url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self.ttl = ttl
+        self.prefix = prefix
+        self._set_if_generation = self.redis.register_script(
+            self.SET_IF_GENERATION)
+
+    def _generation_key(self, key):
+        return self.prefix + 'generation:' + key
+
+    def get(self, key):
+        try:
+            value = self.redis.get(self.prefix + key)
+        except Exception as e:
+            log.warning("[RedisCache.get] error:{0}".format(e))
+            return None
+        return value.decode('utf-8') if value is not None else None
+
+    def generation(self, key):
+        """:return: the generation of `key`, `None` when Redis failed"""
+        try:
+            value = self.redis.get(self._generation_key(key))
+        except Exception as e:
+            log.warning("[RedisCache.generation] error:{0}".format(e))
+            return None
+        return value.decode('utf-8') if value is not None else ''
+
+    def set(self, key, value, generation=None):
+        ex = max(1, int(self.ttl))
+        try:
+            if generation is None:
+                self.redis.set(self.prefix + key, value, ex=ex)
+            else:
+                self._set_if_generation(
+                    keys=[self.prefix + key, self._generation_key(key)],
+                    args=[value, generation, ex])
+        except Exception as e:
+            log.warning("[RedisCache.set] error:{0}".format(e))
+
+    def delete(self, key):
+        try:
+            pipe = self.redis.pipeline()
+            pipe.delete(self.prefix + key)
+            pipe.incr(self._generation_key(key))
+            pipe.expire(self._generation_key(key), GENERATION_TTL)
+            pipe.execute()
+        except Exception as e:
+            log.warning("[RedisCache.delete] error:{0}".format(e))
+
+
+class CacheMetrics(object):
+    """Hits of each tier, misses and the latencies of the last requests"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.hits = {LOCAL: 0, REMOTE: 0}
+        self.misses = 0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def record(self, tier, latency):
+        with self.lock:
+            if tier is None:
+                self.misses += 1
+            else:
+                self.hits[tier] += 1
+            self.latencies.append(latency)
+
+    def snapshot(self):
+        with self.lock:
+            requests = self.misses + sum(self.hits.values())
+            latencies = sorted(self.latencies)
+        if not requests:
+            return {"requests": 0}
+
+        def percentile(p):
+            return latencies[min(len(latencies) - 1,
+                                 int(len(latencies) * p / 100.0))]
+        return {
+            "requests": requests,
+            "hit_rate": sum(self.hits.values()) / float(requests),
+            "local_hits": self.hits[LOCAL],
+            "remote_hits": self.hits[REMOTE],
+            "misses": self.misses,
+            "latency_p50_ms": percentile(50) * 1000,
+            "latency_p99_ms": percentile(99) * 1000
+        }
+
+
+class ItemCache(object):
+    """
+    The tiers of the cache and its metrics.
+
+    :param local: the `LRUCache` of the container
+    :param remote: the optional shared tier, any object with the `get`,
+        `generation`, `set` and `delete` methods of `RedisCache`
+    """
+
+    def __init__(self, local, remote=None, metrics_interval=60):
+        self.local = local
+        self.remote = remote
+        self.metrics = CacheMetrics()
+        self.metrics_interval = metrics_interval
+        self.reported = time.time()
+
+    def get(self, key):
+        """:return: a `(value, tier)` tuple, `(None, None)` on a miss"""
+        value = self.local.get(key)
+        if value is not None:
+            return value, LOCAL
+        if self.remote is not None:
+            value = self.remote.get(key)
+            if value is not None:
+                self.local.set(key, value)
+                return value, REMOTE
+        return None, None
+
+    def generation(self, key):
+        """
+        :return: the token of `set` for a value about to be read from the
+            database, taken before the read
+        """
+        remote = self.remote.generation(key) if self.remote is not None \
+            else None
+        return self.local.generation(key), remote
+
+    def set(self, key, value, generation=None):
+        """
+        :param generation: the `generation` taken before `value` was read.
+            A tier where `key` was invalidated since doesn't store it.
+        """
+        if generation is None:
+            self.local.set(key, value)
+            if self.remote is not None:
+                self.remote.set(key, value)
+            return
+        local, remote = generation
+        self.local.set(key, value, local)
+        # without the generation of Redis, a guarded set isn't possible
+        if self.remote is not None and remote is not None:
+            self.remote.set(key, value, remote)
+
+    def invalidate(self, key):
+        self.local.delete(key)
+        if self.remote is not None:
+            self.remote.delete(key)
+
+    def record(self, tier, latency):
+        """
+        Record a request, and report the metrics when `metrics_interval`
+        seconds passed since the last report.
+        """
+        self.metrics.record(tier, latency)
+        now = time.time()
+        if now - self.reported >= self.metrics_interval:
+            self.reported = now
+            self.report()
+
+    def report(self):
+        """
+        Print the metrics in the CloudWatch embedded metric format, so the
+        Lambda's log becomes the `todos/cache` metrics, and reset them.
+        """
+        metrics = self.metrics.snapshot()
+        self.metrics.reset()
+        if not metrics['requests']:
+            return metrics
+        names = ('hit_rate', 'latency_p50_ms', 'latency_p99_ms', 'requests')
+        print(json.dumps(dict(metrics, _aws={
+            "Timestamp": int(time.time() * 1000),
+            "CloudWatchMetrics": [{
+                "Namespace": "todos/cache",
+                "Dimensions": [[]],
+                "Metrics": [{"Name": n} for n in names]
+            }]
+        })))
+        return metrics
+
+
+def get_cache():
+    """
+    :return: the container's `ItemCache`, built from the environment on first
+        use, or `None` when `CACHE_TTL` is 0
+    """
+    global _cache
+    if _cache is None:
+        with _lock:
+            if _cache is None:
+                ttl = float(os.environ.get('CACHE_TTL', 0))
+                if ttl <= 0:
+                    _cache = False
+                else:
+                    remote = None
+                    if os.environ.get('REDIS_URL'):
+                        remote = RedisCache(os.environ['REDIS_URL'], ttl)
+                    _cache = ItemCache(
+                        LRUCache(int(os.environ.get('CACHE_MAX_ITEMS', 1024)),
+                                 ttl),
+                        remote,
+                        float(os.environ.get('CACHE_METRICS_INTERVAL', 60)))
+    return _cache or None
+
+
+def invalidate(todo_id):
+    """Drop a todo from the cache after a write"""
+    items = get_cache()
+    if items is not None:
+        items.invalidate(todo_id)
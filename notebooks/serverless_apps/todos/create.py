@@ -19,12 +19,10 @@
 
 import json
 import logging
-import os
 import time
 import uuid
-import boto3
 
-dynamodb = boto3.resource('dynamodb')
+from todos import indexes, runtime
 
 
 def create(event, context):
@@ -36,17 +34,18 @@ def create(event, context):
 
     timestamp = int(time.time() * 1000)
 
-    table = dynamodb.Table(os.environ['DYNAMODB_TABLE'])
-
     item = {
         'id': str(uuid.uuid1()),
         'text': data['text'],
         'checked': False,
         'createdAt': timestamp,
         'updatedAt': timestamp,
+        'version': 1,
     }
+    stored = dict(item, **indexes.index_attributes(item['checked'], timestamp))
 
-    table.put_item(Item=item)
+    runtime.client().put_item(
+        TableName=runtime.table_name(), Item=runtime.serialize(stored))
 
     response = {
         "statusCode": 200,
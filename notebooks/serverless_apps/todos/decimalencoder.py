@@ -20,9 +20,16 @@
 import decimal
 import json
 
+from todos import serializer
+
 
 class DecimalEncoder(json.JSONEncoder):
+    """
+    Kept for code that encodes boto3 resource items, which calls `default` for
+    every `Decimal`. The handlers convert items with `todos.serializer`.
+    """
     def default(self, obj):
         if isinstance(obj, decimal.Decimal):
-            return int(obj)
+            # int(obj) would truncate the fraction of non-integral numbers
+            return serializer.number(str(obj))
         return super(DecimalEncoder, self).default(obj)
\ No newline at end of file
@@ -17,20 +17,17 @@
 # SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 #
 
-import os
-
-import boto3
-dynamodb = boto3.resource('dynamodb')
+from todos import cache, runtime
 
 
 def delete(event, context):
-    table = dynamodb.Table(os.environ['DYNAMODB_TABLE'])
-
-    table.delete_item(
+    runtime.client().delete_item(
+        TableName=runtime.table_name(),
         Key={
-            'id': event['pathParameters']['id']
+            'id': {'S': event['pathParameters']['id']}
         }
     )
+    cache.invalidate(event['pathParameters']['id'])
 
     response = {
         "statusCode": 200
@@ -1,25 +1,34 @@
-import os
-import json
-import boto3
+import time
 
-from todos import decimalencoder
-
-dynamodb = boto3.resource('dynamodb')
+from todos import cache, indexes, runtime, serializer
 
 
 def get(event, context):
-    table = dynamodb.Table(os.environ['DYNAMODB_TABLE'])
+    start = time.time()
+    todo_id = event['pathParameters']['id']
+    items = cache.get_cache()
 
-    result = table.get_item(
-        Key={
-            'id': event['pathParameters']['id']
-        }
-    )
+    body, tier = items.get(todo_id) if items is not None else (None, None)
+    if body is None:
+        # taken before the read, so an update during it isn't cached over
+        generation = items.generation(todo_id) if items is not None else None
+        result = runtime.client().get_item(
+            TableName=runtime.table_name(),
+            Key={
+                'id': {'S': todo_id}
+            }
+        )
+        body = serializer.dumps(
+            indexes.strip(serializer.plain_item(result['Item'])))
+        if items is not None:
+            items.set(todo_id, body, generation)
 
     response = {
         "statusCode": 200,
-        "body": json.dumps(result['Item'],
-                           cls=decimalencoder.DecimalEncoder)
+        "headers": {"X-Cache": tier or "miss"},
+        "body": body
     }
 
+    if items is not None:
+        items.record(tier, time.time() - start)
     return response
\ No newline at end of file
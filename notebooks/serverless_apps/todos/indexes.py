@@ -0,0 +1,93 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+The attributes of the todos table's global secondary indexes.
+
+- `unchecked-index` is a sparse index, keyed by `unchecked` and `createdAt`.
+  Only unchecked todos have the `unchecked` attribute, so the index holds
+  nothing else and a query of it reads only unchecked todos.
+- `updated-index` is keyed by `updatedDay`, the UTC day of `updatedAt`, and
+  `updatedAt`. Bucketing by day spreads the writes over many partition keys
+  while "updated since" is a query of each day since then.
+
+Every write of a todo must keep these attributes up to date, see
+`index_attributes` and `index_update`, and no response may return them, see
+`strip`.
+"""
+
+import time
+
+UNCHECKED_INDEX = 'unchecked-index'
+UPDATED_INDEX = 'updated-index'
+# the `unchecked` value of every unchecked todo
+UNCHECKED = 1
+DAY_MS = 24 * 60 * 60 * 1000
+# the attributes only the indexes use, which are not part of a todo
+INDEX_ATTRIBUTES = ('unchecked', 'updatedDay')
+
+
+def updated_day(timestamp):
+    """:return: the `updatedDay` of a millisecond timestamp, as `YYYY-MM-DD`"""
+    return time.strftime('%Y-%m-%d', time.gmtime(timestamp // 1000))
+
+
+def days_since(timestamp, now):
+    """:return: every `updatedDay` from `timestamp` to `now`, oldest first"""
+    first = timestamp - timestamp % DAY_MS
+    return [updated_day(t) for t in range(first, now + 1, DAY_MS)]
+
+
+def index_attributes(checked, timestamp):
+    """
+    :return: the index attributes of a todo written at `timestamp`
+    """
+    attributes = {'updatedDay': updated_day(timestamp)}
+    if not checked:
+        attributes['unchecked'] = UNCHECKED
+    return attributes
+
+
+def strip(item):
+    """:return: the JSON object of a todo, without its index attributes"""
+    for name in INDEX_ATTRIBUTES:
+        item.pop(name, None)
+    return item
+
+
+def strip_items(items):
+    """:return: the JSON objects of todos, without their index attributes"""
+    for item in items:
+        strip(item)
+    return items
+
+
+def index_update(checked, timestamp):
+    """
+    :return: a `(set_clause, remove_clause, values)` tuple to add to the
+        `UpdateExpression` and `ExpressionAttributeValues` of an update that
+        sets `checked` and `updatedAt`
+    """
+    set_clause = 'updatedDay = :updatedDay'
+    values = {':updatedDay': updated_day(timestamp)}
+    if checked:
+        # removing the attribute drops the todo from the sparse index
+        return set_clause, 'REMOVE unchecked', values
+    values[':unchecked'] = UNCHECKED
+    return set_clause + ', unchecked = :unchecked', '', values
@@ -19,21 +19,323 @@
 
 import json
 import os
-import boto3
+import time
+import base64
+import binascii
 
-from todos import decimalencoder
+from todos import indexes, runtime, serializer
 
-dynamodb = boto3.resource('dynamodb')
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+FIELDS = ('id', 'text', 'checked', 'createdAt', 'updatedAt')
+# the S3 minimum size of the parts of a multipart upload, but the last
+PART_SIZE = 5 * 1024 * 1024
+MANIFEST = 'manifest.json'
+
+
+def encode_cursor(last_evaluated_key):
+    if not last_evaluated_key:
+        return None
+    data = json.dumps(last_evaluated_key, sort_keys=True)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor, keys=('id',)):
+    """
+    :param keys: the attributes every cursor must have
+    :return: the low-level `ExclusiveStartKey` encoded in `cursor`
+    :raise ValueError: if the cursor is not a valid cursor
+    """
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (TypeError, ValueError, binascii.Error):
+        raise ValueError("invalid cursor")
+    if not isinstance(key, dict) or any(k not in key for k in keys) or \
+            not all(isinstance(v, dict) for v in key.values()):
+        raise ValueError("invalid cursor")
+    return key
+
+
+def projection(fields):
+    """
+    :return: the `ProjectionExpression` and `ExpressionAttributeNames` scan
+        arguments selecting the comma separated `fields`
+    :raise ValueError: for unknown fields
+    """
+    names = [f for f in fields.split(',') if f]
+    unknown = [f for f in names if f not in FIELDS]
+    if unknown or not names:
+        raise ValueError("fields must be a subset of {0}".format(FIELDS))
+    # attribute names like `text` are reserved words, always use placeholders
+    attribute_names = dict(('#f{0}'.format(i), f) for i, f in enumerate(names))
+    return {
+        'ProjectionExpression': ', '.join(sorted(attribute_names)),
+        'ExpressionAttributeNames': attribute_names
+    }
+
+
+def _bad_request(message):
+    return {
+        "statusCode": 400,
+        "body": json.dumps({"message": message})
+    }
 
 
 def list(event, context):
-    table = dynamodb.Table(os.environ['DYNAMODB_TABLE'])
+    """
+    List one page of todos.
+
+    Query string parameters:
+
+    - `limit`: the maximum number of todos in the page, up to `MAX_LIMIT`
+    - `cursor`: the `cursor` of the previous page, to get the next page
+    - `fields`: comma separated subset of `FIELDS` to return
+
+    The body is `{"items": [...], "cursor": ...}`, where `cursor` is `null`
+    on the last page.
+    """
+    params = (event or {}).get('queryStringParameters') or {}
+    kwargs = dict(TableName=runtime.table_name())
+    try:
+        limit = int(params.get('limit', DEFAULT_LIMIT))
+        if limit < 1:
+            raise ValueError
+        kwargs['Limit'] = min(limit, MAX_LIMIT)
+    except ValueError:
+        return _bad_request("limit must be a positive integer")
+    try:
+        if params.get('cursor'):
+            kwargs['ExclusiveStartKey'] = decode_cursor(params['cursor'])
+        if params.get('fields'):
+            kwargs.update(projection(params['fields']))
+    except ValueError as e:
+        return _bad_request(str(e))
 
-    result = table.scan()
+    result = runtime.client().scan(**kwargs)
 
     response = {
         "statusCode": 200,
-        "body": json.dumps(result['Items'], cls=decimalencoder.DecimalEncoder)
+        "body": serializer.dumps({
+            "items": indexes.strip_items(
+                serializer.plain_items(result['Items'])),
+            "cursor": encode_cursor(result.get('LastEvaluatedKey'))
+        })
     }
 
-    return response
\ No newline at end of file
+    return response
+
+
+def iter_segment(table_name, segment, total_segments, **kwargs):
+    """
+    Scan one segment of a parallel scan, a page at a time.
+
+    :return: an iterator of the lists of items of each page, as JSON objects
+    """
+    # low-level clients are thread safe, all the segments share one
+    client = runtime.client()
+    scan_kwargs = dict(kwargs, TableName=table_name, Segment=segment,
+                       TotalSegments=total_segments)
+    while True:
+        result = client.scan(**scan_kwargs)
+        yield indexes.strip_items(serializer.plain_items(result['Items']))
+        if 'LastEvaluatedKey' not in result:
+            return
+        scan_kwargs['ExclusiveStartKey'] = result['LastEvaluatedKey']
+
+
+def scan_segment(table_name, segment, total_segments, **kwargs):
+    """
+    Scan every page of one segment of a parallel scan.
+
+    :return: the list of items of the segment, as JSON objects
+    """
+    return [item for page in iter_segment(
+        table_name, segment, total_segments, **kwargs) for item in page]
+
+
+def parallel_scan(table_name, total_segments=8, on_segment=None, **kwargs):
+    """
+    Scan a whole table with `total_segments` concurrent segment scans.
+
+    :param on_segment: optional `on_segment(segment, pages)` called with the
+        `iter_segment` pages of each segment, instead of collecting the
+        items, so that a segment never has to fit in memory. It returns the
+        number of items it handled.
+    :return: the list of items, or the number of items with `on_segment`
+    """
+    def run(segment):
+        if on_segment is None:
+            return scan_segment(table_name, segment, total_segments, **kwargs)
+        return on_segment(segment, iter_segment(
+            table_name, segment, total_segments, **kwargs))
+
+    # not multiprocessing's ThreadPool, which needs the /dev/shm Lambda
+    # doesn't have. Imported here so the list and query handlers don't pay
+    # for it at cold start
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(total_segments) as pool:
+        results = [r for r in pool.map(run, range(total_segments))]
+    if on_segment is not None:
+        return sum(results)
+    return [item for items in results for item in items]
+
+
+class SegmentUpload(object):
+    """
+    Writes the items of a segment to one S3 object as JSON lines, uploading
+    every `part_size` bytes as a part of a multipart upload, so at most one
+    part of the segment is held in memory. A segment smaller than a part is
+    written by a single `put_object`.
+
+    :param part_size: bytes of each part but the last, at least the 5 MiB S3
+        minimum
+    """
+
+    def __init__(self, bucket, key, part_size=PART_SIZE):
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.count = 0
+        self._s3 = runtime.client('s3')
+        self._chunks = []
+        self._size = 0
+        self._upload_id = None
+        self._parts = []
+
+    def write(self, items):
+        for item in items:
+            line = (serializer.dumps(item) + '\n').encode('utf-8')
+            self._chunks.append(line)
+            self._size += len(line)
+            self.count += 1
+        if self._size >= self.part_size:
+            self._upload_part()
+
+    def close(self):
+        """Uploads the buffered items and completes the object"""
+        if self._upload_id is None:
+            self._s3.put_object(Bucket=self.bucket, Key=self.key,
+                                Body=b''.join(self._chunks))
+            self._chunks = []
+            return
+        if self._chunks:
+            self._upload_part()
+        self._s3.complete_multipart_upload(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+            MultipartUpload={'Parts': self._parts})
+
+    def abort(self):
+        """Drops the parts uploaded so far, S3 keeps and bills them otherwise"""
+        if self._upload_id is not None:
+            self._s3.abort_multipart_upload(
+                Bucket=self.bucket, Key=self.key, UploadId=self._upload_id)
+
+    def _upload_part(self):
+        if self._upload_id is None:
+            self._upload_id = self._s3.create_multipart_upload(
+                Bucket=self.bucket, Key=self.key)['UploadId']
+        number = len(self._parts) + 1
+        resp = self._s3.upload_part(
+            Bucket=self.bucket, Key=self.key, UploadId=self._upload_id,
+            PartNumber=number, Body=b''.join(self._chunks))
+        self._parts.append({'PartNumber': number, 'ETag': resp['ETag']})
+        self._chunks = []
+        self._size = 0
+
+
+def export_segments(bucket, prefix, segments, fields=None):
+    """
+    Export every todo to `bucket` as JSON lines, one object per parallel scan
+    segment, `<prefix>segment-<n>.jsonl`, then the `<prefix>manifest.json`
+    object listing them.
+
+    :return: the manifest
+    """
+    kwargs = projection(fields) if fields else dict()
+    keys = ['{0}segment-{1:04d}.jsonl'.format(prefix, segment)
+            for segment in range(segments)]
+
+    def write_segment(segment, pages):
+        upload = SegmentUpload(bucket, keys[segment])
+        try:
+            for items in pages:
+                upload.write(items)
+            upload.close()
+        except Exception:
+            upload.abort()
+            raise
+        return upload.count
+
+    count = parallel_scan(runtime.table_name(), total_segments=segments,
+                          on_segment=write_segment, **kwargs)
+    manifest = {
+        "segments": segments,
+        "count": count,
+        "keys": keys
+    }
+    runtime.client('s3').put_object(
+        Bucket=bucket, Key=prefix + MANIFEST,
+        Body=json.dumps(manifest).encode('utf-8'))
+    return manifest
+
+
+def export(event, context):
+    """
+    Start an export of every todo to the `EXPORT_BUCKET` bucket, under
+    `exports/<timestamp>/`.
+
+    A whole table takes longer to scan than API Gateway waits for a
+    response, so the export runs in the `EXPORT_FUNCTION` Lambda function,
+    invoked asynchronously, and the response is a 202 with the `manifest`
+    key, which exists once the export is complete.
+
+    Query string parameters:
+
+    - `segments`: the number of parallel scan segments, default 8
+    - `fields`: comma separated subset of `FIELDS` to export
+    """
+    params = (event or {}).get('queryStringParameters') or {}
+    try:
+        segments = int(params.get('segments', 8))
+        if not 1 <= segments <= 64:
+            raise ValueError
+    except ValueError:
+        return _bad_request("segments must be between 1 and 64")
+    if params.get('fields'):
+        try:
+            projection(params['fields'])
+        except ValueError as e:
+            return _bad_request(str(e))
+
+    bucket = os.environ['EXPORT_BUCKET']
+    prefix = 'exports/{0}/'.format(int(time.time() * 1000))
+    runtime.client('lambda').invoke(
+        FunctionName=os.environ['EXPORT_FUNCTION'],
+        InvocationType='Event',
+        Payload=json.dumps({
+            "bucket": bucket,
+            "prefix": prefix,
+            "segments": segments,
+            "fields": params.get('fields')
+        }).encode('utf-8'))
+
+    response = {
+        "statusCode": 202,
+        "body": json.dumps({
+            "bucket": bucket,
+            "prefix": prefix,
+            "manifest": prefix + MANIFEST,
+            "segments": segments
+        })
+    }
+
+    return response
+
+
+def run_export(event, context):
+    """
+    Run an export started by `export`. Invoked asynchronously, Lambda retries
+    a failed export, which writes the same keys again.
+    """
+    return export_segments(event['bucket'], event['prefix'],
+                           event['segments'], event.get('fields'))
@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Todo endpoints that `Query` the table's global secondary indexes, see
+`todos.indexes`, so they read only the todos they return instead of scanning
+the whole table.
+"""
+
+import time
+
+from todos import indexes, runtime, serializer
+from todos.list import (encode_cursor, decode_cursor, projection,
+                        _bad_request, DEFAULT_LIMIT, MAX_LIMIT)
+
+# the oldest `since` of the updated query, in days
+MAX_DAYS = 92
+
+
+def _limit(params):
+    limit = int(params.get('limit', DEFAULT_LIMIT))
+    if limit < 1:
+        raise ValueError
+    return min(limit, MAX_LIMIT)
+
+
+def _page(items, cursor):
+    return {
+        "statusCode": 200,
+        "body": serializer.dumps({
+            "items": indexes.strip_items(serializer.plain_items(items)),
+            "cursor": cursor
+        })
+    }
+
+
+def unchecked(event, context):
+    """
+    List one page of the unchecked todos, ordered by `createdAt`.
+
+    Query string parameters:
+
+    - `limit`: the maximum number of todos in the page, up to `MAX_LIMIT`
+    - `cursor`: the `cursor` of the previous page, to get the next page
+    - `order`: `asc` for the oldest todos first, the default, or `desc`
+    - `fields`: comma separated subset of `FIELDS` to return
+    """
+    params = (event or {}).get('queryStringParameters') or {}
+
+    order = params.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        return _bad_request("order must be asc or desc")
+    kwargs = dict(
+        TableName=runtime.table_name(),
+        IndexName=indexes.UNCHECKED_INDEX,
+        KeyConditionExpression='#unchecked = :unchecked',
+        ScanIndexForward=order == 'asc')
+    try:
+        kwargs['Limit'] = _limit(params)
+    except ValueError:
+        return _bad_request("limit must be a positive integer")
+    try:
+        if params.get('cursor'):
+            kwargs['ExclusiveStartKey'] = decode_cursor(
+                params['cursor'], keys=('id', 'unchecked', 'createdAt'))
+        if params.get('fields'):
+            kwargs.update(projection(params['fields']))
+    except ValueError as e:
+        return _bad_request(str(e))
+    kwargs.setdefault('ExpressionAttributeNames', {})['#unchecked'] = \
+        'unchecked'
+    kwargs['ExpressionAttributeValues'] = {
+        ':unchecked': runtime.serialize_value(indexes.UNCHECKED)
+    }
+
+    result = runtime.client().query(**kwargs)
+    return _page(result['Items'],
+                 encode_cursor(result.get('LastEvaluatedKey')))
+
+
+def updated(event, context):
+    """
+    List one page of the todos updated since a timestamp, ordered by
+    `updatedAt`.
+
+    Query string parameters:
+
+    - `since`: the millisecond timestamp, at most `MAX_DAYS` days ago
+    - `limit`: the maximum number of todos in the page, up to `MAX_LIMIT`
+    - `cursor`: the `cursor` of the previous page, to get the next page
+    - `fields`: comma separated subset of `FIELDS` to return
+
+    The index is partitioned by day, so the page is filled by querying each
+    day from `since` until today.
+    """
+    params = (event or {}).get('queryStringParameters') or {}
+
+    now = int(time.time() * 1000)
+    try:
+        since = int(params['since'])
+        if since < now - MAX_DAYS * indexes.DAY_MS:
+            raise ValueError
+    except (KeyError, ValueError):
+        return _bad_request(
+            "since must be a millisecond timestamp of the last {0} "
+            "days".format(MAX_DAYS))
+    try:
+        limit = _limit(params)
+    except ValueError:
+        return _bad_request("limit must be a positive integer")
+
+    kwargs = dict(
+        TableName=runtime.table_name(),
+        IndexName=indexes.UPDATED_INDEX,
+        KeyConditionExpression='#day = :day AND #updatedAt >= :since')
+    days = indexes.days_since(since, now)
+    try:
+        if params.get('fields'):
+            kwargs.update(projection(params['fields']))
+        if params.get('cursor'):
+            start = decode_cursor(params['cursor'], keys=('updatedDay',))
+            day = start['updatedDay'].get('S')
+            if day not in days:
+                raise ValueError("invalid cursor")
+            days = days[days.index(day):]
+            if 'id' in start:
+                kwargs['ExclusiveStartKey'] = start
+    except ValueError as e:
+        return _bad_request(str(e))
+    kwargs.setdefault('ExpressionAttributeNames', {}).update({
+        '#day': 'updatedDay', '#updatedAt': 'updatedAt'
+    })
+
+    client = runtime.client()
+    items = []
+    for i, day in enumerate(days):
+        kwargs['ExpressionAttributeValues'] = {
+            ':day': {'S': day}, ':since': runtime.serialize_value(since)
+        }
+        result = client.query(Limit=limit - len(items), **kwargs)
+        kwargs.pop('ExclusiveStartKey', None)
+        items.extend(result['Items'])
+        if 'LastEvaluatedKey' in result:
+            # the page is full in the middle of a day
+            return _page(items, encode_cursor(result['LastEvaluatedKey']))
+        if len(items) == limit and i + 1 < len(days):
+            return _page(
+                items, encode_cursor({'updatedDay': {'S': days[i + 1]}}))
+    return _page(items, None)
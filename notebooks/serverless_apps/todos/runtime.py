@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+Resources shared by the todos handlers of a Lambda container.
+
+Importing this module is cheap: boto3 is only imported, and each low-level
+client only built, the first time a handler needs it, and then reused by
+every later invocation of the container. Handlers use the low-level
+DynamoDB client, which is much cheaper to build than `boto3.resource`, and
+convert items with `serialize` and `deserialize`, which handle the types of
+a todo directly and only fall back to boto3's `TypeSerializer` and
+`TypeDeserializer` for the others.
+"""
+
+import os
+import threading
+from decimal import Decimal
+
+STRING_TYPES = (str, type(u''))
+# `long` is a separate type on Python 2
+NUMBER_TYPES = (int, type(2 ** 64), Decimal)
+
+_clients = dict()
+_lock = threading.Lock()
+_table_name = None
+_serializer = None
+_deserializer = None
+
+
+def client(service='dynamodb'):
+    """
+    :return: the container's low-level client of `service`, built on first
+        use. Low-level clients are thread safe.
+    """
+    c = _clients.get(service)
+    if c is None:
+        with _lock:
+            c = _clients.get(service)
+            if c is None:
+                import boto3
+                c = _clients[service] = boto3.client(service)
+    return c
+
+
+def table_name():
+    """:return: the name of the todos table"""
+    global _table_name
+    if _table_name is None:
+        _table_name = os.environ['DYNAMODB_TABLE']
+    return _table_name
+
+
+def serialize_value(value):
+    """:return: the DynamoDB attribute value of a Python value"""
+    if isinstance(value, bool):
+        return {'BOOL': value}
+    if isinstance(value, STRING_TYPES):
+        return {'S': value}
+    if isinstance(value, NUMBER_TYPES):
+        return {'N': str(value)}
+    if value is None:
+        return {'NULL': True}
+    global _serializer
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeSerializer
+        _serializer = TypeSerializer()
+    return _serializer.serialize(value)
+
+
+def deserialize_value(value):
+    """:return: the Python value of a DynamoDB attribute value"""
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        return Decimal(value['N'])
+    if 'BOOL' in value:
+        return value['BOOL']
+    if 'NULL' in value:
+        return None
+    global _deserializer
+    if _deserializer is None:
+        from boto3.dynamodb.types import TypeDeserializer
+        _deserializer = TypeDeserializer()
+    return _deserializer.deserialize(value)
+
+
+def serialize(item):
+    """:return: the DynamoDB item, or key, of a dict"""
+    return dict((k, serialize_value(v)) for k, v in item.items())
+
+
+def deserialize(item):
+    """:return: the dict of a DynamoDB item, or key"""
+    return dict((k, deserialize_value(v)) for k, v in item.items())
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+#
+# Copyright 2018 Amazon.com, Inc. or its affiliates. All Rights Reserved.
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy of this
+# software and associated documentation files (the "Software"), to deal in the Software
+# without restriction, including without limitation the rights to use, copy, modify,
+# merge, publish, distribute, sublicense, and/or sell copies of the Software, and to
+# permit persons to whom the Software is furnished to do so.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR IMPLIED,
+# INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS FOR A
+# PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR COPYRIGHT
+# HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER IN AN ACTION
+# OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN CONNECTION WITH THE
+# SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+#
+
+"""
+JSON responses of DynamoDB items.
+
+`plain_item` converts a low-level DynamoDB item straight to JSON types in a
+single pass, numbers becoming an `int` or, when they have a fraction or an
+exponent, a `float`. No `Decimal` is ever built, so `dumps` runs entirely in
+the C encoder instead of calling back into Python for every number. `dumps`
+uses orjson when it is installed and the standard `json` module otherwise.
+"""
+
+import json
+import base64
+from decimal import Decimal
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# the JSON library `dumps` uses
+BACKEND = 'orjson' if orjson is not None else 'json'
+
+
+def number(value):
+    """:return: the `int` or `float` of a DynamoDB number string"""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def plain_value(value):
+    """:return: the JSON value of a low-level DynamoDB attribute value"""
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        return number(value['N'])
+    if 'BOOL' in value:
+        return value['BOOL']
+    if 'NULL' in value:
+        return None
+    if 'M' in value:
+        return plain_item(value['M'])
+    if 'L' in value:
+        return [plain_value(v) for v in value['L']]
+    if 'SS' in value:
+        return sorted(value['SS'])
+    if 'NS' in value:
+        return sorted(number(v) for v in value['NS'])
+    if 'B' in value:
+        return base64.b64encode(value['B']).decode('ascii')
+    if 'BS' in value:
+        return sorted(base64.b64encode(v).decode('ascii')
+                      for v in value['BS'])
+    raise TypeError("unknown attribute value {0}".format(value))
+
+
+def plain_item(item):
+    """:return: the JSON object of a low-level DynamoDB item"""
+    return dict((k, plain_value(v)) for k, v in item.items())
+
+
+def plain_items(items):
+    """:return: the JSON objects of a list of low-level DynamoDB items"""
+    return [plain_item(item) for item in items]
+
+
+def to_plain(value):
+    """
+    :return: `value` with every `Decimal`, as deserialized by boto3, replaced
+        by an `int` or a `float`
+    """
+    if isinstance(value, Decimal):
+        return number(str(value))
+    if isinstance(value, dict):
+        return dict((k, to_plain(v)) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return [to_plain(v) for v in value]
+    return value
+
+
+def dumps(obj):
+    """
+    :return: the JSON string of `obj`, which must only hold JSON types, see
+        `plain_item` and `to_plain`
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            # integers over 64 bits, which DynamoDB numbers can be
+            pass
+    return json.dumps(obj)
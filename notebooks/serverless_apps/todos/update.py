@@ -19,47 +19,123 @@
 
 import json
 import time
-import boto3
-import os
+from botocore.exceptions import ClientError
 
-from todos import decimalencoder
+from todos import cache, indexes, runtime, serializer
 
-dynamodb = boto3.resource('dynamodb')
+RETURN_VALUES = ('NONE', 'UPDATED_NEW', 'ALL_NEW')
+
+
+def _conflict(message, item=None):
+    body = {"message": message}
+    if item is not None:
+        body['item'] = indexes.strip(serializer.plain_item(item))
+    return {
+        "statusCode": 409,
+        "body": serializer.dumps(body)
+    }
 
 
 def update(event, context):
+    """
+    Update the text and checked state of a todo.
+
+    Every update increments the todo's `version`. When the body has the
+    `version` the client last read, the update is conditional on it: if the
+    todo changed since, nothing is written and the response is a 409 with the
+    current todo, or a 404 if it was deleted. Todos created before versioning
+    have version 0.
+
+    The `returnValues` query string parameter selects the body of the
+    response: `ALL_NEW`, the default, for the whole todo, `UPDATED_NEW` for
+    only the updated attributes, including the new `version`, or `NONE` for a
+    204 without a body.
+    """
     data = json.loads(event['body'])
    
     if 'text' not in data or 'checked' not in data:
         raise Exception("Couldn't update the todo item.")
         return
 
+    params = event.get('queryStringParameters') or {}
+    return_values = params.get('returnValues', 'ALL_NEW').upper()
+    if return_values not in RETURN_VALUES:
+        message = "returnValues must be one of {0}".format(
+            ', '.join(RETURN_VALUES))
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"message": message})
+        }
+
     timestamp = int(time.time() * 1000)
 
-    table = dynamodb.Table(os.environ['DYNAMODB_TABLE'])
-
-    result = table.update_item(
-        Key={
-            'id': event['pathParameters']['id']
-        },
-        ExpressionAttributeNames={
-          '#todo_text': 'text',
-        },
-        ExpressionAttributeValues={
-          ':text': data['text'],
-          ':checked': data['checked'],
-          ':updatedAt': timestamp,
-        },
-        UpdateExpression='SET #todo_text = :text, '
-                         'checked = :checked, '
-                         'updatedAt = :updatedAt',
-        ReturnValues='ALL_NEW',
-    )
+    set_clause, remove_clause, index_values = indexes.index_update(
+        data['checked'], timestamp)
+    values = {
+      ':text': data['text'],
+      ':checked': data['checked'],
+      ':updatedAt': timestamp,
+      ':zero': 0,
+      ':one': 1,
+    }
+    values.update(index_values)
+
+    kwargs = dict()
+    if data.get('version') is not None:
+        expected = data['version']
+        if isinstance(expected, bool) or not isinstance(expected, int):
+            return {
+                "statusCode": 400,
+                "body": json.dumps({"message": "version must be an integer"})
+            }
+        if expected == 0:
+            kwargs['ConditionExpression'] = \
+                'attribute_exists(id) AND attribute_not_exists(version)'
+        else:
+            kwargs['ConditionExpression'] = 'version = :expected'
+            values[':expected'] = expected
+        # the current todo comes back with the error, without another read
+        kwargs['ReturnValuesOnConditionCheckFailure'] = 'ALL_OLD'
+
+    try:
+        result = runtime.client().update_item(
+            TableName=runtime.table_name(),
+            Key={
+                'id': {'S': event['pathParameters']['id']}
+            },
+            ExpressionAttributeNames={
+              '#todo_text': 'text',
+            },
+            ExpressionAttributeValues=runtime.serialize(values),
+            UpdateExpression='SET #todo_text = :text, '
+                             'checked = :checked, '
+                             'updatedAt = :updatedAt, '
+                             'version = if_not_exists(version, :zero) '
+                             '+ :one, ' +
+                             set_clause + ' ' + remove_clause,
+            ReturnValues=return_values,
+            **kwargs
+        )
+    except ClientError as ce:
+        if ce.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            raise
+        # fail fast, the client re-reads and decides whether to retry
+        item = ce.response.get('Item')
+        if item is None:
+            return {
+                "statusCode": 404,
+                "body": json.dumps({"message": "todo not found"})
+            }
+        return _conflict("version conflict", item)
+    cache.invalidate(event['pathParameters']['id'])
+
+    if return_values == 'NONE':
+        return {"statusCode": 204}
 
     response = {
         "statusCode": 200,
-        "body": json.dumps(result['Attributes'],
-                           cls=decimalencoder.DecimalEncoder)
+        "body": serializer.dumps(
+            indexes.strip(serializer.plain_item(result['Attributes'])))
     }
 
-    return response
\ No newline at end of file
+    return response